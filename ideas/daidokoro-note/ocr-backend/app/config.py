@@ -13,27 +13,139 @@ API_TOKEN = os.getenv("API_TOKEN", "dev-token")
 # データベース・ストレージ
 DB_PATH = os.getenv("DB_PATH", str(BASE_DIR / "data" / "db.sqlite3"))
 IMAGE_DIR = os.getenv("IMAGE_DIR", str(BASE_DIR / "data" / "images"))
+DB_BUSY_TIMEOUT = 30  # 書き込みロック待ちの上限（秒）
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_KB = int(os.getenv("DB_CACHE_KB", str(64 * 1024)))  # 接続ごとのページキャッシュ
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", str(BASE_DIR / "data" / "uploads"))  # 非同期ジョブの元画像
 
 # アップロード制限
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "10"))
 MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # 画像以外のフォーム項目と区切り行の分の余裕
+# ヘッダから読んだ画素数（幅×高さ）の上限。超える画像はデコードせずに弾く（展開爆弾対策）
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
 
 # Ollama設定
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
 LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "120"))  # 大モデル用にタイムアウト延長
+LLM_TEMPERATURE = 0.1
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"  # トークンを逐次受け取り、JSONが閉じたら結果を使う
+# 1回の生成で出力する最大トークン数（Ollamaの num_predict）。JSONの後に出力が続いても生成はここで止まる
+LLM_NUM_PREDICT = int(os.getenv("LLM_NUM_PREDICT", "2048"))
+
+# Ollama HTTPクライアント（アプリ全体で1つを共有し、接続を使い回す）
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "5"))  # 待機させておく接続数
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))  # 待機接続を閉じるまでの秒数
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_WRITE_TIMEOUT = 30  # リクエスト送信のタイムアウト（秒）
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "10"))  # 空き接続待ちのタイムアウト
+OLLAMA_HEALTH_TIMEOUT = 5  # ヘルスチェックの読み込みタイムアウト（秒）
+OLLAMA_HTTP2 = os.getenv("OLLAMA_HTTP2", "false").lower() == "true"  # h2パッケージが必要
+
+# LLM応答キャッシュ（正規化したOCRテキスト + モデル + プロンプト + 温度で引く）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_HOURS = int(os.getenv("LLM_CACHE_TTL_HOURS", "720"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
 
 # OCR設定
 OCR_LANG = os.getenv("OCR_LANG", "japan")
 OCR_USE_GPU = os.getenv("OCR_USE_GPU", "true").lower() == "true"
+OCR_REC_BATCH_NUM = int(os.getenv("OCR_REC_BATCH_NUM", "6"))  # 認識モデルのバッチサイズ
+OCR_ROI = os.getenv("OCR_ROI", "true").lower() == "true"  # 余白を除いた文字のある範囲だけをOCRする
+OCR_RETRY_SCORE = float(os.getenv("OCR_RETRY_SCORE", "0.8"))  # これ未満のブロックは拡大して再認識（0で無効）
+LAYOUT_ANALYSIS = os.getenv("LAYOUT_ANALYSIS", "false").lower() == "true"  # 段組み・縦書きを考慮して読み順を決める（falseなら従来どおり上から下・左から右）
+
+# OCRワーカープロセス（0ならAPIプロセス内でOCRする）
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+OCR_WORKER_MAX_JOBS = int(os.getenv("OCR_WORKER_MAX_JOBS", "500"))  # この件数を処理したワーカーは再起動（0で無効）
+OCR_WORKER_TIMEOUT = 10  # ワーカー死活確認のタイムアウト（秒）
+OCR_WORKER_HEALTH_INTERVAL = 30  # ワーカー死活確認の間隔（秒）
+OCR_WORKER_MAX_FAILURES = 3  # 死活確認がこの回数続けて失敗したらプールを作り直す
+OCR_WORKER_STALL_TIMEOUT = 120  # OCRの実行中、この秒数のあいだ1件も終わらなければワーカーが固まったとみなす
+OCR_LOADING_RETRY_AFTER = 5  # モデルのロード中に取り込みAPIが返す Retry-After（秒）
+
+# 重複アップロード検出（生バイトのハッシュ + 前処理後画像の知覚ハッシュ）
+# 知覚ハッシュだけでは白地に文字のスクリーンショットを区別できないため、既定では使わない。
+# 使う場合も、画像サイズが同じでOCRテキストがほぼ一致したときだけ既存レシピを返す
+DEDUP_PERCEPTUAL = os.getenv("DEDUP_PERCEPTUAL", "false").lower() == "true"
+DEDUP_PHASH_MAX_DISTANCE = 4  # 同じ画像とみなす知覚ハッシュのハミング距離（64bit中）
+DEDUP_TEXT_SIMILARITY = 0.95  # 同じ画像とみなすOCRテキストの類似度（difflibのratio）
+DEDUP_MAX_CANDIDATES = 200  # 知覚ハッシュを比べる取り込み済み画像の最大件数（新しい方から）
+
+# 複数画像の一括取り込み
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "10"))
+
+# レシピ一覧（GET /v1/recipes）の1ページの件数
+RECIPE_LIST_DEFAULT_LIMIT = 20
+RECIPE_LIST_MAX_LIMIT = 100
+RECIPE_SEARCH_MAX_OFFSET = 1000  # 検索結果は関連度順のためOFFSETで送る（深いページは作らない）
+# 全文検索で順位付けする最大件数（一致がこれより多い語は新しい方からこの件数だけを順位付けする。0で無制限）
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "500"))
 
 # 画像処理設定
-IMAGE_MIN_SIZE = 2000  # 長辺の最小サイズ
+IMAGE_MIN_SIZE = 2000  # 長辺の最小サイズ（adaptive時はこれより小さく縮小しない）
 IMAGE_MAX_SIZE = 4000  # 長辺の最大サイズ
+# adaptive: 推定した文字の高さに合わせて倍率を決める / fixed: 長辺をMIN〜MAXに収める
+RESIZE_POLICY = os.getenv("RESIZE_POLICY", "adaptive")
+TEXT_HEIGHT_TARGET = int(os.getenv("TEXT_HEIGHT_TARGET", "32"))  # リサイズ後の1行の文字の高さ（px）
+
+# 画像の保存（取り込みとは別にバックグラウンドで書き込む）
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "webp").lower()  # jpeg / webp / avif（AVIF対応のPillowが必要）
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))  # サムネイルの長辺（px）
+
+# 画像の保存先（local: IMAGE_DIR 以下にハッシュで分けたディレクトリ / s3: S3互換ストレージ）
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # MinIO等を使う場合に指定
+S3_PREFIX = os.getenv("S3_PREFIX", "images/")
+
+# どのレシピからも参照されない画像の削除
+IMAGE_GC_INTERVAL_HOURS = float(os.getenv("IMAGE_GC_INTERVAL_HOURS", "24"))  # 0で無効
+IMAGE_GC_GRACE_SECONDS = 3600  # 作成からこの時間が経つまでは削除しない（保存処理中の画像を守る）
+IMAGE_GC_BATCH_SIZE = 500  # 1回にまとめて調べる（削除する）保存画像の件数
+
+# リクエストごとのスパン計測（Server-Timingヘッダと1行1JSONのログ）
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_LOG = os.getenv("TRACE_LOG", "true").lower() == "true"  # スパンを記録したリクエストごとにJSONを1行出す
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "")  # 例: http://localhost:4318/v1/traces（空なら送らない）
+OTLP_SERVICE_NAME = os.getenv("OTLP_SERVICE_NAME", "recipe-ocr-backend")
+OTLP_EXPORT_INTERVAL = 5  # 送信間隔（秒）
+OTLP_MAX_PENDING = 1000  # 送信待ちトレースの上限（超えた分は捨てる）
 
 # タイムアウト
 REQUEST_TIMEOUT = 30
 
+# 取り込みパイプライン設定（ステージごとの同時実行数とキュー長）
+PREPROCESS_CONCURRENCY = int(os.getenv("PREPROCESS_CONCURRENCY", "2"))
+# OCRステージの同時実行数。APIプロセス内のOCR（OCR_WORKERS=0）は1つのPaddleOCRを1スレッドで
+# 順に呼ぶため、2以上にしても推論は並列にならない（並列化は OCR_WORKERS で行う）
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "1"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "1"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# 取り込みの受け付け制限（アップロードの受信・認証・検証の後に枠を取り、あふれた分は 429/503 と Retry-After を返す）
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "8"))  # 同時にパイプラインへ入れる取り込み数
+ADMISSION_INTERACTIVE_RESERVED = int(os.getenv("ADMISSION_INTERACTIVE_RESERVED", "2"))  # 一括取り込み・非同期ジョブに使わせない枠
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))  # 空きを待てるリクエスト数（超えたら429）
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))  # 空きを待つ上限（秒。超えたら503）
+ADMISSION_DEFAULT_RETRY_AFTER = 5  # 処理時間の実績がないときの Retry-After（秒）
+ADMISSION_MAX_RETRY_AFTER = 120  # Retry-After の上限（秒）
+
+# ブロッキング処理用スレッドプール（OCR用はPaddleOCRがスレッドセーフでないため常に1スレッド）
+IMAGE_EXECUTOR_WORKERS = int(os.getenv("IMAGE_EXECUTOR_WORKERS", "2"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+STORAGE_EXECUTOR_WORKERS = int(os.getenv("STORAGE_EXECUTOR_WORKERS", "1"))
+# エンコード待ちの前処理済み画像（全解像度のPIL画像）の上限。超えると前処理ステージが待つ
+IMAGE_WRITER_MAX_PENDING = STORAGE_EXECUTOR_WORKERS
+
+# 非同期ジョブ設定
+JOB_MAX_INFLIGHT = int(os.getenv("JOB_MAX_INFLIGHT", "4"))  # 同時にパイプラインへ流すジョブ数
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))  # 終わっていないジョブ数の上限（超えたら登録時に429）
+JOB_EVENTS_HEARTBEAT = 15  # SSEのハートビート間隔（秒）
+
 # 許可するファイル形式
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 ALLOWED_MIMETYPES = {"image/jpeg", "image/png", "image/webp"}
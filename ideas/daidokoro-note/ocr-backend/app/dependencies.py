@@ -1,6 +1,7 @@
-from fastapi import Header, HTTPException
+from fastapi import Depends, Header, HTTPException
 
-from app.config import API_TOKEN
+from app.config import API_TOKEN, OCR_LOADING_RETRY_AFTER
+from app.services.readiness import is_ready, has_failed
 
 
 async def verify_token(authorization: str = Header(...)):
@@ -20,3 +21,16 @@ async def verify_token(authorization: str = Header(...)):
         )
 
     return token
+
+
+async def require_ocr_ready(_: str = Depends(verify_token)):
+    """OCRモデルの準備ができるまで取り込みを受け付けない（起動直後・ロード失敗時は503。認証を先に確認する）"""
+    if is_ready():
+        return
+    if has_failed():
+        raise HTTPException(status_code=503, detail="OCR model failed to load")
+    raise HTTPException(
+        status_code=503,
+        detail="OCR model is loading",
+        headers={"Retry-After": str(OCR_LOADING_RETRY_AFTER)},
+    )
@@ -1,4 +1,5 @@
 import logging
+import time
 import uuid
 from contextlib import asynccontextmanager
 
@@ -6,9 +7,22 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from app.routers import recipes, health
-from app.models.database import init_db
-from app.services.ocr_service import init_ocr
+from app.routers import recipes, health, jobs, metrics
+from app.models.database import init_db, close_connections
+from app.config import MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES, BATCH_MAX_IMAGES
+from app.middleware import BodySizeLimitMiddleware
+from app.services.ocr_pool import stop_pool
+from app.services.readiness import start_model_loading, stop_model_loading
+from app.services.pipeline import start_pipeline, stop_pipeline
+from app.services.job_service import resume_jobs, cancel_jobs
+from app.services.executors import shutdown_executors
+from app.services.image_writer import flush_images
+from app.services.image_gc import start_gc, stop_gc
+from app.services.storage import init_storage
+from app.services.llm_service import init_http_client, close_http_client
+from app.services.metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
+from app.services.tracing import trace_logger, start_trace, finish_trace, start_exporter, stop_exporter
+from app.request_context import request_id_var
 
 # ロギング設定
 logging.basicConfig(
@@ -22,13 +36,19 @@ logger = logging.getLogger(__name__)
 class RequestIdFilter(logging.Filter):
     def filter(self, record):
         if not hasattr(record, "request_id"):
-            record.request_id = "-"
+            record.request_id = request_id_var.get()
         return True
 
 
 for handler in logging.root.handlers:
     handler.addFilter(RequestIdFilter())
 
+# スパンのログは1行1JSONのまま出す（ログ収集側でそのままパースできるように）
+_trace_handler = logging.StreamHandler()
+_trace_handler.setFormatter(logging.Formatter("%(message)s"))
+trace_logger.addHandler(_trace_handler)
+trace_logger.propagate = False
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -36,16 +56,36 @@ async def lifespan(app: FastAPI):
     # 起動時
     logger.info("Initializing database...", extra={"request_id": "startup"})
     init_db()
+    init_storage()
+
+    # OCRモデルは裏でロードする（完了までは /v1/health/ready と取り込みAPIが503を返す）
+    logger.info("Loading OCR model in the background...", extra={"request_id": "startup"})
+    start_model_loading()
 
-    logger.info("Loading OCR model (this may take a while)...", extra={"request_id": "startup"})
-    init_ocr()
+    init_http_client()
+    start_exporter()
 
-    logger.info("Server is ready!", extra={"request_id": "startup"})
+    logger.info("Starting ingest pipeline...", extra={"request_id": "startup"})
+    start_pipeline()
+    await resume_jobs()
+    start_gc()
+
+    logger.info("Accepting requests", extra={"request_id": "startup"})
 
     yield
 
     # シャットダウン時
     logger.info("Shutting down...", extra={"request_id": "shutdown"})
+    await stop_gc()
+    await cancel_jobs()
+    await stop_pipeline()
+    await flush_images()
+    await stop_model_loading()
+    await stop_pool()
+    await close_http_client()
+    await stop_exporter()
+    shutdown_executors()
+    close_connections()
 
 
 app = FastAPI(
@@ -69,6 +109,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "Retry-After"],
+)
+
+# アップロードの上限（multipartの解析前に、超えた時点で打ち切る）
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/v1/recipes/ingest": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+        "/v1/recipes/ingest-batch": MAX_UPLOAD_BYTES * BATCH_MAX_IMAGES + MULTIPART_OVERHEAD_BYTES,
+    },
 )
 
 
@@ -77,6 +127,8 @@ async def add_request_id(request: Request, call_next):
     """リクエストIDを付与するミドルウェア"""
     request_id = str(uuid.uuid4())[:8]
     request.state.request_id = request_id
+    request_id_var.set(request_id)
+    trace = start_trace(request_id, request.headers.get("traceparent"))
 
     # ロギングコンテキストに追加
     logger.info(
@@ -84,8 +136,26 @@ async def add_request_id(request: Request, call_next):
         extra={"request_id": request_id}
     )
 
-    response = await call_next(request)
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        end = time.perf_counter()
+        # パスそのもの（レシピIDを含む）ではなくルートのテンプレートで集計する
+        route = request.scope.get("route")
+        route = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(end - start, method=request.method, route=route)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status_code))
+        if trace is not None:
+            finish_trace(trace, end, method=request.method, route=route, status=status_code)
+
     response.headers["X-Request-ID"] = request_id
+    if trace is not None:
+        response.headers["Server-Timing"] = trace.server_timing()
 
     logger.info(
         f"{request.method} {request.url.path} - {response.status_code}",
@@ -116,6 +186,8 @@ async def global_exception_handler(request: Request, exc: Exception):
 # ルーター登録
 app.include_router(health.router)
 app.include_router(recipes.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
@@ -0,0 +1,58 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    パスごとにリクエストボディの上限を設け、超えた時点で 413 を返す
+
+    Content-Length が上限を超えていればボディを1バイトも読まずに返す。
+    Content-Length がない（chunked）場合も、受信した量が上限を超えた時点で
+    読み込みを打ち切る。multipartの解析前に止めるため、巨大なアップロードを
+    一時ファイルへ書き切ってから弾くことはない。
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = _content_length(scope)
+        if content_length is not None and content_length > limit:
+            response = JSONResponse(status_code=413, content={"detail": _too_large(limit)})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPIはボディ解析中のHTTPExceptionをそのまま送出する
+                    raise HTTPException(status_code=413, detail=_too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _content_length(scope: Scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def _too_large(limit: int) -> str:
+    return f"Request body too large. Maximum size: {limit // (1024 * 1024)}MB"
@@ -1,44 +1,264 @@
+import logging
+import re
 import sqlite3
 import json
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
 from datetime import datetime
 
-from app.config import DB_PATH
+from app.config import DB_PATH, DB_BUSY_TIMEOUT, DB_MMAP_SIZE, DB_CACHE_KB, SEARCH_RANK_WINDOW
 
+logger = logging.getLogger(__name__)
 
-def get_connection() -> sqlite3.Connection:
-    """データベース接続を取得"""
-    conn = sqlite3.connect(DB_PATH)
+
+# スレッドごとに使い回す接続（DB用スレッドプールのスレッド数だけ作られる）
+_local = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+# 全文検索の索引を使えるか（init_db で判定）
+_search_enabled = False
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT,
+        # 接続はスレッドローカルで管理し、別スレッドからはシャットダウン時のcloseのみ行う
+        check_same_thread=False,
+        # 接続を使い回すので、文ごとのプリペアドステートメントもキャッシュされ続ける
+        cached_statements=256,
+    )
     conn.row_factory = sqlite3.Row
+
+    # WAL: 読み込みが書き込みを待たない。synchronous=NORMALはWALでは電源断時も整合性を保つ
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={-DB_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
+def get_connection() -> sqlite3.Connection:
+    """データベース接続を取得（呼び出しスレッド専用の接続を使い回す。closeしないこと）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    書き込みトランザクション
+
+    ブロックを抜けるとコミット、例外時はロールバックする。入れ子にした場合は
+    一番外側でまとめて1回だけコミットされるため、複数件の保存をバッチにできる。
+    """
+    conn = get_connection()
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+        raise
+    else:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.commit()
+
+
+def close_connections():
+    """全スレッドの接続を閉じる（シャットダウン時に呼び出し）"""
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
 def init_db():
     """データベースを初期化"""
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
 
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS recipes (
-            id TEXT PRIMARY KEY,
-            created_at TEXT NOT NULL,
-            source_url TEXT,
-            image_path TEXT NOT NULL,
-            ocr_raw_text TEXT NOT NULL,
-            ocr_blocks_json TEXT,
-            structured_json TEXT,
-            confidence REAL,
-            warnings_json TEXT,
-            llm_model TEXT,
-            version INTEGER DEFAULT 1
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                source_url TEXT,
+                image_path TEXT NOT NULL,
+                ocr_raw_text TEXT NOT NULL,
+                ocr_blocks_json TEXT,
+                structured_json TEXT,
+                confidence REAL,
+                warnings_json TEXT,
+                llm_model TEXT,
+                version INTEGER DEFAULT 1
+            )
+        """)
+
+        # 非同期取り込みジョブ（再起動後も再開できるよう永続化）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                upload_path TEXT NOT NULL,
+                source_url TEXT,
+                title_hint TEXT,
+                recipe_id TEXT NOT NULL,
+                force INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+        # 重複アップロード検出用のハッシュ索引
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                content_hash TEXT PRIMARY KEY,
+                perceptual_hash TEXT,
+                recipe_id TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER
+            )
+        """)
+
+        # LLM応答キャッシュ（時刻はTTL/LRU判定用にUNIX秒で持つ）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                response_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)"
         )
-    """)
 
-    conn.commit()
-    conn.close()
+        # レシピの全ページの保存画像（recipes.image_path は先頭ページのみのため）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipe_images (
+                recipe_id TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                image_key TEXT NOT NULL,
+                PRIMARY KEY (recipe_id, page)
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recipe_images_key ON recipe_images (image_key)"
+        )
+
+        # 一覧・絞り込み用（structured_json から保存時に取り出した値）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipe_tags (
+                tag TEXT NOT NULL,
+                recipe_id TEXT NOT NULL,
+                PRIMARY KEY (tag, recipe_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_tags_recipe ON recipe_tags (recipe_id)")
+        if _add_column(cursor, "recipes", "title", "TEXT") | _add_column(cursor, "recipes", "source_platform", "TEXT"):
+            _backfill_recipe_summary(cursor)
+
+        # 全文検索（タイトル・材料名・手順）。日本語は単語に区切れないため3文字ずつのN-gramで索引する
+        if _create_search_index(cursor):
+            _backfill_search_index(cursor)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recipes_platform ON recipes (source_platform, id)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_created_at ON recipes (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipes_confidence ON recipes (confidence)")
+
+        # 知覚ハッシュは距離で比べるため、候補は前処理後の画像サイズで絞り込む
+        _add_column(cursor, "image_hashes", "width", "INTEGER")
+        _add_column(cursor, "image_hashes", "height", "INTEGER")
+        cursor.execute("DROP INDEX IF EXISTS idx_image_hashes_perceptual")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_image_hashes_size ON image_hashes (width, height, created_at)"
+        )
+
+        _migrate_image_paths(cursor)
+
+
+def _create_search_index(cursor: sqlite3.Cursor) -> bool:
+    """全文検索用のFTS5テーブルを作る（新しく作った場合True）"""
+    global _search_enabled
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes_fts'"
+    ).fetchone()
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5 (
+                recipe_id UNINDEXED, title, ingredients, steps,
+                tokenize = 'trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # trigramトークナイザはSQLite 3.34以降
+        logger.warning(f"Full-text search disabled (SQLite {sqlite3.sqlite_version}): {e}")
+        _search_enabled = False
+        return False
+    _search_enabled = True
+    return exists is None
+
+
+def _backfill_search_index(cursor: sqlite3.Cursor):
+    """全文検索の索引ができる前に保存されたレシピを索引する"""
+    rows = cursor.execute("SELECT id, structured_json FROM recipes").fetchall()
+    for row in rows:
+        structured = json.loads(row["structured_json"]) if row["structured_json"] else None
+        _index_recipe(cursor, row["id"], structured)
+
+
+def _add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> bool:
+    """列がなければ追加する（追加した場合True）"""
+    columns = {row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _backfill_recipe_summary(cursor: sqlite3.Cursor):
+    """一覧用の列とタグが追加される前に保存されたレシピを埋める"""
+    rows = cursor.execute("SELECT id, source_url, structured_json FROM recipes").fetchall()
+    for row in rows:
+        structured = json.loads(row["structured_json"]) if row["structured_json"] else None
+        _save_summary(cursor, row["id"], row["source_url"], structured)
+
+
+def _migrate_image_paths(cursor: sqlite3.Cursor):
+    """
+    旧形式の image_path（IMAGE_DIR直下のファイルの絶対パス）をストレージのキーに直す
+
+    旧形式はディレクトリを分けていなかったため、ファイル名がそのままキーになる。
+    """
+    rows = cursor.execute(
+        "SELECT id, image_path FROM recipes WHERE image_path LIKE '/%' OR image_path LIKE '_:%'"
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE recipes SET image_path = ? WHERE id = ?",
+        [(re.split(r"[\\/]", row["image_path"])[-1], row["id"]) for row in rows],
+    )
 
 
 def save_recipe(
@@ -51,33 +271,121 @@ def save_recipe(
     warnings: list[str],
     source_url: Optional[str] = None,
     llm_model: Optional[str] = None,
+    image_keys: Optional[list[str]] = None,
 ) -> None:
-    """レシピを保存"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """レシピを保存（image_keys は全ページの保存画像のキー。省略時は image_path のみ）"""
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO recipes (
-            id, created_at, source_url, image_path, ocr_raw_text,
-            ocr_blocks_json, structured_json, confidence, warnings_json,
-            llm_model, version
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        recipe_id,
-        datetime.utcnow().isoformat(),
-        source_url,
-        image_path,
-        ocr_raw_text,
-        json.dumps(ocr_blocks, ensure_ascii=False),
-        json.dumps(structured_json, ensure_ascii=False) if structured_json else None,
-        confidence,
-        json.dumps(warnings, ensure_ascii=False),
-        llm_model,
-        1,
-    ))
-
-    conn.commit()
-    conn.close()
+        cursor.execute("""
+            INSERT INTO recipes (
+                id, created_at, source_url, image_path, ocr_raw_text,
+                ocr_blocks_json, structured_json, confidence, warnings_json,
+                llm_model, version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            recipe_id,
+            datetime.utcnow().isoformat(),
+            source_url,
+            image_path,
+            ocr_raw_text,
+            json.dumps(ocr_blocks, ensure_ascii=False),
+            json.dumps(structured_json, ensure_ascii=False) if structured_json else None,
+            confidence,
+            json.dumps(warnings, ensure_ascii=False),
+            llm_model,
+            1,
+        ))
+
+        cursor.executemany(
+            "INSERT INTO recipe_images (recipe_id, page, image_key) VALUES (?, ?, ?)",
+            [(recipe_id, page, key) for page, key in enumerate(image_keys or [image_path])],
+        )
+        _save_summary(cursor, recipe_id, source_url, structured_json)
+
+
+# URLのホスト → 投稿元の名前（ここにないホストは "www." を除いたホスト名になる）
+_PLATFORM_HOSTS = {
+    "instagram.com": "instagram",
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "tiktok.com": "tiktok",
+    "x.com": "x",
+    "twitter.com": "x",
+    "cookpad.com": "cookpad",
+    "kurashiru.com": "kurashiru",
+    "delishkitchen.tv": "delishkitchen",
+}
+
+
+def source_platform(source_url: Optional[str], structured_json: Optional[dict] = None) -> Optional[str]:
+    """
+    レシピの投稿元（絞り込み用）
+
+    URLのホストから決め、URLがなければLLMが読み取った source.platform を使う。
+    """
+    host = urlsplit(source_url).hostname if source_url else None
+    if host:
+        host = host.removeprefix("www.").removeprefix("m.")
+        for known, platform in _PLATFORM_HOSTS.items():
+            if host == known or host.endswith("." + known):
+                return platform
+        return host
+
+    platform = ((structured_json or {}).get("source") or {}).get("platform")
+    if isinstance(platform, str) and platform.strip():
+        return platform.strip().lower()
+    return None
+
+
+def _save_summary(
+    cursor: sqlite3.Cursor,
+    recipe_id: str,
+    source_url: Optional[str],
+    structured_json: Optional[dict],
+):
+    """一覧・絞り込み用の列（タイトル・投稿元）とタグを保存"""
+    structured = structured_json or {}
+    title = structured.get("title")
+    cursor.execute(
+        "UPDATE recipes SET title = ?, source_platform = ? WHERE id = ?",
+        (title if isinstance(title, str) else None, source_platform(source_url, structured), recipe_id),
+    )
+
+    tags = structured.get("tags")
+    if not isinstance(tags, list):
+        tags = []
+    cursor.executemany(
+        "INSERT OR IGNORE INTO recipe_tags (tag, recipe_id) VALUES (?, ?)",
+        [(tag.strip(), recipe_id) for tag in tags if isinstance(tag, str) and tag.strip()],
+    )
+
+    _index_recipe(cursor, recipe_id, structured_json)
+
+
+def _index_recipe(cursor: sqlite3.Cursor, recipe_id: str, structured_json: Optional[dict]):
+    """レシピを全文検索の索引に追加"""
+    if not _search_enabled or not structured_json:
+        return
+
+    def texts(items, key: str) -> str:
+        if not isinstance(items, list):
+            return ""
+        return "\n".join(
+            item[key] for item in items
+            if isinstance(item, dict) and isinstance(item.get(key), str)
+        )
+
+    title = structured_json.get("title")
+    cursor.execute(
+        "INSERT INTO recipes_fts (recipe_id, title, ingredients, steps) VALUES (?, ?, ?, ?)",
+        (
+            recipe_id,
+            title if isinstance(title, str) else "",
+            texts(structured_json.get("ingredients"), "name"),
+            texts(structured_json.get("steps"), "text"),
+        ),
+    )
 
 
 def get_recipe(recipe_id: str) -> Optional[dict]:
@@ -87,11 +395,11 @@ def get_recipe(recipe_id: str) -> Optional[dict]:
 
     cursor.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
     row = cursor.fetchone()
-    conn.close()
 
-    if not row:
-        return None
+    return _row_to_recipe(row) if row else None
 
+
+def _row_to_recipe(row: sqlite3.Row) -> dict:
     return {
         "id": row["id"],
         "created_at": row["created_at"],
@@ -106,13 +414,380 @@ def get_recipe(recipe_id: str) -> Optional[dict]:
     }
 
 
+# 一覧で返す列（ocr_raw_text / ocr_blocks_json / structured_json は重いため既定では読まない）
+_SUMMARY_COLUMNS = ("id", "created_at", "source_url", "source_platform", "title", "image_path", "confidence")
+_OCR_COLUMNS = ("ocr_raw_text", "ocr_blocks_json")
+
+
+def list_recipes(
+    limit: int,
+    cursor_id: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    platform: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    tags: Optional[list[str]] = None,
+    include_ocr: bool = False,
+) -> list[dict]:
+    """
+    レシピを新しい順に取得（キーセットページネーション）
+
+    IDはULIDで作成順に並ぶため、前のページの最後のID（cursor_id）より小さいものを
+    主キーの索引で読み進める。OFFSETと違い、何ページ目でも読み飛ばす行が発生しない。
+    tags を複数指定した場合はすべてのタグを持つレシピに絞る。
+    """
+    conditions = []
+    params: list = []
+    if cursor_id:
+        conditions.append("id < ?")
+        params.append(cursor_id)
+    if created_from:
+        conditions.append("created_at >= ?")
+        params.append(created_from)
+    if created_to:
+        conditions.append("created_at < ?")
+        params.append(created_to)
+    if platform:
+        conditions.append("source_platform = ?")
+        params.append(platform)
+    if min_confidence is not None:
+        conditions.append("confidence >= ?")
+        params.append(min_confidence)
+    if max_confidence is not None:
+        conditions.append("confidence <= ?")
+        params.append(max_confidence)
+    if tags:
+        tags = list(dict.fromkeys(tags))
+        conditions.append(f"""id IN (
+            SELECT recipe_id FROM recipe_tags WHERE tag IN ({", ".join("?" * len(tags))})
+            GROUP BY recipe_id HAVING COUNT(*) = ?
+        )""")
+        params.extend(tags)
+        params.append(len(tags))
+
+    columns = ", ".join(_SUMMARY_COLUMNS + (_OCR_COLUMNS if include_ocr else ()))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = get_connection()
+    rows = conn.execute(
+        f"SELECT {columns} FROM recipes {where} ORDER BY id DESC LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+
+    return _to_summaries(conn, rows)
+
+
+def _to_summaries(conn: sqlite3.Connection, rows: list[sqlite3.Row]) -> list[dict]:
+    recipes = []
+    for row in rows:
+        recipe = {key: row[key] for key in row.keys() if key != "ocr_blocks_json"}
+        if "ocr_blocks_json" in row.keys():
+            recipe["ocr_blocks"] = json.loads(row["ocr_blocks_json"]) if row["ocr_blocks_json"] else []
+        recipe["tags"] = []
+        recipes.append(recipe)
+
+    # ページ内のレシピのタグをまとめて読む
+    by_id = {recipe["id"]: recipe for recipe in recipes}
+    if by_id:
+        tag_rows = conn.execute(
+            f"SELECT recipe_id, tag FROM recipe_tags WHERE recipe_id IN ({', '.join('?' * len(by_id))})",
+            list(by_id),
+        ).fetchall()
+        for row in tag_rows:
+            by_id[row["recipe_id"]]["tags"].append(row["tag"])
+
+    return recipes
+
+
+# trigramで索引できる最短の語（これより短い語はLIKEで絞る）
+_TRIGRAM_MIN_CHARS = 3
+
+# bm25の列ごとの重み（recipe_id, title, ingredients, steps）
+_SEARCH_WEIGHTS = (0.0, 10.0, 5.0, 1.0)
+
+
+def is_search_enabled() -> bool:
+    return _search_enabled
+
+
+def search_recipes(
+    query: str, limit: int, offset: int = 0, include_ocr: bool = False, rank_all: bool = False
+) -> tuple[list[dict], bool]:
+    """
+    タイトル・材料名・手順の全文検索（空白区切りの語をすべて含むもの）
+
+    3文字以上の語はtrigram索引で引き、bm25の高い順に並べる。2文字以下の語
+    （「大根」など）は索引を使えないため、3文字以上の語で絞った結果をLIKEで
+    さらに絞る。短い語しかない場合はLIKEで新しい順に走査する。
+
+    bm25の計算は一致した行数に比例するため、一致が SEARCH_RANK_WINDOW 件を
+    超える語（「しょうゆ」など）では新しい方から SEARCH_RANK_WINDOW 件だけを順位付けする。
+    rank_all=True なら件数によらず一致したすべてを順位付けする。
+
+    Returns:
+        (検索結果, 一致の一部だけを順位付けしたか)
+    """
+    terms = list(dict.fromkeys(query.split()))
+    long_terms = [t for t in terms if len(t) >= _TRIGRAM_MIN_CHARS]
+    short_terms = [t for t in terms if len(t) < _TRIGRAM_MIN_CHARS]
+    if not terms:
+        return [], False
+
+    conn = get_connection()
+    conditions = []
+    params: list = []
+    truncated = False
+    if long_terms:
+        # 各語をフレーズとして引用し、FTS5の演算子（AND/OR/*等）として解釈させない
+        match = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+        conditions.append("recipes_fts MATCH ?")
+        params.append(match)
+
+        window = 0 if rank_all or SEARCH_RANK_WINDOW <= 0 else max(SEARCH_RANK_WINDOW, offset + limit)
+        bound = window and conn.execute(
+            "SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, window - 1),
+        ).fetchone()
+        if bound:
+            conditions.append("rowid >= ?")
+            params.append(bound[0])
+            truncated = True
+    for term in short_terms:
+        pattern = "%" + re.sub(r"([\\%_])", r"\\\1", term) + "%"
+        conditions.append(
+            "(title LIKE ? ESCAPE '\\' OR ingredients LIKE ? ESCAPE '\\' OR steps LIKE ? ESCAPE '\\')"
+        )
+        params.extend([pattern] * 3)
+
+    if long_terms:
+        score = f"-bm25(recipes_fts, {', '.join(map(str, _SEARCH_WEIGHTS))})"
+        order, hits_order = "score DESC", "hits.score DESC"
+    else:
+        score = "NULL"
+        order, hits_order = "rowid DESC", "hits.position DESC"
+
+    # 索引だけで順位を決め、表示する行だけを recipes から読む
+    columns = ", ".join(f"r.{c}" for c in _SUMMARY_COLUMNS + (_OCR_COLUMNS if include_ocr else ()))
+    rows = conn.execute(
+        f"""
+        WITH hits AS (
+            SELECT recipe_id, rowid AS position, {score} AS score FROM recipes_fts
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order} LIMIT ? OFFSET ?
+        )
+        SELECT {columns}, hits.score FROM hits JOIN recipes AS r ON r.id = hits.recipe_id
+        ORDER BY {hits_order}
+        """,
+        (*params, limit, offset),
+    ).fetchall()
+    return _to_summaries(conn, rows), truncated
+
+
 def check_db_connection() -> bool:
     """DB接続をチェック"""
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
-        conn.close()
         return True
     except Exception:
         return False
+
+
+def create_job(
+    job_id: str,
+    upload_path: str,
+    recipe_id: str,
+    source_url: Optional[str] = None,
+    title_hint: Optional[str] = None,
+    force: bool = False,
+) -> None:
+    """取り込みジョブを登録"""
+    now = datetime.utcnow().isoformat()
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            INSERT INTO jobs (
+                id, created_at, updated_at, status, stage, upload_path,
+                source_url, title_hint, recipe_id, force, error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            job_id,
+            now,
+            now,
+            "queued",
+            None,
+            upload_path,
+            source_url,
+            title_hint,
+            recipe_id,
+            int(force),
+            None,
+        ))
+
+
+def update_job(
+    job_id: str,
+    status: str,
+    stage: Optional[str] = None,
+    error: Optional[str] = None,
+    recipe_id: Optional[str] = None,
+) -> None:
+    """ジョブの状態を更新（recipe_idは重複検出で既存レシピに紐付いた場合のみ指定）"""
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            UPDATE jobs SET status = ?, stage = ?, error = ?, updated_at = ?,
+                recipe_id = COALESCE(?, recipe_id)
+            WHERE id = ?
+        """, (status, stage, error, datetime.utcnow().isoformat(), recipe_id, job_id))
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "status": row["status"],
+        "stage": row["stage"],
+        "upload_path": row["upload_path"],
+        "source_url": row["source_url"],
+        "title_hint": row["title_hint"],
+        "recipe_id": row["recipe_id"],
+        "force": bool(row["force"]),
+        "error": row["error"],
+    }
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """ジョブを取得"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+
+    if not row:
+        return None
+
+    return _row_to_job(row)
+
+
+def list_unfinished_jobs() -> list[dict]:
+    """未完了（queued/running）のジョブを古い順に取得"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY id"
+    )
+    rows = cursor.fetchall()
+
+    return [_row_to_job(row) for row in rows]
+
+
+def save_image_hash(
+    content_hash: str,
+    perceptual_hash: Optional[str],
+    recipe_id: str,
+    size: Optional[tuple[int, int]] = None,
+) -> None:
+    """アップロード画像のハッシュとレシピの対応を記録（同じハッシュは最新のレシピで上書き）"""
+    width, height = size or (None, None)
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO image_hashes (
+                content_hash, perceptual_hash, recipe_id, created_at, width, height
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (content_hash, perceptual_hash, recipe_id, datetime.utcnow().isoformat(), width, height))
+
+
+def find_recipe_id_by_hash(content_hash: str) -> Optional[str]:
+    """生バイトのハッシュが一致するレシピIDを取得"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT recipe_id FROM image_hashes WHERE content_hash = ?",
+        (content_hash,),
+    )
+    row = cursor.fetchone()
+
+    return row["recipe_id"] if row else None
+
+
+def find_perceptual_candidates(size: tuple[int, int], limit: int) -> list[tuple[str, str]]:
+    """前処理後の画像サイズが同じ取り込み済み画像の（知覚ハッシュ, レシピID）を新しい順に取得"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT perceptual_hash, recipe_id FROM image_hashes
+        WHERE width = ? AND height = ? AND perceptual_hash IS NOT NULL
+        ORDER BY created_at DESC
+        LIMIT ?
+    """, (size[0], size[1], limit))
+
+    return [(row["perceptual_hash"], row["recipe_id"]) for row in cursor.fetchall()]
+
+
+def get_llm_cache(cache_key: str, ttl_seconds: float) -> Optional[dict]:
+    """LLM応答キャッシュを取得（期限切れはNone）。ヒット時は最終利用時刻を更新"""
+    now = time.time()
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT response_json FROM llm_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, now - ttl_seconds),
+        )
+        row = cursor.fetchone()
+
+        if row:
+            cursor.execute(
+                "UPDATE llm_cache SET last_used_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, cache_key),
+            )
+
+    return json.loads(row["response_json"]) if row else None
+
+
+def put_llm_cache(cache_key: str, response: dict, ttl_seconds: float, max_entries: int) -> None:
+    """LLM応答をキャッシュし、期限切れと上限超過分（最終利用が古い順）を削除"""
+    now = time.time()
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO llm_cache (
+                cache_key, response_json, created_at, last_used_at, hit_count
+            ) VALUES (?, ?, ?, ?, 0)
+        """, (cache_key, json.dumps(response, ensure_ascii=False), now, now))
+
+        cursor.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - ttl_seconds,))
+        cursor.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,))
+
+
+def list_image_keys() -> set[str]:
+    """いずれかのレシピから参照されている保存画像のキー"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT image_path FROM recipes
+        UNION
+        SELECT image_key FROM recipe_images
+    """)
+    return {row[0] for row in cursor.fetchall()}
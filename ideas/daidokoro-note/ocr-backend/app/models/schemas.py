@@ -36,6 +36,12 @@ class IngestResponse(BaseModel):
     structured_recipe: Optional[StructuredRecipe] = None
     confidence: Optional[float] = None
     warnings: list[str] = []
+    cache_hit: bool = False
+
+
+class BatchIngestResponse(BaseModel):
+    merged: bool
+    recipes: list[IngestResponse]
 
 
 class RecipeResponse(BaseModel):
@@ -43,17 +49,89 @@ class RecipeResponse(BaseModel):
     created_at: str
     source_url: Optional[str] = None
     image_path: str
+    thumbnail_url: Optional[str] = None
     ocr_raw_text: str
     structured_recipe: Optional[StructuredRecipe] = None
     confidence: Optional[float] = None
     warnings: list[str] = []
 
 
+class RecipeSummary(BaseModel):
+    id: str
+    created_at: str
+    source_url: Optional[str] = None
+    source_platform: Optional[str] = None
+    title: Optional[str] = None
+    tags: list[str] = []
+    confidence: Optional[float] = None
+    image_path: str
+    thumbnail_url: Optional[str] = None
+    # include_ocr=true の場合のみ
+    ocr_raw_text: Optional[str] = None
+    ocr_blocks: Optional[list[dict]] = None
+
+
+class RecipeListResponse(BaseModel):
+    recipes: list[RecipeSummary]
+    next_cursor: Optional[str] = None
+
+
+class RecipeSearchHit(RecipeSummary):
+    # bm25による関連度（大きいほど一致度が高い。2文字以下の語だけで検索した場合はnull）
+    score: Optional[float] = None
+
+
+class RecipeSearchResponse(BaseModel):
+    query: str
+    recipes: list[RecipeSearchHit]
+    # 一致が多すぎたため、新しい方から SEARCH_RANK_WINDOW 件だけを順位付けした
+    truncated: bool = False
+
+
+class JobAcceptedResponse(BaseModel):
+    job_id: str
+    recipe_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    created_at: str
+    updated_at: str
+    recipe_id: str
+    error: Optional[str] = None
+
+
+class OcrModelStatus(BaseModel):
+    state: str  # starting / loading / ready / failed
+    error: Optional[str] = None
+    load_seconds: Optional[float] = None
+
+
+class LivenessResponse(BaseModel):
+    status: str
+
+
+class ReadinessResponse(BaseModel):
+    status: str  # ready / not_ready
+    ocr_model: OcrModelStatus
+    db_connected: bool
+
+
 class HealthResponse(BaseModel):
     status: str
     ocr_loaded: bool
+    ocr_model: Optional[OcrModelStatus] = None
     db_connected: bool
     ollama_available: bool
+    executors: dict[str, dict[str, int]] = {}
+    admission: dict[str, dict[str, int]] = {}
+    ollama_pool: dict[str, int] = {}
+    memory: dict[str, dict[str, float]] = {}
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,4 @@
+from contextvars import ContextVar
+
+# 処理中のリクエストID（ログに付与する。スレッドプールへもcontextvarsごと引き継がれる）
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
@@ -1,9 +1,13 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
-from app.models.schemas import HealthResponse
+from app.models.schemas import HealthResponse, LivenessResponse, ReadinessResponse
 from app.models.database import check_db_connection
-from app.services.ocr_service import is_ocr_loaded
-from app.services.llm_service import check_ollama_available
+from app.services.readiness import is_ready, has_failed, model_status
+from app.services.llm_service import check_ollama_available, get_http_pool_stats
+from app.services.executors import run_db, executor_stats
+from app.services.pipeline import get_pipeline
+from app.services.admission import get_admission
 
 router = APIRouter(tags=["health"])
 
@@ -11,8 +15,8 @@ router = APIRouter(tags=["health"])
 @router.get("/v1/health", response_model=HealthResponse)
 async def health_check():
     """ヘルスチェック"""
-    ocr_loaded = is_ocr_loaded()
-    db_connected = check_db_connection()
+    ocr_loaded = is_ready()
+    db_connected = await run_db(check_db_connection)
     ollama_available = await check_ollama_available()
 
     status = "healthy" if (ocr_loaded and db_connected) else "degraded"
@@ -20,6 +24,44 @@ async def health_check():
     return HealthResponse(
         status=status,
         ocr_loaded=ocr_loaded,
+        ocr_model=model_status(),
         db_connected=db_connected,
         ollama_available=ollama_available,
+        executors=executor_stats(),
+        admission=get_admission().stats(),
+        ollama_pool=get_http_pool_stats(),
+        memory=get_pipeline().memory_stats(),
     )
+
+
+@router.get("/v1/health/live", response_model=LivenessResponse, responses={503: {"model": LivenessResponse}})
+async def liveness():
+    """
+    プロセスが応答できるか（liveness probe用）
+
+    DBやOllamaには触れず、モデルのロード中でも即座に返す。ロードに失敗した場合だけ503
+    （再起動しないと回復しないため）。
+    """
+    if has_failed():
+        return JSONResponse(status_code=503, content=LivenessResponse(status="failed").model_dump())
+    return LivenessResponse(status="alive")
+
+
+@router.get("/v1/health/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readiness():
+    """
+    取り込みを受け付けられるか（readiness probe用）
+
+    OCRモデルのロードとウォームアップが済み、DBに接続できれば200、それ以外は503。
+    Ollamaは外部サービスのため見ない（落ちていてもレプリカを入れ替えても直らない）。
+    """
+    db_connected = await run_db(check_db_connection)
+    ready = is_ready() and db_connected
+    body = ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        ocr_model=model_status(),
+        db_connected=db_connected,
+    )
+    if not ready:
+        return JSONResponse(status_code=503, content=body.model_dump())
+    return body
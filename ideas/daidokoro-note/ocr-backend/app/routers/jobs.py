@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+
+from app.config import JOB_EVENTS_HEARTBEAT
+from app.models.schemas import JobStatusResponse
+from app.models.database import get_job
+from app.services.job_service import subscribe, unsubscribe, TERMINAL_STATUSES
+from app.services.executors import run_db
+from app.dependencies import verify_token
+
+router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
+
+
+def _to_response(job: dict) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        stage=job["stage"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        recipe_id=job["recipe_id"],
+        error=job["error"],
+    )
+
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    _: str = Depends(verify_token),
+):
+    """ジョブの状態を取得"""
+    job = await run_db(get_job, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return _to_response(job)
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    _: str = Depends(verify_token),
+):
+    """ジョブの進捗をServer-Sent Eventsで配信（完了または失敗で終了）"""
+    # 取りこぼしを防ぐため、現在状態の取得より先に購読する
+    queue = subscribe(job_id)
+    job = await run_db(get_job, job_id)
+
+    if not job:
+        unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        try:
+            yield _format_sse("status", _to_response(job).model_dump())
+            if job["status"] in TERMINAL_STATUSES:
+                return
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=JOB_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield _format_sse(message["event"], message["data"])
+                if message["event"] == "status" and message["data"]["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
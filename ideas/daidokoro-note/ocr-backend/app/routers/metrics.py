@@ -0,0 +1,41 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.services.executors import executor_stats
+from app.services.llm_service import get_http_pool_stats
+from app.services.memory import current_rss, peak_rss
+from app.services.metrics import (
+    CONTENT_TYPE,
+    EXECUTOR_TASKS,
+    LLM_CONNECTIONS,
+    PIPELINE_QUEUE_DEPTH,
+    PROCESS_MEMORY,
+    render_metrics,
+)
+from app.services.pipeline import get_pipeline
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus形式のメトリクス"""
+    _collect_gauges()
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+def _collect_gauges():
+    """取得時点の値で決まるゲージを更新"""
+    for stage, depth in get_pipeline().queue_depths().items():
+        PIPELINE_QUEUE_DEPTH.set(depth, stage=stage)
+
+    for pool, stats in executor_stats().items():
+        EXECUTOR_TASKS.set(stats["queued"], pool=pool, state="queued")
+        EXECUTOR_TASKS.set(stats["running"], pool=pool, state="running")
+
+    http = get_http_pool_stats()
+    LLM_CONNECTIONS.set(http["connections"] - http["idle_connections"], state="active")
+    LLM_CONNECTIONS.set(http["idle_connections"], state="idle")
+
+    PROCESS_MEMORY.set(current_rss(), kind="rss")
+    PROCESS_MEMORY.set(peak_rss(), kind="peak_rss")
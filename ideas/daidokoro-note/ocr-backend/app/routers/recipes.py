@@ -1,35 +1,301 @@
-import asyncio
-from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Depends
+import os
+import re
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Depends, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 from typing import Optional
 import ulid
 
-from app.config import MAX_UPLOAD_BYTES, ALLOWED_EXTENSIONS, ALLOWED_MIMETYPES, OLLAMA_MODEL
-from app.models.schemas import IngestResponse, RecipeResponse, StructuredRecipe
-from app.models.database import save_recipe, get_recipe
-from app.services.image_processor import process_image, save_image
-from app.services.ocr_service import run_ocr
-from app.services.llm_service import structure_recipe
-from app.dependencies import verify_token
+from app.config import (
+    MAX_UPLOAD_BYTES,
+    ALLOWED_EXTENSIONS,
+    ALLOWED_MIMETYPES,
+    BATCH_MAX_IMAGES,
+    RECIPE_LIST_DEFAULT_LIMIT,
+    RECIPE_LIST_MAX_LIMIT,
+    RECIPE_SEARCH_MAX_OFFSET,
+    ADMISSION_QUEUE_TIMEOUT,
+)
+from app.models.schemas import (
+    IngestResponse,
+    BatchIngestResponse,
+    RecipeResponse,
+    RecipeListResponse,
+    RecipeSummary,
+    RecipeSearchHit,
+    RecipeSearchResponse,
+    StructuredRecipe,
+    JobAcceptedResponse,
+)
+from app.models.database import get_recipe, list_recipes, search_recipes, is_search_enabled
+from app.services.pipeline import (
+    IngestJob,
+    IngestPage,
+    RecipeDraft,
+    ImageProcessingError,
+    get_pipeline,
+)
+from app.services.job_service import enqueue_job
+from app.services.admission import AdmissionRejected, get_admission
+from app.services.dedup import content_hash, find_duplicate
+from app.services.image_processor import read_image_header
+from app.services.image_writer import ensure_thumbnail, media_type
+from app.services.storage import get_storage
+from app.services.executors import run_db, run_image, run_storage
+from app.services.tracing import current_trace, record_span, span
+from app.dependencies import verify_token, require_ocr_ready
 
 router = APIRouter(prefix="/v1/recipes", tags=["recipes"])
 
-# 同時実行制御用セマフォ
-_semaphore = asyncio.Semaphore(1)
+# ULID（Crockford Base32の26文字）
+_ULID_PATTERN = re.compile(r"^[0-9A-HJKMNP-TV-Z]{26}$")
+
+
+@router.get("", response_model=RecipeListResponse)
+async def list_recipe_summaries(
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+    limit: int = Query(RECIPE_LIST_DEFAULT_LIMIT, ge=1, le=RECIPE_LIST_MAX_LIMIT),
+    created_from: Optional[datetime] = Query(None, description="この日時以降に保存されたもの（UTC）"),
+    created_to: Optional[datetime] = Query(None, description="この日時より前に保存されたもの（UTC）"),
+    platform: Optional[str] = Query(None, description="投稿元（instagram, youtube, cookpad等）"),
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    max_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    tag: list[str] = Query([], description="指定したタグをすべて持つもの（複数指定可）"),
+    include_ocr: bool = Query(False, description="OCRテキストとブロックも返す"),
+    _: str = Depends(verify_token),
+):
+    """
+    保存済みレシピを新しい順に一覧する
+
+    次のページは next_cursor を cursor に渡して取得する（最後のページでは null）。
+    """
+    if cursor is not None and not _ULID_PATTERN.match(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # 1件多く読み、次のページがあるかを判定する
+    recipes = await run_db(
+        list_recipes,
+        limit + 1,
+        cursor_id=cursor,
+        created_from=_to_db_time(created_from),
+        created_to=_to_db_time(created_to),
+        platform=platform.strip().lower() if platform else None,
+        min_confidence=min_confidence,
+        max_confidence=max_confidence,
+        tags=[t.strip() for t in tag if t.strip()],
+        include_ocr=include_ocr,
+    )
+    next_cursor = recipes[limit - 1]["id"] if len(recipes) > limit else None
+
+    return RecipeListResponse(
+        recipes=[
+            RecipeSummary(**recipe, thumbnail_url=f"{router.prefix}/{recipe['id']}/thumbnail")
+            for recipe in recipes[:limit]
+        ],
+        next_cursor=next_cursor,
+    )
 
 
-@router.post("/ingest", response_model=IngestResponse)
+@router.get("/search", response_model=RecipeSearchResponse)
+async def search_recipe_summaries(
+    q: str = Query(..., min_length=1, max_length=200, description="検索語（空白区切りで複数指定するとすべてを含むもの）"),
+    limit: int = Query(RECIPE_LIST_DEFAULT_LIMIT, ge=1, le=RECIPE_LIST_MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=RECIPE_SEARCH_MAX_OFFSET),
+    include_ocr: bool = Query(False, description="OCRテキストとブロックも返す"),
+    rank_all: bool = Query(False, description="一致が多い語でも一致したすべてを順位付けする（遅くなる）"),
+    _: str = Depends(verify_token),
+):
+    """タイトル・材料名・手順を全文検索し、関連度の高い順に返す"""
+    if not is_search_enabled():
+        raise HTTPException(status_code=503, detail="Full-text search is not available")
+
+    recipes, truncated = await run_db(search_recipes, q, limit, offset, include_ocr, rank_all)
+    return RecipeSearchResponse(
+        query=q,
+        recipes=[
+            RecipeSearchHit(**recipe, thumbnail_url=f"{router.prefix}/{recipe['id']}/thumbnail")
+            for recipe in recipes
+        ],
+        truncated=truncated,
+    )
+
+
+def _to_db_time(value: Optional[datetime]) -> Optional[str]:
+    """created_at と同じ形式（タイムゾーンなしのUTCのISO 8601）にする"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+@router.post(
+    "/ingest",
+    response_model=IngestResponse,
+    responses={202: {"model": JobAcceptedResponse}},
+    dependencies=[Depends(require_ocr_ready)],
+)
 async def ingest_recipe(
+    request: Request,
     image: UploadFile = File(...),
     source_url: Optional[str] = Form(None),
     title_hint: Optional[str] = Form(None),
     lang: str = Form("ja"),
+    async_mode: bool = Form(False),
+    force: bool = Form(False),
     _: str = Depends(verify_token),
 ):
     """
     画像を受け取り、OCR→構造化→保存まで実行し、結果を返す
+
+    async_mode=true の場合はジョブを登録して即座に 202 を返す。
+    進捗は GET /v1/jobs/{job_id}（または /events のSSE）で確認する。
+
+    同じ画像が取り込み済みなら保存済みの結果を返す（cache_hit=true）。
+    force=true で重複検出をせずに再処理する。
+    """
+    _record_upload()
+    source = await _read_upload(image)
+
+    request_id = getattr(request.state, "request_id", "-")
+
+    # 重複検出: 同一バイト列なら待ち行列に入らず即座に返す
+    with span("hash"):
+        page = IngestPage(source, content_hash=await run_image(content_hash, source))
+    if not force:
+        with span("dedup") as attrs:
+            existing = await run_db(find_duplicate, page.content_hash)
+            attrs["hit"] = bool(existing)
+        if existing:
+            draft = RecipeDraft(recipe_id=existing["id"], pages=[page])
+            draft.use_cached(existing)
+            return _to_ingest_response(draft)
+
+    # 非同期モード: アップロードを永続化してジョブIDを返す
+    if async_mode:
+        try:
+            accepted = await enqueue_job(
+                source,
+                source_url=source_url,
+                title_hint=title_hint,
+                force=force,
+                request_id=request_id,
+            )
+        except AdmissionRejected as e:
+            raise _rejected(e)
+        status_url = f"/v1/jobs/{accepted['job_id']}"
+        body = JobAcceptedResponse(
+            **accepted,
+            status_url=status_url,
+            events_url=f"{status_url}/events",
+        )
+        return JSONResponse(
+            status_code=202,
+            content=body.model_dump(),
+            headers={"Location": status_url},
+        )
+
+    # ステージ別パイプラインで処理（前処理/OCR/LLM/保存）
+    job = IngestJob(
+        drafts=[RecipeDraft(recipe_id=str(ulid.new()), pages=[page])],
+        source_url=source_url,
+        title_hint=title_hint,
+        request_id=request_id,
+        dedup=not force,
+    )
+    job = await _submit(job, "interactive")
+
+    return _to_ingest_response(job.drafts[0])
+
+
+@router.post("/ingest-batch", response_model=BatchIngestResponse, dependencies=[Depends(require_ocr_ready)])
+async def ingest_recipe_batch(
+    request: Request,
+    images: list[UploadFile] = File(...),
+    merge: bool = Form(True),
+    source_url: Optional[str] = Form(None),
+    title_hint: Optional[str] = Form(None),
+    lang: str = Form("ja"),
+    force: bool = Form(False),
+    _: str = Depends(verify_token),
+):
+    """
+    複数画像をまとめて取り込む
+
+    OCRの認識は全画像分を1回のバッチ推論で行う。
+    merge=true（デフォルト）なら全ページを1レシピに、falseなら画像ごとに1レシピずつ作る。
+    merge=false では画像ごとに重複検出を行う（force=true で無効化）。
+    """
+    if len(images) > BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images. Maximum: {BATCH_MAX_IMAGES}"
+        )
+
+    _record_upload()
+    pages = [IngestPage(await _read_upload(image)) for image in images]
+
+    if merge:
+        drafts = [RecipeDraft(recipe_id=str(ulid.new()), pages=pages)]
+    else:
+        drafts = [RecipeDraft(recipe_id=str(ulid.new()), pages=[page]) for page in pages]
+
+    job = IngestJob(
+        drafts=drafts,
+        source_url=source_url,
+        title_hint=title_hint,
+        request_id=getattr(request.state, "request_id", "-"),
+        dedup=not force,
+    )
+    job = await _submit(job, "bulk")
+
+    return BatchIngestResponse(
+        merged=merge,
+        recipes=[_to_ingest_response(draft) for draft in job.drafts],
+    )
+
+
+async def _submit(job: IngestJob, priority: str) -> IngestJob:
+    """
+    受け付け枠を確保してパイプラインで処理する
+
+    アップロードの受信・認証・検証が済んでから枠を取るため、遅いアップロードや
+    不正なリクエストがパイプラインの枠を埋めることはない。あふれたら 429/503（Retry-After 付き）。
     """
-    warnings = []
+    try:
+        async with get_admission().slot(priority, ADMISSION_QUEUE_TIMEOUT):
+            return await get_pipeline().submit(job)
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except ImageProcessingError as e:
+        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
 
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    """受け付けの上限超過を Retry-After 付きのエラー応答にする"""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _record_upload():
+    """リクエスト開始からここまで（本文の受信とmultipartの解析）を upload スパンとして記録"""
+    trace = current_trace()
+    if trace is not None:
+        record_span("upload", trace.start)
+
+
+async def _read_upload(image: UploadFile) -> BinaryIO:
+    """
+    アップロード画像を検証し、一時ファイルをそのまま返す
+
+    multipartの受信時点で一時ファイル（一定サイズを超えるとディスク）に書かれているため、
+    bytesへ読み出さずにハッシュ計算・デコードに使う。
+    """
     # ファイル検証
     if image.content_type not in ALLOWED_MIMETYPES:
         raise HTTPException(
@@ -45,78 +311,46 @@ async def ingest_recipe(
             detail=f"Unsupported file extension: {ext}. Allowed: {ALLOWED_EXTENSIONS}"
         )
 
-    # ファイルサイズチェック
-    contents = await image.read()
-    if len(contents) > MAX_UPLOAD_BYTES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {MAX_UPLOAD_BYTES // (1024*1024)}MB"
-        )
-
-    # セマフォで直列化（CPU保護）
-    async with _semaphore:
-        # レシピID生成
-        recipe_id = str(ulid.new())
+    # ファイルサイズチェック（末尾へシークしてサイズだけを得る）
+    source = image.file
+    with span("validate") as attrs:
+        size = await run_image(source.seek, 0, os.SEEK_END)
+        source.seek(0)
+        attrs["bytes"] = size
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Maximum size: {MAX_UPLOAD_BYTES // (1024*1024)}MB"
+            )
 
-        # 画像前処理
+        # 先頭バイトで形式を判定し、ヘッダの画像サイズを検証（画素のデコード前に弾く）
         try:
-            processed_image = process_image(contents)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+            await run_image(read_image_header, source)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        # 画像保存
-        image_path = save_image(processed_image, recipe_id)
+    return source
 
-        # OCR実行
+
+def _to_ingest_response(draft: RecipeDraft) -> IngestResponse:
+    """パイプラインの結果をレスポンスに変換"""
+    warnings = draft.warnings
+
+    structured_recipe = None
+    if draft.structured:
         try:
-            raw_text, ocr_blocks, confidence = run_ocr(processed_image)
-        except Exception as e:
-            warnings.append(f"OCR_ERROR: {str(e)}")
-            raw_text = ""
-            ocr_blocks = []
-            confidence = 0.0
-
-        if not raw_text:
-            warnings.append("OCR_TEXT_EMPTY")
-
-        # LLM構造化
-        structured_dict = None
-        if raw_text:
-            structured_dict, llm_warnings = await structure_recipe(
-                raw_text,
-                source_url=source_url,
-                title_hint=title_hint,
-            )
-            warnings.extend(llm_warnings)
-
-        # DB保存
-        save_recipe(
-            recipe_id=recipe_id,
-            image_path=image_path,
-            ocr_raw_text=raw_text,
-            ocr_blocks=ocr_blocks,
-            structured_json=structured_dict,
-            confidence=confidence,
-            warnings=warnings,
-            source_url=source_url,
-            llm_model=OLLAMA_MODEL if structured_dict else None,
-        )
+            structured_recipe = StructuredRecipe(**draft.structured)
+        except Exception:
+            warnings.append("SCHEMA_VALIDATION_FAILED")
 
-        # レスポンス構築
-        structured_recipe = None
-        if structured_dict:
-            try:
-                structured_recipe = StructuredRecipe(**structured_dict)
-            except Exception:
-                warnings.append("SCHEMA_VALIDATION_FAILED")
-
-        return IngestResponse(
-            recipe_id=recipe_id,
-            raw_ocr_text=raw_text,
-            structured_recipe=structured_recipe,
-            confidence=confidence,
-            warnings=warnings,
-        )
+    return IngestResponse(
+        recipe_id=draft.recipe_id,
+        raw_ocr_text=draft.raw_text,
+        structured_recipe=structured_recipe,
+        confidence=draft.confidence,
+        warnings=warnings,
+        cache_hit=draft.cache_hit,
+    )
 
 
 @router.get("/{recipe_id}", response_model=RecipeResponse)
@@ -125,7 +359,7 @@ async def get_recipe_by_id(
     _: str = Depends(verify_token),
 ):
     """保存済みレシピを取得"""
-    recipe = get_recipe(recipe_id)
+    recipe = await run_db(get_recipe, recipe_id)
 
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
@@ -142,8 +376,31 @@ async def get_recipe_by_id(
         created_at=recipe["created_at"],
         source_url=recipe["source_url"],
         image_path=recipe["image_path"],
+        thumbnail_url=f"{router.prefix}/{recipe['id']}/thumbnail",
         ocr_raw_text=recipe["ocr_raw_text"],
         structured_recipe=structured_recipe,
         confidence=recipe["confidence"],
         warnings=recipe["warnings"],
     )
+
+
+@router.get("/{recipe_id}/thumbnail")
+async def get_recipe_thumbnail(
+    recipe_id: str,
+    _: str = Depends(verify_token),
+):
+    """保存済みレシピの画像のサムネイル（長辺 THUMBNAIL_SIZE px）"""
+    recipe = await run_db(get_recipe, recipe_id)
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    key = await ensure_thumbnail(recipe["image_path"])
+    if key is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers = {"Cache-Control": "private, max-age=86400"}
+    storage = get_storage()
+    path = storage.local_path(key)
+    if path is not None:
+        return FileResponse(path, media_type=media_type(key), headers=headers)
+    return Response(await run_storage(storage.get, key), media_type=media_type(key), headers=headers)
@@ -0,0 +1,186 @@
+"""
+取り込みの受け付け制限
+
+パイプラインへ同時に入れる取り込み数に上限を設け、あふれたリクエストは優先度ごとの列で待たせる。
+列が一杯なら 429、期限までに空かなければ 503 を、観測したスループットから見積もった
+Retry-After 付きで返す（待たせ続けてクライアント側でタイムアウトさせない）。
+
+優先度は interactive（1枚ずつの取り込み）> bulk（一括取り込み）> background（非同期ジョブ）の順で、
+空きができたら上位の列から通す。bulk と background は ADMISSION_INTERACTIVE_RESERVED 件分の枠を
+使えないため、一括の取り込みが続いていても1枚ずつの取り込みは待たされにくい。
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.config import (
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_INTERACTIVE_RESERVED,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_DEFAULT_RETRY_AFTER,
+    ADMISSION_MAX_RETRY_AFTER,
+)
+from app.services.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT_SECONDS,
+)
+from app.services.pipeline import get_pipeline
+from app.services.tracing import record_span
+
+# 優先度の高い順
+PRIORITIES = ("interactive", "bulk", "background")
+
+
+class AdmissionRejected(Exception):
+    """受け付けの上限を超えた（429: 待ち列が一杯 / 503: 期限までに空かなかった）"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """優先度つきの受け付け枠"""
+
+    def __init__(self, max_inflight: int, interactive_reserved: int, max_queue: int):
+        self.max_inflight = max(1, max_inflight)
+        # bulk と background が合わせて使える枠
+        self.shared_limit = max(1, self.max_inflight - interactive_reserved)
+        self.max_queue = max_queue
+        self.inflight = {priority: 0 for priority in PRIORITIES}
+        self._waiters: dict[str, deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+
+    def _can_run(self, priority: str) -> bool:
+        if sum(self.inflight.values()) >= self.max_inflight:
+            return False
+        if priority == "interactive":
+            return True
+        return self.inflight["bulk"] + self.inflight["background"] < self.shared_limit
+
+    def _has_waiters(self, up_to: str) -> bool:
+        """up_to 以上の優先度の列に待ちがあるか（後から来たリクエストに追い越させない）"""
+        for priority in PRIORITIES:
+            if self._waiters[priority]:
+                return True
+            if priority == up_to:
+                return False
+        return False
+
+    def waiting(self) -> int:
+        """HTTPリクエストの待ち件数（非同期ジョブは数えない）"""
+        return len(self._waiters["interactive"]) + len(self._waiters["bulk"])
+
+    def retry_after(self, backlog: Optional[int] = None) -> int:
+        """
+        今ある仕事を観測したスループットで捌き切るまでの秒数
+
+        backlog を省略した場合は受け付け枠の処理中 + 待ちの件数を使う。
+        """
+        throughput = get_pipeline().throughput()
+        if not throughput:
+            return ADMISSION_DEFAULT_RETRY_AFTER
+        if backlog is None:
+            backlog = sum(self.inflight.values()) + sum(len(waiters) for waiters in self._waiters.values())
+        return min(ADMISSION_MAX_RETRY_AFTER, max(1, math.ceil(backlog / throughput)))
+
+    def _update_gauges(self, priority: str):
+        ADMISSION_IN_FLIGHT.set(self.inflight[priority], priority=priority)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters[priority]), priority=priority)
+
+    def _grant(self, priority: str):
+        self.inflight[priority] += 1
+        self._update_gauges(priority)
+
+    async def acquire(self, priority: str, timeout: Optional[float] = None):
+        """
+        枠を1つ確保する（空くまで待つ）
+
+        timeout を指定した場合（HTTPリクエスト）は、待ち列が一杯なら即座に、
+        timeout 秒以内に空かなければその時点で AdmissionRejected。
+        """
+        start = time.perf_counter()
+        if self._can_run(priority) and not self._has_waiters(priority):
+            self._grant(priority)
+            ADMISSION_WAIT_SECONDS.observe(0.0, priority=priority)
+            return
+
+        if timeout is not None and self.waiting() >= self.max_queue:
+            ADMISSION_REJECTED.inc(priority=priority, reason="queue_full")
+            raise AdmissionRejected(429, "Too many ingest requests queued", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        self._update_gauges(priority)
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 期限や切断と同時に枠が割り当てられていた
+                if isinstance(e, TimeoutError):
+                    return
+                self.release(priority)
+                raise
+            # 切断で取り消された待ちは release 側で取り除かれていることがある
+            if waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+            self._update_gauges(priority)
+            if isinstance(e, TimeoutError):
+                ADMISSION_REJECTED.inc(priority=priority, reason="timeout")
+                raise AdmissionRejected(
+                    503, "Ingest queue is busy, try again later", self.retry_after()
+                ) from None
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, priority=priority)
+            record_span("admission", start, priority=priority)
+
+    def release(self, priority: str):
+        """枠を返し、待っているリクエストを優先度の高い順に通す"""
+        self.inflight[priority] -= 1
+        self._update_gauges(priority)
+        for waiting_priority in PRIORITIES:
+            waiters = self._waiters[waiting_priority]
+            while waiters and self._can_run(waiting_priority):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._grant(waiting_priority)
+            self._update_gauges(waiting_priority)
+
+    @asynccontextmanager
+    async def slot(self, priority: str, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """枠を確保して with ブロックを実行する"""
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """優先度ごとの処理中・待ち件数"""
+        return {
+            priority: {"in_flight": self.inflight[priority], "queued": len(self._waiters[priority])}
+            for priority in PRIORITIES
+        }
+
+
+# グローバルな受け付け枠
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    """受け付け枠を取得"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            ADMISSION_MAX_INFLIGHT, ADMISSION_INTERACTIVE_RESERVED, ADMISSION_MAX_QUEUE
+        )
+    return _admission
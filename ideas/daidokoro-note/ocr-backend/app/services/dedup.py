@@ -0,0 +1,93 @@
+import difflib
+import hashlib
+from typing import BinaryIO, Optional
+
+from PIL import Image
+
+from app.config import DEDUP_PHASH_MAX_DISTANCE, DEDUP_TEXT_SIMILARITY, DEDUP_MAX_CANDIDATES
+from app.models.database import find_recipe_id_by_hash, find_perceptual_candidates, get_recipe
+from app.services.metrics import CACHE_LOOKUPS
+
+# dHashの縮小サイズ（横9×縦8 → 64bit）
+_DHASH_SIZE = 8
+
+
+def content_hash(source: BinaryIO) -> str:
+    """アップロードされた生バイトのSHA-256（ファイルから分割して読み、全体をメモリに載せない）"""
+    source.seek(0)
+    digest = hashlib.file_digest(source, "sha256").hexdigest()
+    source.seek(0)
+    return digest
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """
+    前処理済み画像のdHash（64bitを16進16桁で返す）
+
+    再エンコードや軽微なリサイズでは値が変わりにくいため、再アップロードの候補探しに使う。
+    白地に文字だけの画像は別物でも値が近くなりやすいので、これだけで同じ画像とは判定しない。
+    """
+    small = image.resize(
+        (_DHASH_SIZE + 1, _DHASH_SIZE), Image.BILINEAR, reducing_gap=2.0
+    ).convert("L")
+    pixels = list(small.getdata())
+
+    bits = 0
+    for row in range(_DHASH_SIZE):
+        offset = row * (_DHASH_SIZE + 1)
+        for col in range(_DHASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    return f"{bits:016x}"
+
+
+def find_duplicate(content: str) -> Optional[dict]:
+    """生バイトのハッシュが一致する保存済みレシピを探す（見つからなければNone）"""
+    recipe_id = find_recipe_id_by_hash(content)
+    CACHE_LOOKUPS.inc(cache="content_hash", result="miss" if recipe_id is None else "hit")
+    if recipe_id is None:
+        return None
+    return get_recipe(recipe_id)
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """16進で表した知覚ハッシュのビット差"""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def text_similarity(a: str, b: str) -> float:
+    """OCRテキストの類似度（0.0〜1.0）"""
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    # 長さや文字の構成が大きく違えば、重い ratio() を計算するまでもない
+    if matcher.real_quick_ratio() < DEDUP_TEXT_SIMILARITY or matcher.quick_ratio() < DEDUP_TEXT_SIMILARITY:
+        return 0.0
+    return matcher.ratio()
+
+
+def find_similar(perceptual: str, size: tuple[int, int], raw_text: str) -> Optional[dict]:
+    """
+    同じ画像の再アップロードとみなせる保存済みレシピを探す（見つからなければNone）
+
+    前処理後の画像サイズが同じで、知覚ハッシュの距離が DEDUP_PHASH_MAX_DISTANCE 以下の候補のうち、
+    OCRテキストの類似度が DEDUP_TEXT_SIMILARITY 以上のものだけを返す。
+    """
+    candidates = sorted(
+        (distance, recipe_id)
+        for candidate, recipe_id in find_perceptual_candidates(size, DEDUP_MAX_CANDIDATES)
+        if (distance := hamming_distance(perceptual, candidate)) <= DEDUP_PHASH_MAX_DISTANCE
+    )
+
+    seen = set()
+    for _, recipe_id in candidates:
+        if recipe_id in seen:
+            continue
+        seen.add(recipe_id)
+        recipe = get_recipe(recipe_id)
+        if not recipe or not recipe["ocr_raw_text"]:
+            continue
+        if text_similarity(raw_text, recipe["ocr_raw_text"]) >= DEDUP_TEXT_SIMILARITY:
+            CACHE_LOOKUPS.inc(cache="perceptual_hash", result="hit")
+            return recipe
+
+    CACHE_LOOKUPS.inc(cache="perceptual_hash", result="miss")
+    return None
@@ -0,0 +1,121 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.config import (
+    IMAGE_EXECUTOR_WORKERS,
+    DB_EXECUTOR_WORKERS,
+    STORAGE_EXECUTOR_WORKERS,
+)
+from app.services.metrics import EXECUTOR_WAIT_SECONDS
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    用途別のスレッドプール
+
+    スレッド数を固定したThreadPoolExecutorに、待ち件数・実行中件数の計測を付けたもの。
+    画像処理・OCR・DBを別々のプールに分けることで、重いOCRが詰まっていても
+    DB読み込み（レシピ取得やヘルスチェック）は待たされない。
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"{name}-executor"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def _call(self, fn: Callable[..., T], submitted: float) -> T:
+        EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - submitted, pool=self.name)
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """関数をプールで実行し、結果を待つ（contextvarsは呼び出し元のものを引き継ぐ）"""
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, call, time.perf_counter())
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# 用途別のプール
+_executors = {
+    "image": BoundedExecutor("image", IMAGE_EXECUTOR_WORKERS),
+    # PaddleOCRインスタンス（get_ocr）は1つでスレッドセーフではないため、必ず1スレッドで呼ぶ
+    # （並列化は OCR_WORKERS のワーカープロセスで行う）
+    "ocr": BoundedExecutor("ocr", 1),
+    "db": BoundedExecutor("db", DB_EXECUTOR_WORKERS),
+    # 保存画像のエンコードと書き込み（取り込みの前処理とは取り合わない）
+    "storage": BoundedExecutor("storage", STORAGE_EXECUTOR_WORKERS),
+    # 孤立画像のGC（一覧と削除に時間がかかっても画像の保存を待たせない）
+    "gc": BoundedExecutor("gc", 1),
+}
+
+
+async def run_image(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """画像のデコード・リサイズ・ハッシュ計算・アップロードの書き込み"""
+    return await _executors["image"].run(fn, *args, **kwargs)
+
+
+async def run_ocr_task(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """APIプロセス内でのOCR推論"""
+    return await _executors["ocr"].run(fn, *args, **kwargs)
+
+
+async def run_storage(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """保存画像・サムネイルのエンコードと書き込み"""
+    return await _executors["storage"].run(fn, *args, **kwargs)
+
+
+async def run_gc_task(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """孤立画像のGC（保存画像の一覧と削除）"""
+    return await _executors["gc"].run(fn, *args, **kwargs)
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """SQLiteの読み書き"""
+    return await _executors["db"].run(fn, *args, **kwargs)
+
+
+def executor_stats() -> dict[str, dict[str, int]]:
+    """プールごとの待ち件数・実行中件数・完了件数"""
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors():
+    """全プールを停止（シャットダウン時に呼び出し）"""
+    for executor in _executors.values():
+        executor.shutdown()
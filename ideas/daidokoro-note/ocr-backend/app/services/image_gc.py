@@ -0,0 +1,145 @@
+"""
+どのレシピからも参照されない保存画像の削除
+
+レシピの削除や、同じ画像の再処理で使われなくなった画像（とそのサムネイル）を消す。
+保存処理の途中でまだDBに記録されていない画像を消さないよう、作成から
+IMAGE_GC_GRACE_SECONDS 経っていないものは対象外にする。
+
+    python -m app.services.image_gc --dry-run
+"""
+import argparse
+import asyncio
+import logging
+import re
+import time
+from itertools import islice
+from pathlib import PurePosixPath
+from typing import Iterator, Optional
+
+from app.config import IMAGE_GC_INTERVAL_HOURS, IMAGE_GC_GRACE_SECONDS, IMAGE_GC_BATCH_SIZE
+from app.models.database import init_db, list_image_keys
+from app.services.executors import run_db, run_gc_task
+from app.services.image_writer import THUMBNAIL_SUFFIX
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# 旧形式（ディレクトリ分けなし）の2ページ目以降のファイル名 "<レシピID>_<連番>"
+_LEGACY_PAGE = re.compile(r"_\d+$")
+
+_gc_task: Optional[asyncio.Task] = None
+
+
+def _stem(key: str) -> str:
+    """キーから拡張子とサムネイルの印を除いたもの（元画像とサムネイルで同じになる）"""
+    path = PurePosixPath(key)
+    stem = path.stem
+    if stem.endswith(THUMBNAIL_SUFFIX):
+        stem = stem[: -len(THUMBNAIL_SUFFIX)]
+    if len(path.parts) == 1:
+        stem = _LEGACY_PAGE.sub("", stem)
+    return str(path.with_name(stem))
+
+
+def _collect_batch(
+    listing: Iterator[tuple[str, float]], keep: set[str], cutoff: float, dry_run: bool
+) -> tuple[int, int]:
+    """listing から最大 IMAGE_GC_BATCH_SIZE 件を読み、孤立した画像を削除して (走査数, 削除数) を返す"""
+    storage = get_storage()
+    scanned = deleted = 0
+    for key, modified in islice(listing, IMAGE_GC_BATCH_SIZE):
+        scanned += 1
+        if modified > cutoff or _stem(key) in keep:
+            continue
+        if not dry_run:
+            storage.delete(key)
+        deleted += 1
+    return scanned, deleted
+
+
+def collect_garbage(referenced: set[str], dry_run: bool = False) -> dict[str, int]:
+    """
+    referenced（参照中のキー）に対応しない画像を削除し、件数を返す
+
+    一時ファイル（*.tmp）は拡張子が違うため参照中の画像とは一致せず、猶予を過ぎれば消える。
+    """
+    keep = {_stem(key) for key in referenced}
+    cutoff = time.time() - IMAGE_GC_GRACE_SECONDS
+    listing = iter(get_storage().list())
+
+    scanned = deleted = 0
+    while True:
+        batch_scanned, batch_deleted = _collect_batch(listing, keep, cutoff, dry_run)
+        if batch_scanned == 0:
+            break
+        scanned += batch_scanned
+        deleted += batch_deleted
+
+    return {"scanned": scanned, "referenced": len(referenced), "deleted": deleted}
+
+
+async def run_gc(dry_run: bool = False) -> dict[str, int]:
+    """
+    参照中のキーをDBから読み、孤立した画像を削除する
+
+    画像の保存（storage プール）を止めないよう専用のスレッドで動かし、
+    一覧は IMAGE_GC_BATCH_SIZE 件ずつ処理する（停止時は次の区切りで抜ける）。
+    """
+    referenced = await run_db(list_image_keys)
+    keep = {_stem(key) for key in referenced}
+    cutoff = time.time() - IMAGE_GC_GRACE_SECONDS
+    listing = iter(await run_gc_task(get_storage().list))
+
+    scanned = deleted = 0
+    while True:
+        batch_scanned, batch_deleted = await run_gc_task(_collect_batch, listing, keep, cutoff, dry_run)
+        if batch_scanned == 0:
+            break
+        scanned += batch_scanned
+        deleted += batch_deleted
+
+    result = {"scanned": scanned, "referenced": len(referenced), "deleted": deleted}
+    logger.info(
+        f"Image GC: scanned={result['scanned']} referenced={result['referenced']} "
+        f"deleted={result['deleted']}{' (dry run)' if dry_run else ''}"
+    )
+    return result
+
+
+async def _gc_loop():
+    while True:
+        await asyncio.sleep(IMAGE_GC_INTERVAL_HOURS * 3600)
+        try:
+            await run_gc()
+        except Exception as e:
+            logger.error(f"Image GC failed: {e}", exc_info=True)
+
+
+def start_gc():
+    """定期的なGCを開始（起動時に呼び出し。IMAGE_GC_INTERVAL_HOURS=0なら何もしない）"""
+    global _gc_task
+    if IMAGE_GC_INTERVAL_HOURS > 0 and _gc_task is None:
+        _gc_task = asyncio.create_task(_gc_loop(), name="image-gc")
+
+
+async def stop_gc():
+    """定期的なGCを停止（シャットダウン時に呼び出し）"""
+    global _gc_task
+    if _gc_task is not None:
+        _gc_task.cancel()
+        await asyncio.gather(_gc_task, return_exceptions=True)
+        _gc_task = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="削除せずに件数だけを表示する")
+    args = parser.parse_args()
+
+    # 旧形式の image_path をキーに直してから参照を調べる
+    init_db()
+    print(collect_garbage(list_image_keys(), dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
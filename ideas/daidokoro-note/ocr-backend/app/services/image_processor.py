@@ -1,95 +1,279 @@
-import io
-from pathlib import Path
+import logging
+import math
+from typing import BinaryIO, Optional
+
+import numpy as np
 from PIL import Image, ExifTags
 
-from app.config import IMAGE_MIN_SIZE, IMAGE_MAX_SIZE, IMAGE_DIR
+from app.config import (
+    IMAGE_MIN_SIZE,
+    IMAGE_MAX_SIZE,
+    IMAGE_MAX_PIXELS,
+    RESIZE_POLICY,
+    TEXT_HEIGHT_TARGET,
+)
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# デコード時にもPILの展開爆弾チェックを同じ上限で効かせる（超えると警告、2倍でエラー）
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+# 先頭バイト（マジックナンバー）→ 形式（WebPは "RIFF" + サイズ4バイト + "WEBP"）
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+]
+SNIFF_BYTES = 12
+
+# 文字の高さの推定（estimate_text_height）
+TEXT_PROBE_SIZE = 1000  # 推定に使う縮小画像の長辺の目安
+TEXT_EDGE_THRESHOLD = 40  # 横方向の輝度差がこれを超える画素を文字の輪郭とみなす
+TEXT_MIN_LINES = 3  # 推定に必要な最小の行数
+
+# 文字の高さがこの範囲なら拡大縮小しない（認識モデルの入力高さ48pxに対して読みやすい大きさ）
+TEXT_HEIGHT_RANGE = (TEXT_HEIGHT_TARGET * 0.65, TEXT_HEIGHT_TARGET * 1.5)
+MAX_UPSCALE = 3.0  # 拡大の上限倍率
+
 
+# EXIFのOrientation値 → 1回で済む変換（5と7も回転+反転を1回の転置で行う）
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
 
-def fix_exif_orientation(image: Image.Image) -> Image.Image:
-    """EXIF情報に基づいて画像の向きを補正"""
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """先頭バイトから画像形式を判定（JPEG/PNG/WebP以外はNone）"""
+    for magic, image_format in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return image_format
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def read_image_header(source: BinaryIO) -> tuple[int, int]:
+    """
+    画素をデコードせずに、形式の判定とヘッダの画像サイズ（幅, 高さ）の読み取りを行う
+
+    画像でない・壊れている・画素数が IMAGE_MAX_PIXELS を超える場合は ValueError。
+    """
+    source.seek(0)
+    image_format = sniff_format(source.read(SNIFF_BYTES))
+    if image_format is None:
+        raise ValueError("Unsupported image format (not JPEG/PNG/WebP)")
+
+    source.seek(0)
+    too_large = f"Image dimensions too large. Maximum: {IMAGE_MAX_PIXELS} pixels"
     try:
-        exif = image._getexif()
-        if exif is None:
-            return image
-
-        orientation_key = None
-        for key, value in ExifTags.TAGS.items():
-            if value == "Orientation":
-                orientation_key = key
-                break
-
-        if orientation_key is None or orientation_key not in exif:
-            return image
-
-        orientation = exif[orientation_key]
-
-        if orientation == 2:
-            image = image.transpose(Image.FLIP_LEFT_RIGHT)
-        elif orientation == 3:
-            image = image.rotate(180)
-        elif orientation == 4:
-            image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        elif orientation == 5:
-            image = image.rotate(-90, expand=True).transpose(Image.FLIP_LEFT_RIGHT)
-        elif orientation == 6:
-            image = image.rotate(-90, expand=True)
-        elif orientation == 7:
-            image = image.rotate(90, expand=True).transpose(Image.FLIP_LEFT_RIGHT)
-        elif orientation == 8:
-            image = image.rotate(90, expand=True)
-
-    except (AttributeError, KeyError, IndexError):
-        pass
+        # 判定した形式のプラグインだけで開く（Image.openはヘッダまでしか読まない）
+        with Image.open(source, formats=[image_format]) as image:
+            width, height = image.size
+    except Image.DecompressionBombError as e:
+        raise ValueError(too_large) from e
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ValueError(f"Invalid {image_format} header: {e}") from e
+    finally:
+        source.seek(0)
 
-    return image
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValueError(too_large)
+    return width, height
 
 
-def resize_image(image: Image.Image) -> Image.Image:
-    """画像をOCR用にリサイズ"""
-    width, height = image.size
+def exif_orientation(image: Image.Image) -> int:
+    """EXIFのOrientation値（情報がなければ1）"""
+    try:
+        return int(image.getexif().get(ExifTags.Base.Orientation, 1))
+    except (AttributeError, KeyError, IndexError, SyntaxError, ValueError):
+        return 1
+
+
+def apply_orientation(image: Image.Image, orientation: int) -> Image.Image:
+    """Orientation値に従って向きを補正"""
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    return image if method is None else image.transpose(method)
+
+
+def fixed_scale(width: int, height: int) -> float:
+    """長辺を IMAGE_MIN_SIZE〜IMAGE_MAX_SIZE に収める倍率（従来の方式）"""
     max_dim = max(width, height)
 
     # 小さすぎる場合は拡大
     if max_dim < IMAGE_MIN_SIZE:
-        scale = IMAGE_MIN_SIZE / max_dim
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        image = image.resize((new_width, new_height), Image.LANCZOS)
+        return IMAGE_MIN_SIZE / max_dim
 
     # 大きすぎる場合は縮小
-    elif max_dim > IMAGE_MAX_SIZE:
-        scale = IMAGE_MAX_SIZE / max_dim
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        image = image.resize((new_width, new_height), Image.LANCZOS)
+    if max_dim > IMAGE_MAX_SIZE:
+        return IMAGE_MAX_SIZE / max_dim
 
-    return image
+    return 1.0
 
 
-def process_image(image_bytes: bytes) -> Image.Image:
-    """画像を前処理（EXIF補正 + リサイズ）"""
-    image = Image.open(io.BytesIO(image_bytes))
+def estimate_text_height(image: Image.Image, orientation: int = 1) -> Optional[float]:
+    """
+    横方向のエッジを含む行の連なりから、1行の文字の高さ（px）を推定
 
-    # RGBに変換（PNGのRGBA等対応）
-    if image.mode != "RGB":
-        image = image.convert("RGB")
+    文字のある行は縦線の輪郭で横方向の輝度差が多く、行間では途切れる。
+    その連なりの長さの中央値を文字の高さとみなす。行が少なすぎる場合はNone。
+    向きの補正（orientation）は縮小したグレースケール画像にだけかける。
+    """
+    factor = max(1, math.ceil(max(image.size) / TEXT_PROBE_SIZE))
+    gray = image.convert("L")
+    if factor > 1:
+        gray = gray.reduce(factor)
+    gray = apply_orientation(gray, orientation)
 
-    # EXIF補正
-    image = fix_exif_orientation(image)
+    pixels = np.asarray(gray, dtype=np.int16)
+    edges = np.abs(np.diff(pixels, axis=1)) > TEXT_EDGE_THRESHOLD
+    text_rows = edges.sum(axis=1) >= max(2, pixels.shape[1] // 100)
 
-    # リサイズ
-    image = resize_image(image)
+    # 文字のある行の連なり（ランレングス）
+    padded = np.concatenate(([False], text_rows, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = changes[1::2] - changes[::2]
+    runs = runs[runs >= 2]
+    if len(runs) < TEXT_MIN_LINES:
+        return None
 
-    return image
+    return float(np.median(runs)) * factor
 
 
-def save_image(image: Image.Image, recipe_id: str) -> str:
-    """画像を保存してパスを返す"""
-    Path(IMAGE_DIR).mkdir(parents=True, exist_ok=True)
+def _in_text_range(text_height: float) -> bool:
+    low, high = TEXT_HEIGHT_RANGE
+    return low <= text_height <= high
 
-    filename = f"{recipe_id}.jpg"
-    filepath = Path(IMAGE_DIR) / filename
 
-    image.save(filepath, "JPEG", quality=90)
+def choose_scale(width: int, height: int, text_height: Optional[float]) -> float:
+    """文字の高さが TEXT_HEIGHT_TARGET 付近になる倍率（推定できなければ従来の方式）"""
+    if text_height is None:
+        return fixed_scale(width, height)
+
+    max_dim = max(width, height)
+    scale = 1.0 if _in_text_range(text_height) else TEXT_HEIGHT_TARGET / text_height
+
+    # 縮小しても長辺は IMAGE_MIN_SIZE 未満にしない（元から小さい画像は縮小しない）。
+    # 文字の高さの推定が大きく外れても、画像が潰れないようにする
+    scale = max(scale, min(1.0, IMAGE_MIN_SIZE / max_dim))
 
-    return str(filepath)
+    # 長辺の上限と拡大の上限は常に守る
+    return min(scale, IMAGE_MAX_SIZE / max_dim, MAX_UPSCALE)
+
+
+def resize_image(image: Image.Image, scale: Optional[float] = None) -> Image.Image:
+    """画像をOCR用にリサイズ（倍率を省略した場合は従来の方式で決める）"""
+    width, height = image.size
+    if scale is None:
+        scale = fixed_scale(width, height)
+
+    new_width = max(1, int(width * scale))
+    new_height = max(1, int(height * scale))
+    if (new_width, new_height) == (width, height):
+        return image
+
+    # 縮小時は段階的に縮めてからLANCZOSをかける（reducing_gap）
+    return image.resize((new_width, new_height), Image.LANCZOS, reducing_gap=3.0 if scale < 1 else None)
+
+
+def _probe_text_height(source: BinaryIO) -> Optional[float]:
+    """JPEGを低解像度でデコードして文字の高さを推定（元画像の座標のpxで返す）"""
+    source.seek(0)
+    probe = Image.open(source)
+    width = probe.size[0]
+    ratio = min(1.0, TEXT_PROBE_SIZE / max(probe.size))
+    probe.draft("L", (math.ceil(probe.size[0] * ratio), math.ceil(probe.size[1] * ratio)))
+    ratio = probe.size[0] / width
+
+    text_height = estimate_text_height(probe, exif_orientation(probe))
+    return None if text_height is None else text_height / ratio
+
+
+def process_image(source: BinaryIO) -> Image.Image:
+    """
+    画像を前処理（EXIF補正 + 文字の大きさに合わせたリサイズ）
+
+    source はアップロードの一時ファイル等をそのまま受け取り、バイト列に読み出さずに
+    デコードする。向きの補正は縮小後（拡大する場合は拡大前）の画像に1回の転置でかけ、
+    全解像度のコピーを作る回数を減らす。
+    """
+    source.seek(0)
+    image = Image.open(source)
+    width, height = image.size
+    is_jpeg = image.format == "JPEG"
+    adaptive = RESIZE_POLICY == "adaptive"
+
+    # JPEGは先に倍率を決め（adaptiveなら低解像度で文字の高さを測る）、縮小する場合は
+    # DCTの段階で解像度を落としてデコードする（全画素をデコードしてから縮めない）
+    text_height = None
+    scale = None
+    if is_jpeg:
+        if adaptive:
+            with span("probe"):
+                text_height = _probe_text_height(source)
+            scale = choose_scale(width, height, text_height)
+        else:
+            scale = fixed_scale(width, height)
+        if scale < 1.0:
+            image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+    # draftで縮んだ分を差し引いた残りの倍率
+    decoded_ratio = image.size[0] / width
+
+    # 画素のデコード（計測のため明示的に読み込む）とRGBへの変換（PNGのRGBA等対応）
+    # PNGはEXIFが画素の後ろにあることがあり、Orientationの読み取りで全体がデコードされるため、ここで読む
+    with span("decode"):
+        image.load()
+        orientation = exif_orientation(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+    if adaptive and not is_jpeg:
+        with span("probe"):
+            text_height = estimate_text_height(image, orientation)
+        scale = choose_scale(width, height, text_height)
+    elif scale is None:
+        scale = fixed_scale(width, height)
+    elif text_height is not None and decoded_ratio < 1.0 and _in_text_range(text_height * decoded_ratio):
+        # draftの縮小（1/2, 1/4, 1/8）だけで文字の高さが適正範囲に入ったなら、
+        # 追加のLANCZOS縮小はしない（縮小処理の大半の時間を省ける）
+        scale = decoded_ratio
+
+    # リサイズと向きの補正（転置は画素数の少ない側の画像で行う）
+    resize_scale = scale / decoded_ratio
+    if resize_scale < 1.0:
+        with span("resize"):
+            image = resize_image(image, resize_scale)
+        with span("exif"):
+            image = apply_orientation(image, orientation)
+    else:
+        with span("exif"):
+            image = apply_orientation(image, orientation)
+        with span("resize"):
+            image = resize_image(image, resize_scale)
+
+    logger.info(
+        f"Resized {width}x{height} -> {image.width}x{image.height} "
+        f"(scale={scale:.2f}, text_height={'-' if text_height is None else f'{text_height:.0f}px'}, "
+        f"draft={decoded_ratio:.2f})"
+    )
+
+    return image
+
+
+def to_pixels(image: Image.Image) -> np.ndarray:
+    """
+    OCRに渡す uint8 (H, W, 3) のC連続配列に変換
+
+    PILの画素は内部で1画素4バイトのため、この変換で1回だけコピーが発生する。
+    以降のOCR（プロセス内・共有メモリ経由とも）はこの配列をコピーせずに使うので、
+    変換後は元のPIL画像を解放してよい。
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import logging
+from pathlib import PurePosixPath
+from typing import Optional
+
+from PIL import Image, features
+
+from app.config import (
+    IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    THUMBNAIL_SIZE,
+    IMAGE_WRITER_MAX_PENDING,
+)
+from app.services.executors import run_storage
+from app.services.storage import content_key, get_storage
+
+logger = logging.getLogger(__name__)
+
+# 保存形式 → (PILの形式名, 拡張子, Content-Type)
+_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "avif": ("AVIF", ".avif", "image/avif"),
+}
+_MEDIA_TYPES = {ext: media_type for _, ext, media_type in _FORMATS.values()}
+
+# サムネイルは元画像と同じ場所に "<元のキーの拡張子なし>.thumb.<拡張子>" で保存する
+THUMBNAIL_SUFFIX = ".thumb"
+
+# 書き込み待ちの画像（キー → 書き込みタスク）
+_pending: dict[str, asyncio.Task] = {}
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _resolve_format(name: str) -> str:
+    if name not in _FORMATS:
+        logger.warning(f"Unknown IMAGE_FORMAT {name!r}, falling back to jpeg")
+        return "jpeg"
+    if name == "avif" and not features.check("avif"):
+        logger.warning("This Pillow build has no AVIF support, falling back to webp")
+        return "webp"
+    return name
+
+
+_format = _resolve_format(IMAGE_FORMAT)
+
+
+def image_key(content_hash: str) -> str:
+    """
+    保存画像のキー（アップロードの生バイトのSHA-256で決める）
+
+    前処理は同じ入力に対して同じ画像を作るため、同じ画像を何度取り込んでも
+    保存される実体は1つになる。形式は IMAGE_FORMAT に従う。
+    """
+    return content_key(content_hash, _FORMATS[_format][1])
+
+
+def thumbnail_key(key: str) -> str:
+    """保存画像に対応するサムネイルのキー"""
+    path = PurePosixPath(key)
+    return str(path.with_name(f"{path.stem}{THUMBNAIL_SUFFIX}{_FORMATS[_format][1]}"))
+
+
+def media_type(key: str) -> str:
+    return _MEDIA_TYPES.get(PurePosixPath(key).suffix.lower(), "application/octet-stream")
+
+
+# ---- エンコード（storageプールで実行） ----
+
+def _encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, _FORMATS[_format][0], quality=IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def _save(image: Image.Image, key: str):
+    get_storage().put(key, _encode(image), media_type(key))
+
+
+def _thumbnail(image: Image.Image) -> Image.Image:
+    """長辺 THUMBNAIL_SIZE に縮小（元画像をコピーせずに直接縮める）"""
+    ratio = THUMBNAIL_SIZE / max(image.size)
+    if ratio >= 1.0:
+        return image
+    size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+    return image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+def encode_image(image: Image.Image, key: str) -> list[tuple[str, bytes]]:
+    """前処理済み画像とサムネイルをエンコード（書き込む (キー, バイト列) のリスト）"""
+    return [(key, _encode(image)), (thumbnail_key(key), _encode(_thumbnail(image)))]
+
+
+def _put_all(encoded: list[tuple[str, bytes]]):
+    storage = get_storage()
+    for key, data in encoded:
+        storage.put(key, data, media_type(key))
+
+
+def _thumbnail_from_stored(key: str, thumb_key: str):
+    with Image.open(io.BytesIO(get_storage().get(key))) as image:
+        # JPEGはDCTの段階で縮めてデコードする
+        image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        _save(_thumbnail(image.convert("RGB")), thumb_key)
+
+
+# ---- バックグラウンド書き込み ----
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMAGE_WRITER_MAX_PENDING)
+    return _slots
+
+
+async def submit_image(image: Image.Image, key: str) -> str:
+    """
+    画像の保存をバックグラウンドに回し、キーをすぐに返す
+
+    エンコードと書き込みは取り込みの完了を待たせない。エンコード前の画像が
+    IMAGE_WRITER_MAX_PENDING 件たまっている間は空きを待つ（メモリの上限）。
+    エンコードが済めば画像は手放し、書き込みはバイト列で行う。
+    """
+    slots = _get_slots()
+    await slots.acquire()
+
+    task = asyncio.create_task(_write(image, key, slots), name=f"image-writer-{key}")
+    _pending[key] = task
+
+    def done(task: asyncio.Task):
+        if _pending.get(key) is task:
+            del _pending[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to save image {key}: {task.exception()}")
+
+    task.add_done_callback(done)
+    return key
+
+
+async def _write(image: Image.Image, key: str, slots: asyncio.Semaphore):
+    try:
+        encoded = await run_storage(encode_image, image, key)
+    finally:
+        slots.release()
+    # 書き込み（S3などは時間がかかる）の間、全解像度の画像を持ち続けない
+    del image
+    await run_storage(_put_all, encoded)
+
+
+async def wait_written(key: str):
+    """保存待ちの画像なら書き込みが終わるまで待つ"""
+    task = _pending.get(key)
+    if task is not None:
+        await asyncio.wait([task])
+
+
+async def ensure_thumbnail(key: str) -> Optional[str]:
+    """
+    サムネイルのキーを返す（元画像がなければNone）
+
+    サムネイル機能より前に保存された画像は、初回の要求時に元画像から作る。
+    """
+    await wait_written(key)
+    storage = get_storage()
+    thumb_key = thumbnail_key(key)
+    if await run_storage(storage.exists, thumb_key):
+        return thumb_key
+    if not await run_storage(storage.exists, key):
+        return None
+    await run_storage(_thumbnail_from_stored, key, thumb_key)
+    return thumb_key
+
+
+async def flush_images():
+    """書き込み待ちの画像をすべて書き終える（シャットダウン時に呼び出し）"""
+    global _slots
+    if _pending:
+        await asyncio.wait(list(_pending.values()))
+    _slots = None
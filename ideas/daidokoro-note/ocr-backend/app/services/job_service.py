@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import ulid
+
+from app.config import UPLOAD_DIR, JOB_MAX_INFLIGHT, JOB_MAX_QUEUED
+from app.models.database import create_job, update_job, get_job, get_recipe, list_unfinished_jobs
+from app.services.pipeline import IngestJob, ImageProcessingError, get_pipeline
+from app.services.admission import AdmissionRejected, get_admission
+from app.services.executors import run_db, run_image
+from app.services.tracing import finish_trace, record_span, start_trace
+
+logger = logging.getLogger(__name__)
+
+# ジョブの終了状態
+TERMINAL_STATUSES = {"done", "failed"}
+
+# 実行中のジョブタスク（GC防止のため参照を保持）
+_tasks: set[asyncio.Task] = set()
+
+# ジョブIDごとのイベント購読キュー（SSE用）
+_subscribers: dict[str, set[asyncio.Queue]] = {}
+
+# 登録処理中（アップロードの書き込み中）のジョブ数。_tasks と合わせて JOB_MAX_QUEUED に抑える
+_enqueuing = 0
+
+# パイプラインへ同時に流すジョブ数の上限（元画像の読み込みを抑える）
+_inflight: Optional[asyncio.Semaphore] = None
+
+
+def _get_inflight() -> asyncio.Semaphore:
+    global _inflight
+    if _inflight is None:
+        _inflight = asyncio.Semaphore(JOB_MAX_INFLIGHT)
+    return _inflight
+
+
+def subscribe(job_id: str) -> asyncio.Queue:
+    """ジョブのイベントを購読"""
+    queue: asyncio.Queue = asyncio.Queue()
+    _subscribers.setdefault(job_id, set()).add(queue)
+    return queue
+
+
+def unsubscribe(job_id: str, queue: asyncio.Queue):
+    """購読を解除"""
+    queues = _subscribers.get(job_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _subscribers[job_id]
+
+
+def publish(job_id: str, event: str, data: dict):
+    """購読者にイベントを配信"""
+    for queue in _subscribers.get(job_id, ()):
+        queue.put_nowait({"event": event, "data": data})
+
+
+async def _set_status(
+    job_id: str,
+    status: str,
+    stage: Optional[str] = None,
+    error: Optional[str] = None,
+    recipe_id: Optional[str] = None,
+):
+    await run_db(update_job, job_id, status, stage, error, recipe_id)
+    data = {"job_id": job_id, "status": status, "stage": stage, "error": error}
+    if recipe_id:
+        data["recipe_id"] = recipe_id
+    publish(job_id, "status", data)
+
+
+def _write_upload(path: Path, source: BinaryIO):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    source.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f)
+
+
+async def enqueue_job(
+    source: BinaryIO,
+    source_url: Optional[str] = None,
+    title_hint: Optional[str] = None,
+    force: bool = False,
+    request_id: str = "-",
+) -> dict:
+    """
+    アップロードを永続化してジョブを登録し、バックグラウンドで処理を開始
+
+    終わっていないジョブが JOB_MAX_QUEUED 件あれば、アップロードを書き込む前に
+    AdmissionRejected（429）を送出する。
+    """
+    global _enqueuing
+    backlog = len(_tasks) + _enqueuing
+    if backlog >= JOB_MAX_QUEUED:
+        raise AdmissionRejected(429, "Too many queued jobs", get_admission().retry_after(backlog))
+
+    job_id = str(ulid.new())
+    recipe_id = str(ulid.new())
+    upload_path = Path(UPLOAD_DIR) / f"{job_id}.bin"
+
+    _enqueuing += 1
+    try:
+        await run_image(_write_upload, upload_path, source)
+        await run_db(
+            create_job,
+            job_id=job_id,
+            upload_path=str(upload_path),
+            recipe_id=recipe_id,
+            source_url=source_url,
+            title_hint=title_hint,
+            force=force,
+        )
+
+        logger.info(f"Job queued: {job_id}", extra={"request_id": request_id})
+        _schedule(await run_db(get_job, job_id), request_id)
+    finally:
+        _enqueuing -= 1
+
+    return {"job_id": job_id, "recipe_id": recipe_id, "status": "queued"}
+
+
+def _schedule(job: dict, request_id: str = "-"):
+    task = asyncio.create_task(_run_job(job, request_id), name=f"job-{job['id']}")
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _run_job(job: dict, request_id: str):
+    """ジョブを1件実行する（登録したリクエストとは別のトレースとして記録）"""
+    trace = start_trace(request_id)
+    try:
+        await _process_job(job, request_id)
+    finally:
+        if trace is not None:
+            finish_trace(trace, job_id=job["id"])
+
+
+async def _process_job(job: dict, request_id: str):
+    """パイプラインへ投入し、結果を記録"""
+    job_id = job["id"]
+    # 終了状態（done/failed）を記録したら元画像は不要。失敗したジョブは再開しないため、
+    # 成功時以外も消す（シャットダウンで中断した場合は次回起動時に再開するので残す）
+    finished = False
+
+    try:
+        waited = time.perf_counter()
+        async with _get_inflight():
+            record_span("wait-job", waited)
+            # 再起動前に保存まで終わっていた場合は完了扱い
+            if await run_db(get_recipe, job["recipe_id"]):
+                await _set_status(job_id, "done", "save")
+                finished = True
+                return
+
+            try:
+                source = await run_image(open, job["upload_path"], "rb")
+            except OSError as e:
+                await _set_status(job_id, "failed", error=f"Upload not found: {e}")
+                finished = True
+                return
+
+            async def on_stage(stage: str):
+                await _set_status(job_id, "running", stage)
+
+            async def on_partial(field: str, value):
+                publish(job_id, "partial", {"job_id": job_id, "field": field, "value": value})
+
+            ingest_job = IngestJob.single(
+                job["recipe_id"],
+                source,
+                source_url=job["source_url"],
+                title_hint=job["title_hint"],
+                request_id=request_id,
+                dedup=not job["force"],
+                on_stage=on_stage,
+                on_partial=on_partial,
+            )
+
+            try:
+                # 非同期ジョブは最も低い優先度で、期限なしに空きを待つ
+                # （待つのは JOB_MAX_INFLIGHT 件まで。登録数は enqueue_job で JOB_MAX_QUEUED に抑える）
+                async with get_admission().slot("background"):
+                    await get_pipeline().submit(ingest_job)
+            except ImageProcessingError as e:
+                await _set_status(job_id, "failed", error=f"Image processing failed: {str(e)}")
+                finished = True
+                return
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}", extra={"request_id": request_id}, exc_info=True)
+                await _set_status(job_id, "failed", error=str(e))
+                finished = True
+                return
+            finally:
+                source.close()
+
+        # 重複検出で既存レシピに紐付いた場合はそのIDを記録
+        draft = ingest_job.drafts[0]
+        await _set_status(
+            job_id, "done", "save",
+            recipe_id=draft.recipe_id if draft.cache_hit else None,
+        )
+        finished = True
+    finally:
+        if finished:
+            await _remove_upload(job["upload_path"])
+
+
+async def _remove_upload(path: str):
+    try:
+        await run_image(Path(path).unlink, True)
+    except OSError:
+        pass
+
+
+async def resume_jobs():
+    """再起動前に未完了だったジョブを再投入（起動時に呼び出し）"""
+    jobs = await run_db(list_unfinished_jobs)
+    for job in jobs:
+        _schedule(job, "startup")
+    if jobs:
+        logger.info(f"Resumed {len(jobs)} unfinished job(s)", extra={"request_id": "startup"})
+
+
+async def cancel_jobs():
+    """実行中のジョブタスクを停止（シャットダウン時に呼び出し）。DB上は未完了のまま残り、次回起動時に再開される"""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
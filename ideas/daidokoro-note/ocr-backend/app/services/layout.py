@@ -0,0 +1,268 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# 縦書き判定: 2文字以上のブロックのうち、縦長（高さ > 幅 × VERTICAL_ASPECT）のものの割合
+VERTICAL_ASPECT = 1.5
+VERTICAL_MIN_RATIO = 0.6
+
+# 段組み判定
+COLUMN_GAP = 1.5  # 段の間の余白（文字サイズの倍数）
+COLUMN_MIN_LINES = 3  # 1段あたりの最小行数
+COLUMN_MIN_WIDTH = 8  # 本文の段とみなす最小幅（文字サイズの倍数）
+COLUMN_FILL_RATIO = 0.6  # 本文の段とみなすブロック幅の中央値 / 段の幅
+TABLE_ALIGN_RATIO = 0.6  # 左右で行が揃っている割合がこれ以上なら表（材料と分量など）とみなす
+BAND_MIN_GAP = 0.25  # 上下の帯に分ける最小の余白（文字サイズの倍数）
+
+
+@dataclass
+class Layout:
+    """ページのレイアウト解析結果"""
+    vertical: bool
+    # 読み順に並べたブロック番号（行ごと。縦書きでは1列が1行）
+    lines: list[list[int]]
+    # 段組みで分けた領域の数（段組みなしなら1）
+    regions: int
+
+
+@dataclass
+class _Geometry:
+    """読み方向に合わせて回転した座標（横書きなら x→右, y→下 のまま）"""
+    centers: np.ndarray  # (N, 2)
+    sizes: np.ndarray  # (N,) 行方向と直交する文字サイズ
+    lo: np.ndarray  # (N, 2) 外接矩形の最小座標
+    hi: np.ndarray  # (N, 2) 外接矩形の最大座標
+    unit: float  # 文字サイズの中央値
+
+
+def block_geometry(boxes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    bbox配列 (N, 4, 2) から中心座標 (N, 2) と文字の高さ (N,) を計算
+
+    bboxの頂点は [左上, 右上, 右下, 左下] の順。
+    """
+    # 従来のPython実装と同じ加算順にして、浮動小数点の結果を一致させる
+    centers = (boxes[:, 0] + boxes[:, 1] + boxes[:, 2] + boxes[:, 3]) / 4
+    heights = (boxes[:, 3, 1] - boxes[:, 0, 1] + boxes[:, 2, 1] - boxes[:, 1, 1]) / 2
+    return centers, heights
+
+
+def reading_order(centers: np.ndarray, heights: np.ndarray) -> list[list[int]]:
+    """
+    中心座標と高さから、読み順に並べたブロック番号を行ごとに返す
+
+    方針:
+    1. Y座標で安定ソートし、隣とのY差が平均文字高さの半分以上なら改行（行判定）
+    2. 行内はX座標で昇順（同じXならY順を保つ）
+    3. 行はY座標で昇順
+    """
+    if len(centers) == 0:
+        return []
+
+    # 平均文字高さを計算（行クラスタリングの閾値に使用）
+    # 総和はPythonのsumで取り、従来実装と閾値を1bitも違えないようにする
+    avg_height = sum(heights.tolist()) / len(heights)
+    threshold = avg_height * 0.5
+
+    # Y座標でソート
+    by_y = np.argsort(centers[:, 1], kind="stable")
+    ys = centers[by_y, 1]
+
+    # 前のブロックとのY差が閾値以上なら新しい行
+    breaks = ~(np.abs(np.diff(ys)) < threshold)
+    line_ids = np.concatenate(([0], np.cumsum(breaks)))
+
+    # 行番号 → X座標の順に安定ソート
+    order = by_y[np.lexsort((centers[by_y, 0], line_ids))].tolist()
+
+    starts = [0] + (np.flatnonzero(breaks) + 1).tolist()
+    ends = starts[1:] + [len(order)]
+    return [order[start:end] for start, end in zip(starts, ends)]
+
+
+def is_vertical(texts: list[str], widths: np.ndarray, heights: np.ndarray) -> bool:
+    """縦書きのページか（1文字のブロックは正方形に近く判定に使えないため除く）"""
+    multi = np.fromiter((len(text) >= 2 for text in texts), dtype=bool, count=len(texts))
+    if not multi.any():
+        return False
+    tall = heights[multi] > widths[multi] * VERTICAL_ASPECT
+    return float(tall.mean()) >= VERTICAL_MIN_RATIO
+
+
+def analyze_layout(texts: list[str], boxes: np.ndarray) -> Layout:
+    """
+    bbox配列 (N, 4, 2) から段組み・縦書きを判定し、読み順を決める
+
+    縦書きは座標を90度回して横書きと同じ処理に載せる（右の列から、列内は上から）。
+    段組みは再帰的なXY-cutで分ける。各軸の投影は区間を開始位置でソートし、
+    終了位置の累積最大との差から余白を求めるため、1回の分割は O(N log N)。
+    段組みが見つからなければ従来どおりページ全体を行判定する。
+    """
+    if not texts:
+        return Layout(vertical=False, lines=[], regions=0)
+
+    xs, ys = boxes[:, :, 0], boxes[:, :, 1]
+    x0, x1, y0, y1 = xs.min(axis=1), xs.max(axis=1), ys.min(axis=1), ys.max(axis=1)
+    centers, heights = block_geometry(boxes)
+
+    vertical = is_vertical(texts, x1 - x0, y1 - y0)
+    if vertical:
+        # 列の幅（上辺と下辺の平均）を文字サイズとし、(x, y) → (y, -x) に回す
+        widths = (boxes[:, 1, 0] - boxes[:, 0, 0] + boxes[:, 2, 0] - boxes[:, 3, 0]) / 2
+        geo = _Geometry(
+            centers=np.stack([centers[:, 1], -centers[:, 0]], axis=1),
+            sizes=widths,
+            lo=np.stack([y0, -x1], axis=1),
+            hi=np.stack([y1, -x0], axis=1),
+            unit=0.0,
+        )
+    else:
+        geo = _Geometry(
+            centers=centers,
+            sizes=heights,
+            lo=np.stack([x0, y0], axis=1),
+            hi=np.stack([x1, y1], axis=1),
+            unit=0.0,
+        )
+    geo.unit = max(float(np.median(geo.sizes)), 1.0)
+
+    everything = np.arange(len(texts))
+    regions = _regions(everything, geo) or [everything]
+
+    lines = []
+    for region in regions:
+        for line in reading_order(geo.centers[region], geo.sizes[region]):
+            lines.append(region[line].tolist())
+
+    return Layout(vertical=vertical, lines=lines, regions=len(regions))
+
+
+def _projection_gaps(lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """区間 [lo, hi] の投影にできる余白の (中央位置, 幅) を返す（位置の昇順）"""
+    if len(lo) < 2:
+        return np.empty(0), np.empty(0)
+    order = np.argsort(lo, kind="stable")
+    starts = lo[order]
+    ends = np.maximum.accumulate(hi[order])
+    gaps = starts[1:] - ends[:-1]
+    at = np.flatnonzero(gaps > 0)
+    return (ends[at] + starts[at + 1]) / 2, gaps[at]
+
+
+def _gap_positions(lo: np.ndarray, hi: np.ndarray, min_gap: float) -> np.ndarray:
+    """区間 [lo, hi] の投影で、幅 min_gap 以上の余白の中央位置を返す（昇順）"""
+    positions, widths = _projection_gaps(lo, hi)
+    return positions[widths >= min_gap]
+
+
+def _row_count(idx: np.ndarray, geo: _Geometry) -> int:
+    return len(_gap_positions(geo.lo[idx, 1], geo.hi[idx, 1], 0.0)) + 1
+
+
+def _aligned_ratio(left: np.ndarray, right: np.ndarray, geo: _Geometry) -> float:
+    """左の段のブロックのうち、右の段にほぼ同じ高さのブロックがあるものの割合"""
+    right_y = np.sort(geo.centers[right, 1])
+    left_y = geo.centers[left, 1]
+
+    # ソート済み座標を索引にして最近傍を二分探索で引く
+    pos = np.searchsorted(right_y, left_y)
+    below = right_y[np.clip(pos, 0, len(right_y) - 1)]
+    above = right_y[np.clip(pos - 1, 0, len(right_y) - 1)]
+    nearest = np.minimum(np.abs(below - left_y), np.abs(above - left_y))
+    return float((nearest < geo.unit * 0.5).mean())
+
+
+def _is_prose(idx: np.ndarray, geo: _Geometry) -> bool:
+    """幅が広く、各行が段の幅いっぱいまで詰まっている（本文の段らしい）か"""
+    width = float(geo.hi[idx, 0].max() - geo.lo[idx, 0].min())
+    if width < geo.unit * COLUMN_MIN_WIDTH:
+        return False
+    fill = float(np.median(geo.hi[idx, 0] - geo.lo[idx, 0])) / width
+    return fill >= COLUMN_FILL_RATIO
+
+
+def _column_split(idx: np.ndarray, geo: _Geometry) -> Optional[list[np.ndarray]]:
+    """縦の余白で段に分ける（段組みでなければNone）"""
+    cuts = _gap_positions(geo.lo[idx, 0], geo.hi[idx, 0], geo.unit * COLUMN_GAP)
+    if len(cuts) == 0:
+        return None
+
+    parts = _group(idx, np.searchsorted(cuts, geo.centers[idx, 0]), len(cuts) + 1)
+
+    if any(_row_count(part, geo) < COLUMN_MIN_LINES for part in parts):
+        return None
+
+    # 材料名と分量のように行が左右で揃う並びは表として扱い、段に分けない
+    # （ただし両側とも本文が詰まった段なら、行の高さが揃っていても段組み）
+    for left, right in zip(parts, parts[1:]):
+        if _aligned_ratio(left, right, geo) >= TABLE_ALIGN_RATIO and not (
+            _is_prose(left, geo) and _is_prose(right, geo)
+        ):
+            return None
+
+    return parts
+
+
+def _band_split(idx: np.ndarray, geo: _Geometry) -> list[np.ndarray]:
+    """
+    横の余白で上下の帯に分ける
+
+    一番広い余白の半分以上のところだけで切る。見出しと本文の間のような広い余白で
+    先に分けることで、行の高さが揃った段組みを1行ずつの帯に刻んでしまわない。
+    """
+    positions, widths = _projection_gaps(geo.lo[idx, 1], geo.hi[idx, 1])
+    if len(widths) == 0:
+        return [idx]
+    cuts = positions[widths >= max(widths.max() * 0.5, geo.unit * BAND_MIN_GAP)]
+    if len(cuts) == 0:
+        return [idx]
+    return _group(idx, np.searchsorted(cuts, geo.centers[idx, 1]), len(cuts) + 1)
+
+
+def _group(idx: np.ndarray, ids: np.ndarray, count: int) -> list[np.ndarray]:
+    """idx を ids（0..count-1）ごとに分ける（各グループ内の順序は保つ）"""
+    order = np.argsort(ids, kind="stable")
+    sizes = np.bincount(ids, minlength=count)
+    return np.split(idx[order], np.cumsum(sizes)[:-1])
+
+
+def _regions(idx: np.ndarray, geo: _Geometry) -> Optional[list[np.ndarray]]:
+    """
+    XY-cutで読み順に並べた領域のリストを返す（段組みが見つからなければNone）
+
+    まず縦の余白で段に分け、分けられなければ横の余白で帯に分けて各帯を調べる。
+    段組みのない帯同士はまとめて1つの領域に戻し、従来どおり行判定させる。
+    """
+    # 2段 × 最小行数に満たなければ段組みはありえない（1行ずつの帯をすぐ打ち切る）
+    if len(idx) < COLUMN_MIN_LINES * 2:
+        return None
+
+    columns = _column_split(idx, geo)
+    if columns is not None:
+        regions = []
+        for part in columns:
+            regions.extend(_regions(part, geo) or [part])
+        return regions
+
+    bands = _band_split(idx, geo)
+    if len(bands) < 2:
+        return None
+
+    sub_regions = [_regions(band, geo) for band in bands]
+    if all(sub is None for sub in sub_regions):
+        return None
+
+    regions = []
+    pending = []
+    for band, sub in zip(bands, sub_regions):
+        if sub is None:
+            pending.append(band)
+            continue
+        if pending:
+            regions.append(np.concatenate(pending))
+            pending = []
+        regions.extend(sub)
+    if pending:
+        regions.append(np.concatenate(pending))
+    return regions
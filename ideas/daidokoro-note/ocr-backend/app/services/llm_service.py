@@ -1,8 +1,38 @@
+import hashlib
+import importlib.util
 import json
+import logging
+import re
+import unicodedata
 import httpx
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
 
-from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL, LLM_TIMEOUT
+from app.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    LLM_TIMEOUT,
+    LLM_TEMPERATURE,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_TTL_HOURS,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_STREAMING,
+    LLM_NUM_PREDICT,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_WRITE_TIMEOUT,
+    OLLAMA_POOL_TIMEOUT,
+    OLLAMA_HEALTH_TIMEOUT,
+    OLLAMA_HTTP2,
+)
+from app.models.database import get_llm_cache, put_llm_cache
+from app.services.executors import run_db
+from app.services.metrics import CACHE_LOOKUPS, LLM_TOKENS
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 # JSON出力スキーマのプロンプト
 SYSTEM_PROMPT = """あなたは料理レシピを構造化するアシスタントです。
@@ -32,12 +62,159 @@ OCRで読み取ったテキストを解析し、以下のJSON形式で出力し
 - 不明な項目はnullまたは空配列にしてください
 - レシピでない場合はingredientsとstepsを空配列にしてください"""
 
+# プロンプトを変更したら自動的に別キャッシュになるようハッシュをキーに含める
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+# キャッシュのヒット/ミス数（プロセス起動からの累計）
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+# Ollama用の共有HTTPクライアント（lifespanで生成・破棄）
+_client: Optional[httpx.AsyncClient] = None
+
+# HTTPクライアントの利用状況（プロセス起動からの累計）
+_http_stats = {"requests": 0, "in_flight": 0, "connections_opened": 0}
+
+
+def init_http_client():
+    """Ollama用の共有HTTPクライアントを生成（起動時に呼び出し）"""
+    global _client
+    if _client is not None:
+        return
+
+    http2 = OLLAMA_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("OLLAMA_HTTP2 is enabled but h2 is not installed, using HTTP/1.1")
+        http2 = False
+
+    _client = httpx.AsyncClient(
+        base_url=OLLAMA_BASE_URL,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+        # 読み込みはLLMの生成時間ぶん待つ必要があるため、接続・送信・接続待ちとは別に設定する
+        timeout=httpx.Timeout(
+            connect=OLLAMA_CONNECT_TIMEOUT,
+            read=float(LLM_TIMEOUT),
+            write=float(OLLAMA_WRITE_TIMEOUT),
+            pool=OLLAMA_POOL_TIMEOUT,
+        ),
+    )
+
+
+async def close_http_client():
+    """共有HTTPクライアントを閉じる（シャットダウン時に呼び出し）"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """共有HTTPクライアントを取得（未生成なら生成する）"""
+    if _client is None:
+        init_http_client()
+    return _client
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcoreのトレースで新規接続の確立を数える（keep-aliveが効いていれば増えない）
+    if event_name == "connection.connect_tcp.complete":
+        _http_stats["connections_opened"] += 1
+
+
+@asynccontextmanager
+async def _tracked():
+    _http_stats["requests"] += 1
+    _http_stats["in_flight"] += 1
+    try:
+        yield {"trace": _trace}
+    finally:
+        _http_stats["in_flight"] -= 1
+
+
+def get_http_pool_stats() -> dict[str, int]:
+    """Ollama接続プールの利用状況"""
+    connections = []
+    if _client is not None:
+        pool = getattr(_client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+
+    return {
+        "max_connections": OLLAMA_MAX_CONNECTIONS,
+        "connections": len(connections),
+        "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+        "in_flight": _http_stats["in_flight"],
+        "requests": _http_stats["requests"],
+        "connections_opened": _http_stats["connections_opened"],
+    }
+
+
+def get_llm_cache_stats() -> dict[str, int]:
+    """LLM応答キャッシュのヒット/ミス数"""
+    return dict(_cache_stats)
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にOCRテキストを正規化（全角半角の統一・空白の圧縮）"""
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"[ \t\u3000]+", " ", text)
+    text = re.sub(r"\s*\n\s*", "\n", text)
+    return text.strip()
+
+
+def build_cache_key(
+    raw_text: str,
+    source_url: Optional[str] = None,
+    title_hint: Optional[str] = None,
+) -> str:
+    """LLM応答キャッシュのキーを生成"""
+    payload = json.dumps(
+        [
+            normalize_text(raw_text),
+            source_url,
+            title_hint,
+            OLLAMA_MODEL,
+            PROMPT_VERSION,
+            LLM_TEMPERATURE,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _load_cache(cache_key: str) -> Optional[dict]:
+    # キャッシュの障害で構造化自体を失敗させない
+    try:
+        return await run_db(get_llm_cache, cache_key, LLM_CACHE_TTL_HOURS * 3600)
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+
+
+async def _store_cache(cache_key: str, structured: dict):
+    try:
+        await run_db(
+            put_llm_cache,
+            cache_key,
+            structured,
+            LLM_CACHE_TTL_HOURS * 3600,
+            LLM_CACHE_MAX_ENTRIES,
+        )
+    except Exception as e:
+        logger.warning(f"LLM cache store failed: {e}")
+
 
 async def check_ollama_available() -> bool:
     """Ollamaが利用可能かチェック"""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
+        async with _tracked() as extensions:
+            response = await get_http_client().get(
+                "/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT, extensions=extensions
+            )
             return response.status_code == 200
     except Exception:
         return False
@@ -47,10 +224,14 @@ async def structure_recipe(
     raw_text: str,
     source_url: Optional[str] = None,
     title_hint: Optional[str] = None,
+    on_partial: Optional[Callable[[str, Any], Awaitable[None]]] = None,
 ) -> tuple[Optional[dict], list[str]]:
     """
     LLMを使ってOCRテキストを構造化JSONに変換
 
+    ストリーミング時は、最上位のフィールド（title, ingredients など）が
+    確定するたびに on_partial(フィールド名, 値) を呼ぶ。
+
     Returns:
         structured: 構造化されたレシピJSON（失敗時はNone）
         warnings: 警告メッセージのリスト
@@ -69,42 +250,53 @@ async def structure_recipe(
     if title_hint:
         user_content += f"\n\nタイトルヒント: {title_hint}"
 
-    try:
-        async with httpx.AsyncClient(timeout=float(LLM_TIMEOUT)) as client:
-            response = await client.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": f"{SYSTEM_PROMPT}\n\nユーザー: {user_content}\n\nアシスタント:",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,
-                    },
-                },
-            )
-
-            if response.status_code != 200:
-                warnings.append(f"LLM_REQUEST_FAILED: {response.status_code}")
-                return None, warnings
+    # キャッシュ確認
+    cache_key = None
+    if LLM_CACHE_ENABLED:
+        cache_key = build_cache_key(raw_text, source_url, title_hint)
+        with span("llm-cache") as attrs:
+            cached = await _load_cache(cache_key)
+            attrs["hit"] = cached is not None
+        if cached is not None:
+            _cache_stats["hits"] += 1
+            CACHE_LOOKUPS.inc(cache="llm", result="hit")
+            logger.info("LLM cache hit")
+            return _finalize(cached, raw_text, warnings)
+        _cache_stats["misses"] += 1
+        CACHE_LOOKUPS.inc(cache="llm", result="miss")
 
-            result = response.json()
-            llm_output = result.get("response", "")
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": f"{SYSTEM_PROMPT}\n\nユーザー: {user_content}\n\nアシスタント:",
+        "stream": LLM_STREAMING,
+        "options": {
+            "temperature": LLM_TEMPERATURE,
+            # JSONの後に説明文を書き続けても、生成はOllama側でこのトークン数で止まる
+            "num_predict": LLM_NUM_PREDICT,
+        },
+    }
 
-            # JSONをパース
-            structured = parse_llm_response(llm_output)
+    try:
+        with span("ollama") as attrs:
+            attrs["stream"] = LLM_STREAMING
+            if LLM_STREAMING:
+                structured, status_code = await _generate_stream(payload, on_partial)
+            else:
+                structured, status_code = await _generate(payload)
+            attrs["status"] = status_code
 
-            if structured is None:
-                warnings.append("LLM_PARSE_FAILED")
-                return None, warnings
+        if status_code != 200:
+            warnings.append(f"LLM_REQUEST_FAILED: {status_code}")
+            return None, warnings
 
-            # raw_text_usedを追加
-            structured["raw_text_used"] = raw_text
+        if structured is None:
+            warnings.append("LLM_PARSE_FAILED")
+            return None, warnings
 
-            # 検証
-            if not structured.get("ingredients") and not structured.get("steps"):
-                warnings.append("NOT_A_RECIPE")
+        if cache_key is not None:
+            await _store_cache(cache_key, structured)
 
-            return structured, warnings
+        return _finalize(structured, raw_text, warnings)
 
     except httpx.TimeoutException:
         warnings.append("LLM_TIMEOUT")
@@ -114,6 +306,90 @@ async def structure_recipe(
         return None, warnings
 
 
+async def _generate(payload: dict) -> tuple[Optional[dict], int]:
+    """生成完了まで待ってから応答全体をパース"""
+    async with _tracked() as extensions:
+        response = await get_http_client().post(
+            "/api/generate", json=payload, extensions=extensions
+        )
+
+    if response.status_code != 200:
+        return None, response.status_code
+
+    result = response.json()
+    _record_tokens(result.get("prompt_eval_count"), result.get("eval_count"))
+    return parse_llm_response(result.get("response", "")), 200
+
+
+def _record_tokens(prompt: Optional[int], output: Optional[int]):
+    """Ollamaの応答のトークン数を記録（応答に含まれない値は記録しない）"""
+    if prompt is not None:
+        LLM_TOKENS.observe(prompt, kind="prompt")
+    if output is not None:
+        LLM_TOKENS.observe(output, kind="output")
+
+
+async def _generate_stream(
+    payload: dict,
+    on_partial: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+) -> tuple[Optional[dict], int]:
+    """
+    トークンを受け取りながらJSONを逐次パース
+
+    最上位オブジェクトが閉じた時点で接続を切り、Ollama側の生成も打ち切らせる
+    （JSONの後に続く説明文などを待たない）。
+    """
+    parser = IncrementalJSONParser()
+    chunks = 0
+    counts: dict = {}
+
+    client = get_http_client()
+    async with _tracked() as extensions:
+        request = client.build_request("POST", "/api/generate", json=payload, extensions=extensions)
+        response = await client.send(request, stream=True)
+        try:
+            if response.status_code != 200:
+                return None, response.status_code
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                chunks += 1
+                if chunk.get("done"):
+                    counts = chunk
+
+                for key, value in parser.feed(chunk.get("response", "")):
+                    if on_partial is not None:
+                        await on_partial(key, value)
+
+                if parser.done:
+                    break
+        finally:
+            await response.aclose()
+
+    # 途中で切った場合は最終チャンク（トークン数を含む）が届かない。
+    # Ollamaは1チャンクに1トークンずつ返すため、受け取ったチャンク数を出力トークン数とする
+    _record_tokens(counts.get("prompt_eval_count"), counts.get("eval_count", chunks))
+
+    if parser.result is not None:
+        return parser.result, 200
+    # 途中で途切れた・JSONが壊れていた場合は従来のパースで拾えるか試す
+    return parse_llm_response(parser.text), 200
+
+
+def _finalize(structured: dict, raw_text: str, warnings: list[str]) -> tuple[dict, list[str]]:
+    """構造化結果に raw_text_used を付けて検証"""
+    # raw_text_usedを追加
+    structured["raw_text_used"] = raw_text
+
+    # 検証
+    if not structured.get("ingredients") and not structured.get("steps"):
+        warnings.append("NOT_A_RECIPE")
+
+    return structured, warnings
+
+
 def parse_llm_response(response: str) -> Optional[dict]:
     """LLMの応答からJSONを抽出してパース"""
     try:
@@ -147,3 +423,99 @@ def parse_llm_response(response: str) -> Optional[dict]:
         pass
 
     return None
+
+
+class IncrementalJSONParser:
+    """
+    LLMのトークン列から最上位のJSONオブジェクトを逐次パースする
+
+    最初の { 以降の文字を1つずつ追い、文字列・エスケープ・括弧の深さを数える。
+    深さ1の , または最上位の } に達したところで直前のフィールドを確定させる。
+    受け取ったトークンは連結し直さずに断片のまま持ち、追加された分だけを走査する。
+    """
+
+    def __init__(self):
+        self.result: Optional[dict] = None
+        self.done = False
+        self._chunks: list[str] = []
+        # 最初の { 以降の断片と、確定前のフィールドの断片
+        self._object: list[str] = []
+        self._field: list[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def text(self) -> str:
+        """受け取ったトークン全体"""
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """トークンを追加し、新たに確定したフィールドを返す"""
+        self._chunks.append(chunk)
+        fields = []
+        if self.done:
+            return fields
+
+        # chunk のうち、まだ断片に入れていない部分の先頭
+        start = 0
+        for i, ch in enumerate(chunk):
+            # 最初の { より前（コードブロックの ```json など）は読み飛ばす
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._object.append("{")
+                    start = i + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._take_field(chunk[start:i]))
+                    self._object.append(chunk[start:i + 1])
+                    self.done = True
+                    try:
+                        self.result = json.loads("".join(self._object))
+                    except json.JSONDecodeError:
+                        self.result = None
+                    return fields
+            elif ch == "," and self._depth == 1:
+                fields.extend(self._take_field(chunk[start:i]))
+                self._object.append(chunk[start:i + 1])
+                start = i + 1
+
+        if self._started:
+            self._field.append(chunk[start:])
+            self._object.append(chunk[start:])
+        return fields
+
+    def _take_field(self, tail: str) -> list[tuple[str, Any]]:
+        """確定前の断片に tail を加えて1フィールドとしてパースし、断片を空にする"""
+        self._field.append(tail)
+        segment = "".join(self._field)
+        self._field = []
+        return self._parse_field(segment)
+
+    def _parse_field(self, segment: str) -> list[tuple[str, Any]]:
+        segment = segment.strip()
+        if not segment:
+            return []
+        try:
+            return list(json.loads("{" + segment + "}").items())
+        except json.JSONDecodeError:
+            return []
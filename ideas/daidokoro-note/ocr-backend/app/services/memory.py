@@ -0,0 +1,83 @@
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def peak_rss() -> int:
+    """
+    プロセス起動以降の最大RSS（バイト、取得できなければ0）
+
+    Linuxでは /proc の VmHWM を使う（getrusage の ru_maxrss は exec 前の親プロセスの値を
+    引き継ぐため、子プロセスでの計測には使えない）。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss() -> int:
+    """現在のRSS（バイト）。/proc が読めない環境では最大RSSで代用する"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+
+
+class StageMemory:
+    """
+    パイプラインの1段のメモリ使用量
+
+    ハンドラの前後でRSSと最大RSSを測り、次を記録する。
+    - rss_max: ハンドラ終了時点のRSSの最大値
+    - growth_max: 1回のハンドラでRSSが増えた量の最大値（段が抱えたまま次段へ渡すメモリ）
+    - peak_raised: この段の実行中にプロセスの最大RSSが更新された量の合計
+      （同時に動く他の段の分も含まれるため目安。最大RSSを押し上げている段の特定に使う）
+    """
+
+    def __init__(self):
+        self.rss_max = 0
+        self.growth_max = 0
+        self.peak_raised = 0
+
+    def begin(self) -> tuple[int, int]:
+        return current_rss(), peak_rss()
+
+    def end(self, started: tuple[int, int]):
+        rss_before, peak_before = started
+        rss = current_rss()
+        self.rss_max = max(self.rss_max, rss)
+        self.growth_max = max(self.growth_max, rss - rss_before)
+        self.peak_raised += max(0, peak_rss() - peak_before)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "rss_max_mb": _mb(self.rss_max),
+            "growth_max_mb": _mb(self.growth_max),
+            "peak_raised_mb": _mb(self.peak_raised),
+        }
+
+
+def process_memory() -> dict[str, float]:
+    """プロセス全体の現在のRSSと最大RSS（MB）"""
+    return {"rss_mb": _mb(current_rss()), "peak_rss_mb": _mb(peak_rss())}
+
+
+def _mb(size: int) -> float:
+    return round(size / (1024 * 1024), 1)
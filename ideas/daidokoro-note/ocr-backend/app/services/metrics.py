@@ -0,0 +1,231 @@
+"""
+Prometheus形式のメトリクス
+
+計測は加算と配列の1要素の更新だけで、外部ライブラリを使わない。
+/metrics の取得時にテキスト形式（text/plain; version=0.0.4）へ書き出す。
+"""
+import bisect
+import math
+import threading
+from typing import Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 所要時間（秒）のバケット。LLMは数十秒かかるため上を広めに取る
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """増えるだけの値（件数・トークン数など）"""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        # ラベルなしは最初の更新前から0を出す
+        self._values: dict[tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._labels(key)} {_format(value)}" for key, value in values.items()]
+
+
+class Gauge(Counter):
+    """増減する値（処理中の件数・キュー長など）"""
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """値の分布（所要時間・件数など）。バケットごとの件数と合計を持つ"""
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = TIME_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとの [バケットごとの件数（+Infを含む）, 合計]
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{_format(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_metrics() -> str:
+    """全メトリクスをテキスト形式で書き出す"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ---- HTTP ----
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "recipe_ocr_http_requests_in_flight", "処理中のHTTPリクエスト数"
+)
+HTTP_REQUESTS = Counter(
+    "recipe_ocr_http_requests_total", "HTTPリクエスト数", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "recipe_ocr_http_request_seconds", "HTTPリクエストの応答時間（レスポンスヘッダまで）", ("method", "route")
+)
+
+# ---- 取り込みパイプライン ----
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "recipe_ocr_pipeline_stage_seconds", "ステージの処理時間", ("stage",)
+)
+PIPELINE_QUEUE_WAIT_SECONDS = Histogram(
+    "recipe_ocr_pipeline_queue_wait_seconds", "ステージのキューで待った時間", ("stage",)
+)
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "recipe_ocr_pipeline_queue_depth", "ステージのキューの待ち件数", ("stage",)
+)
+PIPELINE_JOBS_IN_FLIGHT = Gauge(
+    "recipe_ocr_pipeline_jobs_in_flight", "パイプラインで処理中のジョブ数"
+)
+
+# ---- 受け付け制限 ----
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "recipe_ocr_admission_in_flight", "受け付けてパイプラインで処理中の取り込み数", ("priority",)
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "recipe_ocr_admission_queue_depth", "受け付けの空きを待っている取り込み数", ("priority",)
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "recipe_ocr_admission_wait_seconds", "受け付けの空きを待った時間", ("priority",)
+)
+ADMISSION_REJECTED = Counter(
+    "recipe_ocr_admission_rejected_total",
+    "受け付けなかった取り込み数（reason=queue_full/timeout）",
+    ("priority", "reason"),
+)
+
+# ---- スレッドプール ----
+
+EXECUTOR_WAIT_SECONDS = Histogram(
+    "recipe_ocr_executor_wait_seconds", "スレッドプールの空き待ち時間", ("pool",)
+)
+EXECUTOR_TASKS = Gauge(
+    "recipe_ocr_executor_tasks", "スレッドプールの待ち・実行中の件数", ("pool", "state")
+)
+
+# ---- OCR / LLM ----
+
+OCR_MODEL_READY = Gauge(
+    "recipe_ocr_ocr_model_ready", "OCRモデルのロードとウォームアップが済んでいれば1"
+)
+OCR_MODEL_LOAD_SECONDS = Gauge(
+    "recipe_ocr_ocr_model_load_seconds", "起動後のOCRモデルのロードとウォームアップにかかった時間"
+)
+OCR_BLOCKS = Histogram(
+    "recipe_ocr_ocr_blocks", "画像1枚あたりのOCRブロック数", buckets=(0, 5, 10, 20, 50, 100, 200, 500)
+)
+LLM_TOKENS = Histogram(
+    "recipe_ocr_llm_tokens",
+    "LLM呼び出し1回あたりのトークン数（kind=prompt/output）",
+    ("kind",),
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000),
+)
+LLM_CONNECTIONS = Gauge(
+    "recipe_ocr_llm_connections", "Ollamaへの接続数", ("state",)
+)
+
+# ---- キャッシュ ----
+
+CACHE_LOOKUPS = Counter(
+    "recipe_ocr_cache_lookups_total",
+    "キャッシュの参照数（cache=llm/content_hash/perceptual_hash, result=hit/miss）",
+    ("cache", "result"),
+)
+
+# ---- トレース ----
+
+TRACE_EXPORTS = Counter(
+    "recipe_ocr_trace_exports_total",
+    "OTLPで送ったトレース数（result=exported/failed/dropped）",
+    ("result",),
+)
+
+# ---- プロセス ----
+
+PROCESS_MEMORY = Gauge(
+    "recipe_ocr_process_memory_bytes", "プロセスのメモリ使用量（kind=rss/peak_rss）", ("kind",)
+)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from app.config import (
+    OCR_WORKERS,
+    OCR_WORKER_MAX_JOBS,
+    OCR_WORKER_TIMEOUT,
+    OCR_WORKER_HEALTH_INTERVAL,
+    OCR_WORKER_MAX_FAILURES,
+    OCR_WORKER_STALL_TIMEOUT,
+)
+from app.services.ocr_service import init_ocr, warmup_ocr, ocr_lines, ocr_lines_batch, build_result
+from app.services.executors import run_image
+from app.services.tracing import Span, adopt_spans, collect_spans
+
+logger = logging.getLogger(__name__)
+
+# OCRワーカープロセスのプール（OCR_WORKERS=0 の場合は使わない）
+_pool: Optional[ProcessPoolExecutor] = None
+_ready = False
+_monitor_task: Optional[asyncio.Task] = None
+# 死活確認とOCRの失敗が同時にプールを作り直さないようにする
+_restart_lock = asyncio.Lock()
+# 実行中のOCRの投入時刻と、最後にOCRが終わった時刻（monotonic）。
+# 実行中はpingを投げず、OCRが進んでいるかで判断する
+_running: dict[int, float] = {}
+_last_done = 0.0
+
+
+# ---- ワーカープロセス側 ----
+
+def _worker_init():
+    """ワーカー起動時にモデルをロードし、ウォームアップ推論を行う"""
+    init_ocr()
+    warmup_ocr()
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _worker_run(specs: list[tuple[str, tuple, str]]) -> tuple[list[list], list[Span]]:
+    """共有メモリ上の画像をOCRし、画像ごとの結果行とワーカー内で記録したスパンを返す"""
+    segments = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        arrays = [
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            for shm, (_, shape, dtype) in zip(segments, specs)
+        ]
+        with collect_spans() as spans:
+            if len(arrays) == 1:
+                result = [ocr_lines(arrays[0])]
+            else:
+                result = ocr_lines_batch(arrays)
+        # 共有メモリを閉じる前にビューを解放する
+        del arrays
+        return result, spans
+    finally:
+        for shm in segments:
+            shm.close()
+
+
+# ---- API側 ----
+
+def is_pool_enabled() -> bool:
+    """ワーカープロセスでOCRを行う設定か"""
+    return OCR_WORKERS > 0
+
+
+def is_pool_ready() -> bool:
+    """全ワーカーがモデルのロードとウォームアップを終えたか"""
+    return _ready
+
+
+def _create_pool() -> ProcessPoolExecutor:
+    # CUDA/Paddleはforkと相性が悪いためspawnで起動する
+    return ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_worker_init,
+        max_tasks_per_child=OCR_WORKER_MAX_JOBS or None,
+    )
+
+
+async def start_pool():
+    """ワーカープールを起動し、全ワーカーのウォームアップ完了を待つ（起動時に呼び出し）"""
+    global _pool, _ready
+    if _pool is not None:
+        return
+
+    _pool = _create_pool()
+    loop = asyncio.get_running_loop()
+
+    # ワーカー数ぶんのpingを同時に投げて全プロセスを起動させる
+    # （初期化の早いワーカーが複数のpingを拾うことがあるため、全PIDが揃うまで繰り返す）
+    pids: set[int] = set()
+    for _ in range(5):
+        pids.update(await asyncio.gather(*(
+            loop.run_in_executor(_pool, _worker_ping) for _ in range(OCR_WORKERS)
+        )))
+        if len(pids) >= OCR_WORKERS:
+            break
+    _ready = True
+
+
+async def start_monitor():
+    """ワーカーの死活を定期的に確認するタスクを開始（起動時に呼び出し）"""
+    global _monitor_task
+    if _monitor_task is None:
+        _monitor_task = asyncio.create_task(_monitor(), name="ocr-pool-monitor")
+
+
+async def _monitor():
+    failures = 0
+    while True:
+        await asyncio.sleep(OCR_WORKER_HEALTH_INTERVAL)
+        pool = _pool
+        if await check_pool():
+            failures = 0
+            continue
+
+        failures += 1
+        logger.warning(f"OCR worker pool health check failed ({failures}/{OCR_WORKER_MAX_FAILURES})")
+        if failures >= OCR_WORKER_MAX_FAILURES and pool is not None:
+            # 応答しないワーカーは自然には回復しないため、プロセスごと作り直す
+            failures = 0
+            await _restart_pool(pool)
+
+
+async def stop_pool():
+    """ワーカープールを停止（シャットダウン時に呼び出し）"""
+    global _pool, _ready, _monitor_task
+    _ready = False
+    if _monitor_task is not None:
+        _monitor_task.cancel()
+        _monitor_task = None
+    if _pool is not None:
+        await asyncio.to_thread(_pool.shutdown, wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def _restart_pool(broken: ProcessPoolExecutor):
+    """
+    壊れた・応答しないプールを作り直す
+
+    broken が既に別のタスクによって作り直された後（現在のプールでない）なら何もしない。
+    """
+    global _pool, _ready
+    async with _restart_lock:
+        if _pool is not broken:
+            return
+        logger.warning("OCR worker pool is broken, restarting")
+        _pool, _ready = None, False
+        # 固まったワーカーは shutdown では終わらないため、先に止める
+        # （実行中だったOCRは BrokenProcessPool になり、呼び出し側が新しいプールで再試行する）
+        processes = list((getattr(broken, "_processes", None) or {}).values())
+        for process in processes:
+            process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+        await start_pool()
+
+
+async def check_pool() -> bool:
+    """
+    ワーカーが応答するか確認し、壊れていれば作り直す
+
+    OCRの実行中はpingがOCRの後ろに並んで偽の失敗になり、ワーカーの処理件数
+    （OCR_WORKER_MAX_JOBS）も消費するため投げない。代わりに実行中のOCRが
+    OCR_WORKER_STALL_TIMEOUT 秒以内に1件でも終わっているかで判断する。
+    """
+    pool = _pool
+    if pool is None:
+        return False
+
+    if _running:
+        last_progress = max(_last_done, min(_running.values()))
+        return time.monotonic() - last_progress < OCR_WORKER_STALL_TIMEOUT
+
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(
+            loop.run_in_executor(pool, _worker_ping), timeout=OCR_WORKER_TIMEOUT
+        )
+        return True
+    except BrokenProcessPool:
+        await _restart_pool(pool)
+        return False
+    except asyncio.TimeoutError:
+        return False
+
+
+def _to_shared(img_array: np.ndarray) -> tuple[shared_memory.SharedMemory, tuple[str, tuple, str]]:
+    """
+    画像を共有メモリに書き込む（ワーカーへはセグメント名と形状だけを渡す）
+
+    配列から共有メモリ上のビューへ直接コピーし、tobytes() の中間バッファを作らない。
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(1, img_array.nbytes))
+    view = np.ndarray(img_array.shape, dtype=img_array.dtype, buffer=shm.buf)
+    view[...] = img_array
+    # 共有メモリを閉じる前にビューを解放する
+    del view
+    return shm, (shm.name, img_array.shape, img_array.dtype.str)
+
+
+async def run_ocr_pooled(img_arrays: list[np.ndarray]) -> list[tuple[str, list[dict], float]]:
+    """
+    ワーカープロセスでOCRを実行する
+
+    Returns:
+        画像ごとの (raw_text, blocks, confidence) のリスト
+    """
+    global _last_done
+    if _pool is None:
+        await start_pool()
+
+    segments = []
+    try:
+        specs = []
+        for img_array in img_arrays:
+            shm, spec = await run_image(_to_shared, img_array)
+            segments.append(shm)
+            specs.append(spec)
+
+        loop = asyncio.get_running_loop()
+        # 投入したプールを覚えておき、失敗したのがそのプールの場合だけ作り直す
+        pool = _pool
+        token = id(specs)
+        _running[token] = time.monotonic()
+        try:
+            lines_per_image, spans = await loop.run_in_executor(pool, _worker_run, specs)
+        except BrokenProcessPool:
+            # ワーカーが異常終了した場合はプールを作り直して1回だけ再試行
+            await _restart_pool(pool)
+            _running[token] = time.monotonic()
+            lines_per_image, spans = await loop.run_in_executor(_pool, _worker_run, specs)
+        finally:
+            _running.pop(token, None)
+        _last_done = time.monotonic()
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    adopt_spans(spans)
+    return [build_result(lines) for lines in lines_per_image]
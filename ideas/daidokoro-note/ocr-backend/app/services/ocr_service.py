@@ -1,28 +1,70 @@
+import threading
 import numpy as np
-from PIL import Image
-from paddleocr import PaddleOCR
-from typing import Optional
-
-from app.config import OCR_LANG, OCR_USE_GPU
-
-# グローバルOCRインスタンス（起動時にロード）
-_ocr_instance: Optional[PaddleOCR] = None
+from PIL import Image, ImageDraw
+from typing import TYPE_CHECKING, Optional
+from itertools import chain
+
+from app.config import (
+    OCR_LANG,
+    OCR_USE_GPU,
+    OCR_REC_BATCH_NUM,
+    OCR_ROI,
+    OCR_RETRY_SCORE,
+    LAYOUT_ANALYSIS,
+)
+from app.services.layout import analyze_layout, block_geometry, reading_order
+from app.services.tracing import span
+
+# paddleocr（paddle本体を含む）のimportは数秒かかるため、モデルのロード時まで遅らせる
+if TYPE_CHECKING:
+    from paddleocr import PaddleOCR
+
+# 文字範囲の前処理（find_text_region）
+ROI_PROBE_SIZE = 512  # 縮小画像の長辺の目安
+ROI_BLOCK = 4  # 縮小の最小ブロックサイズ（px）
+ROI_EDGE_THRESHOLD = 12.0  # 文字らしいとみなす隣接ブロック間の輝度差
+ROI_PADDING_BLOCKS = 4  # 切り出し範囲に足す余白（ブロック数）
+
+# 低スコアブロックの再認識（_retry_low_scores）
+OCR_RETRY_PADDING = 0.15  # 枠の高さに対する余白の割合
+OCR_RETRY_MIN_HEIGHT = 96  # 拡大後の最小の高さ（認識モデル入力の48pxの2倍）
+
+# グローバルOCRインスタンス（起動後にバックグラウンドでロード。readiness.py）
+_ocr_instance: Optional["PaddleOCR"] = None
+# ロード中に別スレッドから get_ocr() されても二重にロードしない
+_init_lock = threading.Lock()
 
 
 def init_ocr():
-    """OCRエンジンを初期化（起動時に呼び出し）"""
+    """OCRエンジンを初期化"""
     global _ocr_instance
-    if _ocr_instance is None:
-        _ocr_instance = PaddleOCR(
-            use_angle_cls=True,
-            lang=OCR_LANG,
-            show_log=False,
-            use_gpu=OCR_USE_GPU,
-        )
+    with _init_lock:
+        if _ocr_instance is None:
+            from paddleocr import PaddleOCR
+
+            _ocr_instance = PaddleOCR(
+                use_angle_cls=True,
+                lang=OCR_LANG,
+                show_log=False,
+                use_gpu=OCR_USE_GPU,
+                rec_batch_num=OCR_REC_BATCH_NUM,
+            )
     return _ocr_instance
 
 
-def get_ocr() -> PaddleOCR:
+def warmup_ocr():
+    """
+    小さな画像で一度推論する
+
+    初回の推論は推論エンジンの初期化（GPUならカーネルの準備）で遅いため、
+    最初の取り込みの前に済ませておく。
+    """
+    image = Image.new("RGB", (640, 160), "white")
+    ImageDraw.Draw(image).text((20, 60), "warmup OCR 123", fill="black")
+    ocr_lines(np.asarray(image))
+
+
+def get_ocr() -> "PaddleOCR":
     """OCRインスタンスを取得"""
     global _ocr_instance
     if _ocr_instance is None:
@@ -35,105 +77,275 @@ def is_ocr_loaded() -> bool:
     return _ocr_instance is not None
 
 
-def run_ocr(image: Image.Image) -> tuple[str, list[dict], float]:
+def run_ocr(img_array: np.ndarray) -> tuple[str, list[dict], float]:
     """
     OCRを実行し、行順復元したテキストとブロック情報を返す
 
+    img_array は前処理済みの uint8 (H, W, 3) 配列（image_processor.to_pixels）で、
+    コピーせずにそのままPaddleOCRへ渡す。
+
     Returns:
         raw_text: 行順復元したOCRテキスト
         blocks: 各ブロックの情報 [{text, bbox, score}]
         confidence: 全体の信頼度スコア
     """
+    return build_result(ocr_lines(img_array))
+
+
+def run_ocr_batch(img_arrays: list[np.ndarray]) -> list[tuple[str, list[dict], float]]:
+    """
+    複数画像をまとめてOCRする
+
+    Returns:
+        画像ごとの (raw_text, blocks, confidence) のリスト
+    """
+    lines_per_image = ocr_lines_batch(img_arrays)
+    return [build_result(lines) for lines in lines_per_image]
+
+
+def ocr_lines(img_array: np.ndarray) -> list:
+    """
+    1枚の画像をOCRし、PaddleOCRの結果行 [[bbox, (text, score)], ...] を返す
+
+    検出と認識を別々に呼ぶ（ocr-det / ocr-rec のスパンを分けて計測するため）。
+    """
+    return ocr_lines_batch([img_array])[0]
+
+
+def ocr_lines_batch(img_arrays: list[np.ndarray]) -> list[list]:
+    """
+    複数画像をOCRし、画像ごとの結果行を返す
+
+    検出は画像ごとに行い、切り出した全画像分のテキスト領域を
+    1回の方向分類・認識にまとめて渡す（rec_batch_num単位でバッチ推論される）。
+    検出枠はPaddleOCR本体（ocr(det=True, rec=True)）と同じく上から順に並べ替える。
+    """
     ocr = get_ocr()
 
-    # PIL ImageをNumPy配列に変換
-    img_array = np.array(image)
+    # paddleocrのimport時に tools パッケージが読み込み可能になる
+    from tools.infer.predict_system import sorted_boxes
+    from tools.infer.utility import get_rotate_crop_image
+
+    # 画像ごとに文字のある範囲を切り出してテキスト領域を検出
+    regions = []
+    boxes_per_image = []
+    crops = []
+    for img_array in img_arrays:
+        region = find_text_region(img_array)
+        if region is None:
+            regions.append((None, (0, 0)))
+            boxes_per_image.append([])
+            continue
+        crop, offset = _crop_region(img_array, region)
+        regions.append((crop, offset))
+
+        with span("ocr-det") as attrs:
+            det_result = ocr.ocr(crop, det=True, rec=False, cls=False)
+            boxes = det_result[0] if det_result and det_result[0] else []
+            if boxes:
+                boxes = [box.tolist() for box in sorted_boxes(np.array(boxes, dtype=np.float32))]
+            attrs["boxes"] = len(boxes)
+        boxes_per_image.append(boxes)
+        for box in boxes:
+            crops.append(get_rotate_crop_image(crop, np.array(box, dtype=np.float32)))
+
+    if not crops:
+        return [[] for _ in img_arrays]
+
+    # 全画像分の切り出しを1回で分類・認識
+    with span("ocr-rec") as attrs:
+        attrs["boxes"] = len(crops)
+        rec_result = ocr.ocr(crops, det=False, rec=True, cls=True)
+        rec_res = rec_result[0] if rec_result else []
+
+    lines_per_image = []
+    offset = 0
+    for boxes in boxes_per_image:
+        lines = []
+        for box, (text, score) in zip(boxes, rec_res[offset:offset + len(boxes)]):
+            # PaddleOCR本体と同じく低スコアの結果は捨てる
+            if score >= ocr.drop_score:
+                lines.append([box, (text, score)])
+        offset += len(boxes)
+        lines_per_image.append(lines)
+
+    _retry_low_scores([crop for crop, _ in regions], lines_per_image)
+
+    return [
+        _offset_lines(lines, x0, y0)
+        for lines, (_, (x0, y0)) in zip(lines_per_image, regions)
+    ]
+
 
-    # OCR実行
-    result = ocr.ocr(img_array, cls=True)
+def find_text_region(img_array: np.ndarray) -> Optional[tuple[int, int, int, int]]:
+    """
+    縮小画像の輝度差の投影から、文字のある範囲 (x0, y0, x1, y1) を求める
+
+    スクリーンショットの上下の余白や無地の背景を検出・認識にかけないための前処理。
+    エッジが1つもない（無地の）画像はNoneを返す。OCR_ROI=false なら常に画像全体。
+    """
+    height, width = img_array.shape[:2]
+    if not OCR_ROI or height < ROI_BLOCK * 2 or width < ROI_BLOCK * 2:
+        return 0, 0, width, height
+
+    # 長辺がROI_PROBE_SIZE程度になるよう、ブロック平均で縮小（細い線も平均に残る）
+    step = max(ROI_BLOCK, max(height, width) // ROI_PROBE_SIZE)
+    rows, cols = height // step, width // step
+    channel = img_array[:rows * step, :cols * step]
+    if channel.ndim == 3:
+        channel = channel[:, :, 1]  # 輝度の大半を占める緑チャンネルだけを見る
+    small = channel.reshape(rows, step, cols, step).mean(axis=(1, 3), dtype=np.float32)
+
+    # 隣のブロックとの輝度差が閾値を超えるところを「文字らしい」とみなす
+    edges = np.zeros((rows, cols), dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(small, axis=1)) > ROI_EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(small, axis=0)) > ROI_EDGE_THRESHOLD
+
+    ys = np.flatnonzero(edges.any(axis=1))
+    xs = np.flatnonzero(edges.any(axis=0))
+    if len(ys) == 0:
+        return None
+
+    pad = step * ROI_PADDING_BLOCKS
+    return (
+        max(0, int(xs[0]) * step - pad),
+        max(0, int(ys[0]) * step - pad),
+        min(width, (int(xs[-1]) + 1) * step + pad),
+        min(height, (int(ys[-1]) + 1) * step + pad),
+    )
+
+
+def _crop_region(
+    img_array: np.ndarray, region: tuple[int, int, int, int]
+) -> tuple[np.ndarray, tuple[int, int]]:
+    x0, y0, x1, y1 = region
+    if (x0, y0, x1, y1) == (0, 0, img_array.shape[1], img_array.shape[0]):
+        return img_array, (0, 0)
+    # OpenCVに渡すため連続したメモリにする（切り出した範囲だけのコピー）
+    return np.ascontiguousarray(img_array[y0:y1, x0:x1]), (x0, y0)
+
+
+def _offset_lines(lines: list, x0: int, y0: int) -> list:
+    """切り出し範囲の座標を元画像の座標に戻す"""
+    if x0 == 0 and y0 == 0:
+        return lines
+    return [
+        [[[x + x0, y + y0] for x, y in box], rec]
+        for box, rec in lines
+    ]
+
+
+def _retry_low_scores(img_arrays: list[Optional[np.ndarray]], lines_per_image: list[list]):
+    """
+    スコアが OCR_RETRY_SCORE 未満のブロックだけ、余白を足して拡大した切り出しで再認識する
+
+    画像全体を拡大し直すのではなく、該当ブロックだけを全画像分まとめて1回で認識し、
+    スコアが上がったものだけ置き換える（lines_per_image を直接更新）。
+    """
+    if OCR_RETRY_SCORE <= 0:
+        return
+
+    targets = [
+        (lines, i, img_array)
+        for img_array, lines in zip(img_arrays, lines_per_image)
+        for i, (_, (_, score)) in enumerate(lines)
+        if score < OCR_RETRY_SCORE
+    ]
+    if not targets:
+        return
+
+    with span("ocr-retry") as attrs:
+        attrs["boxes"] = len(targets)
+        crops = [_upscaled_crop(img_array, lines[i][0]) for lines, i, img_array in targets]
+        rec_result = get_ocr().ocr(crops, det=False, rec=True, cls=True)
+        rec_res = rec_result[0] if rec_result else []
+
+    for (lines, i, _), (text, score) in zip(targets, rec_res):
+        if score > lines[i][1][1]:
+            lines[i] = [lines[i][0], (text, score)]
+
+
+def _upscaled_crop(img_array: np.ndarray, box: list) -> np.ndarray:
+    from tools.infer.utility import get_rotate_crop_image
 
-    if not result or not result[0]:
+    points = np.array(box, dtype=np.float32)
+
+    # 検出枠が文字に接しすぎて欠けることがあるため、枠の高さに比例した余白を足す
+    center = points.mean(axis=0)
+    box_height = float(np.linalg.norm(points[3] - points[0]))
+    direction = points - center
+    norms = np.maximum(np.linalg.norm(direction, axis=1, keepdims=True), 1e-6)
+    points = points + direction / norms * box_height * OCR_RETRY_PADDING
+    points[:, 0] = np.clip(points[:, 0], 0, img_array.shape[1] - 1)
+    points[:, 1] = np.clip(points[:, 1], 0, img_array.shape[0] - 1)
+
+    crop = get_rotate_crop_image(img_array, points)
+
+    # 認識モデルの入力高さより小さい枠は、LANCZOSで拡大してから渡す
+    if crop.shape[0] < OCR_RETRY_MIN_HEIGHT:
+        scale = OCR_RETRY_MIN_HEIGHT / crop.shape[0]
+        size = (max(1, round(crop.shape[1] * scale)), OCR_RETRY_MIN_HEIGHT)
+        crop = np.asarray(Image.fromarray(crop).resize(size, Image.LANCZOS))
+    return crop
+
+
+def build_result(lines: list) -> tuple[str, list[dict], float]:
+    """PaddleOCRの結果行 [[bbox, (text, score)], ...] からテキスト・ブロック・信頼度を作る"""
+    if not lines:
         return "", [], 0.0
 
-    # ブロック情報を抽出
-    blocks = []
-    for line in result[0]:
-        bbox = line[0]  # [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
-        text = line[1][0]
-        score = line[1][1]
-
-        # bbox中心座標を計算
-        center_x = sum(p[0] for p in bbox) / 4
-        center_y = sum(p[1] for p in bbox) / 4
-
-        # 文字の高さを計算（行クラスタリング用）
-        height = (bbox[3][1] - bbox[0][1] + bbox[2][1] - bbox[1][1]) / 2
-
-        blocks.append({
-            "text": text,
-            "bbox": bbox,
-            "score": score,
-            "center_x": center_x,
-            "center_y": center_y,
-            "height": height,
-        })
+    texts = [line[1][0] for line in lines]
+    scores = [line[1][1] for line in lines]
+
+    # bbox座標を (N, 4, 2) の配列にまとめて、中心・高さを一括計算する
+    # （入れ子のリストをnp.asarrayに渡すより、平坦化してfromiterで読む方が速い）
+    boxes = np.fromiter(
+        chain.from_iterable(chain.from_iterable(line[0] for line in lines)),
+        dtype=np.float64,
+        count=len(lines) * 8,
+    ).reshape(-1, 4, 2)
 
     # 行順復元
-    raw_text = reconstruct_reading_order(blocks)
+    with span("layout"):
+        raw_text = reconstruct_reading_order(texts, boxes)
 
     # 信頼度計算（平均スコア）
-    if blocks:
-        confidence = sum(b["score"] for b in blocks) / len(blocks)
-    else:
-        confidence = 0.0
+    confidence = sum(scores) / len(scores)
 
-    # 返却用にblockを整形（内部情報を除去）
+    # 返却用のblock（bboxはPaddleOCRの値をそのまま返す）
     output_blocks = [
-        {"text": b["text"], "bbox": b["bbox"], "score": b["score"]}
-        for b in blocks
+        {"text": line[1][0], "bbox": line[0], "score": line[1][1]}
+        for line in lines
     ]
 
     return raw_text, output_blocks, confidence
 
 
-def reconstruct_reading_order(blocks: list[dict]) -> str:
-    """
-    bbox情報から読み順を復元してテキストを生成
-
-    方針:
-    1. Y座標でクラスタリング（行判定）
-    2. 行内はX座標で昇順
-    3. 行はY座標で昇順
-    """
-    if not blocks:
+def reconstruct_reading_order(texts: list[str], boxes: np.ndarray) -> str:
+    """bbox配列 (N, 4, 2) から読み順を復元してテキストを生成"""
+    if not texts:
         return ""
 
-    # 平均文字高さを計算（行クラスタリングの閾値に使用）
-    avg_height = sum(b["height"] for b in blocks) / len(blocks)
-    threshold = avg_height * 0.5
+    if LAYOUT_ANALYSIS:
+        # 段組み・縦書きを考慮して並べる
+        lines = analyze_layout(texts, boxes).lines
+    else:
+        lines = reading_order(*block_geometry(boxes))
 
-    # Y座標でソート
-    sorted_blocks = sorted(blocks, key=lambda b: b["center_y"])
+    return "\n".join("".join(texts[i] for i in line) for line in lines)
 
-    # 行にクラスタリング
-    lines = []
-    current_line = [sorted_blocks[0]]
 
-    for block in sorted_blocks[1:]:
-        # 前のブロックとのY差が閾値以内なら同じ行
-        if abs(block["center_y"] - current_line[-1]["center_y"]) < threshold:
-            current_line.append(block)
-        else:
-            lines.append(current_line)
-            current_line = [block]
+def main():
+    """
+    モデルを取得してウォームアップ推論だけを行う
 
-    lines.append(current_line)
+    Dockerイメージのビルド時に実行し、モデルファイルをイメージに含めておく
+    （起動のたびにダウンロードしない）。
+    """
+    init_ocr()
+    warmup_ocr()
+    print(f"PaddleOCR models are ready (lang={OCR_LANG}, gpu={OCR_USE_GPU})")
 
-    # 各行内をX座標でソートし、テキストを結合
-    text_lines = []
-    for line in lines:
-        sorted_line = sorted(line, key=lambda b: b["center_x"])
-        line_text = "".join(b["text"] for b in sorted_line)
-        text_lines.append(line_text)
 
-    return "\n".join(text_lines)
+if __name__ == "__main__":
+    main()
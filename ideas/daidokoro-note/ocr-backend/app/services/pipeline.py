@@ -0,0 +1,476 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, BinaryIO, Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import (
+    PREPROCESS_CONCURRENCY,
+    OCR_CONCURRENCY,
+    OCR_WORKERS,
+    LLM_CONCURRENCY,
+    PIPELINE_QUEUE_SIZE,
+    OLLAMA_MODEL,
+    DEDUP_PERCEPTUAL,
+)
+from app.models.database import save_recipe, save_image_hash, transaction
+from app.services.dedup import content_hash, perceptual_hash, find_duplicate, find_similar
+from app.request_context import request_id_var
+from app.services.image_processor import process_image, to_pixels
+from app.services.image_writer import image_key, submit_image
+from app.services.ocr_service import run_ocr, run_ocr_batch
+from app.services.ocr_pool import is_pool_enabled, run_ocr_pooled
+from app.services.readiness import wait_ready
+from app.services.executors import run_image, run_ocr_task, run_db
+from app.services.llm_service import structure_recipe
+from app.services.memory import StageMemory, process_memory
+from app.services.metrics import (
+    OCR_BLOCKS,
+    PIPELINE_JOBS_IN_FLIGHT,
+    PIPELINE_QUEUE_WAIT_SECONDS,
+    PIPELINE_STAGE_SECONDS,
+)
+from app.services.tracing import Trace, current_trace, record_span, span, use_trace
+
+logger = logging.getLogger(__name__)
+
+# ステージの処理時間の指数移動平均の重み（受け付け制限の Retry-After の見積もりに使う）
+SERVICE_TIME_ALPHA = 0.2
+
+
+class ImageProcessingError(Exception):
+    """画像の前処理に失敗（クライアント起因の400として扱う）"""
+
+
+@dataclass
+class IngestPage:
+    """取り込み対象の画像1枚分"""
+    # アップロードの一時ファイル等（バイト列に読み出さずにハッシュ計算・デコードする）
+    source: Optional[BinaryIO]
+    content_hash: Optional[str] = None
+    perceptual_hash: Optional[str] = None
+    # 前処理後の画像サイズ（知覚ハッシュの候補の絞り込み用）
+    size: Optional[tuple[int, int]] = None
+    processed_image: Optional[Image.Image] = None
+    # OCRに渡す前処理済みの画素（processed_imageは保存後に解放し、こちらだけを残す）
+    pixels: Optional[np.ndarray] = None
+    # 保存画像のストレージ上のキー（IMAGE_DIR等からの相対パス）
+    image_path: Optional[str] = None
+    raw_text: str = ""
+    ocr_blocks: list[dict] = field(default_factory=list)
+    confidence: float = 0.0
+
+
+@dataclass
+class RecipeDraft:
+    """保存される1レシピ分の結果"""
+    recipe_id: str
+    pages: list[IngestPage]
+    raw_text: str = ""
+    ocr_blocks: list[dict] = field(default_factory=list)
+    confidence: float = 0.0
+    structured: Optional[dict] = None
+    warnings: list[str] = field(default_factory=list)
+
+    # 重複検出で既存レシピの結果を再利用した場合はTrue
+    cache_hit: bool = False
+
+    def use_cached(self, recipe: dict):
+        """重複検出でヒットした既存レシピの結果をそのまま使う"""
+        self.recipe_id = recipe["id"]
+        self.raw_text = recipe["ocr_raw_text"]
+        self.ocr_blocks = recipe["ocr_blocks"]
+        self.confidence = recipe["confidence"] or 0.0
+        self.structured = recipe["structured_json"]
+        self.warnings = list(recipe["warnings"])
+        self.cache_hit = True
+
+        page = self.pages[0]
+        page.image_path = recipe["image_path"]
+        page.source = None
+        page.processed_image = None
+        page.pixels = None
+
+    @property
+    def image_path(self) -> Optional[str]:
+        # 複数ページをまとめたレシピは先頭ページの画像を代表にする
+        return self.pages[0].image_path
+
+
+@dataclass
+class IngestJob:
+    """
+    パイプラインを流れる取り込みジョブ
+
+    通常の取り込みは画像1枚・レシピ1件。一括取り込みでは複数画像を
+    1レシピにまとめる（merge=True）か、画像ごとに1レシピずつ作る。
+    """
+    drafts: list[RecipeDraft]
+    source_url: Optional[str] = None
+    title_hint: Optional[str] = None
+    request_id: str = "-"
+    # Falseなら重複検出をせず必ず再処理する
+    dedup: bool = True
+
+    # ステージ開始時の通知（非同期ジョブの進捗更新用）
+    on_stage: Optional[Callable[[str], Awaitable[None]]] = None
+    # LLMストリーミング中に確定したフィールドの通知（フィールド名, 値）
+    on_partial: Optional[Callable[[str, Any], Awaitable[None]]] = None
+    future: Optional[asyncio.Future] = None
+    # 現在のステージのキューに入れた時刻（perf_counter、待ち時間の計測用）
+    queued_at: float = 0.0
+    # 投入したリクエストのトレース（ステージのワーカーでスパンを記録する先）
+    trace: Optional[Trace] = None
+
+    @classmethod
+    def single(cls, recipe_id: str, source: BinaryIO, **kwargs) -> "IngestJob":
+        """画像1枚から1レシピを作るジョブ"""
+        return cls(drafts=[RecipeDraft(recipe_id=recipe_id, pages=[IngestPage(source)])], **kwargs)
+
+    @property
+    def pending_drafts(self) -> list[RecipeDraft]:
+        """重複検出にかからず、処理が必要なレシピ"""
+        return [draft for draft in self.drafts if not draft.cache_hit]
+
+
+StageHandler = Callable[[IngestJob], Awaitable[None]]
+
+
+class Stage:
+    """
+    有界キューとワーカー数を持つパイプラインの1段
+
+    ワーカーは処理を終えたジョブを次段のキューへ渡す。次段が詰まっている間は
+    put で待つため、上流に自然とバックプレッシャーがかかる。
+    """
+
+    def __init__(self, name: str, handler: StageHandler, concurrency: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue[IngestJob] = asyncio.Queue(maxsize=max(1, queue_size))
+        self.next_stage: Optional["Stage"] = None
+        self.memory = StageMemory()
+        # 1件あたりの処理時間（秒）の移動平均。まだ処理していなければNone
+        self.service_time: Optional[float] = None
+        self._workers: list[asyncio.Task] = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            self._workers.append(
+                asyncio.create_task(self._worker(), name=f"pipeline-{self.name}-{i}")
+            )
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _observe(self, elapsed: float):
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                # クライアント切断等で待ち手がいなくなったジョブは捨てる
+                if job.future.done():
+                    continue
+
+                request_id_var.set(job.request_id)
+                use_trace(job.trace)
+                start = time.perf_counter()
+                PIPELINE_QUEUE_WAIT_SECONDS.observe(start - job.queued_at, stage=self.name)
+                record_span(f"wait-{self.name}", job.queued_at, start)
+                try:
+                    if job.on_stage is not None:
+                        await job.on_stage(self.name)
+                    started = self.memory.begin()
+                    try:
+                        with span(self.name):
+                            await self.handler(job)
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        PIPELINE_STAGE_SECONDS.observe(elapsed, stage=self.name)
+                        self._observe(elapsed)
+                        self.memory.end(started)
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                    continue
+
+                if self.next_stage is None:
+                    if not job.future.done():
+                        job.future.set_result(job)
+                else:
+                    job.queued_at = time.perf_counter()
+                    await self.next_stage.queue.put(job)
+            finally:
+                self.queue.task_done()
+
+
+async def _preprocess_stage(job: IngestJob):
+    """重複検出 + 画像前処理 + 保存"""
+    for draft in job.drafts:
+        # 重複検出は画像1枚=レシピ1件の場合のみ
+        single = len(draft.pages) == 1
+
+        if single:
+            page = draft.pages[0]
+            if page.content_hash is None:
+                with span("hash"):
+                    page.content_hash = await run_image(content_hash, page.source)
+            if job.dedup:
+                with span("dedup") as attrs:
+                    existing = await run_db(find_duplicate, page.content_hash)
+                    attrs["hit"] = bool(existing)
+                if existing:
+                    draft.use_cached(existing)
+                    continue
+
+        for page in draft.pages:
+            if page.content_hash is None:
+                with span("hash"):
+                    page.content_hash = await run_image(content_hash, page.source)
+            try:
+                page.processed_image = await run_image(process_image, page.source)
+            except Exception as e:
+                raise ImageProcessingError(str(e)) from e
+
+            # 知覚ハッシュだけでは別の画像と区別できないため、既存レシピとの照合はOCRの後で行う
+            if single and DEDUP_PERCEPTUAL:
+                with span("phash"):
+                    page.perceptual_hash = await run_image(perceptual_hash, page.processed_image)
+                page.size = page.processed_image.size
+
+            # エンコードと書き込みはバックグラウンドで行い、ここでは保存先のキーだけを決める
+            # （スパンは書き込み待ちの空きを待った時間。エンコード自体は応答の後に終わることがある）
+            with span("store"):
+                page.image_path = await submit_image(page.processed_image, image_key(page.content_hash))
+
+            # 以降のステージでは元ファイルもPIL画像も不要。OCR用の配列だけを残し、
+            # 全解像度の画像がキュー待ちの間に2つ以上残らないようにする
+            with span("pixels"):
+                page.pixels = await run_image(to_pixels, page.processed_image)
+            page.processed_image = None
+            page.source = None
+
+
+async def _ocr_stage(job: IngestJob):
+    """OCR実行（複数画像は1回のバッチ推論にまとめる）"""
+    drafts = job.pending_drafts
+    pages = [page for draft in drafts for page in draft.pages]
+    if not pages:
+        return
+
+    error = None
+    try:
+        # 起動直後はモデルのロードとウォームアップを待つ
+        await wait_ready()
+        if is_pool_enabled():
+            results = await run_ocr_pooled([page.pixels for page in pages])
+        elif len(pages) == 1:
+            results = [await run_ocr_task(run_ocr, pages[0].pixels)]
+        else:
+            results = await run_ocr_task(
+                run_ocr_batch, [page.pixels for page in pages]
+            )
+    except Exception as e:
+        logger.warning(f"OCR failed: {e}", extra={"request_id": job.request_id})
+        error = f"OCR_ERROR: {str(e)}"
+        results = [("", [], 0.0) for _ in pages]
+
+    for page, (raw_text, ocr_blocks, confidence) in zip(pages, results):
+        if error is None:
+            OCR_BLOCKS.observe(len(ocr_blocks))
+        page.raw_text = raw_text
+        page.ocr_blocks = ocr_blocks
+        page.confidence = confidence
+        # 画像はOCR後は不要なので早めに解放
+        page.pixels = None
+
+    for draft in drafts:
+        _merge_pages(draft)
+        if error:
+            draft.warnings.append(error)
+        if not draft.raw_text:
+            draft.warnings.append("OCR_TEXT_EMPTY")
+
+    if error is None and job.dedup and DEDUP_PERCEPTUAL:
+        await _reuse_similar(drafts)
+
+
+async def _reuse_similar(drafts: list[RecipeDraft]):
+    """知覚ハッシュが近く、OCRテキストもほぼ同じ既存レシピがあれば、LLMを呼ばずにその結果を使う"""
+    for draft in drafts:
+        page = draft.pages[0]
+        if len(draft.pages) != 1 or not page.perceptual_hash or not draft.raw_text:
+            continue
+        with span("dedup") as attrs:
+            existing = await run_db(find_similar, page.perceptual_hash, page.size, draft.raw_text)
+            attrs["hit"] = bool(existing)
+        if existing:
+            draft.use_cached(existing)
+
+
+def _merge_pages(draft: RecipeDraft):
+    """ページごとのOCR結果をレシピ単位にまとめる"""
+    if len(draft.pages) == 1:
+        page = draft.pages[0]
+        draft.raw_text = page.raw_text
+        draft.ocr_blocks = page.ocr_blocks
+        draft.confidence = page.confidence
+        return
+
+    draft.raw_text = "\n\n".join(page.raw_text for page in draft.pages if page.raw_text)
+    draft.ocr_blocks = [
+        {**block, "page": i}
+        for i, page in enumerate(draft.pages)
+        for block in page.ocr_blocks
+    ]
+    # ブロック数で重み付けした平均
+    if draft.ocr_blocks:
+        draft.confidence = sum(b["score"] for b in draft.ocr_blocks) / len(draft.ocr_blocks)
+    else:
+        draft.confidence = 0.0
+
+
+async def _llm_stage(job: IngestJob):
+    """LLM構造化"""
+    for draft in job.pending_drafts:
+        if not draft.raw_text:
+            continue
+
+        draft.structured, llm_warnings = await structure_recipe(
+            draft.raw_text,
+            source_url=job.source_url,
+            title_hint=job.title_hint,
+            on_partial=job.on_partial,
+        )
+        draft.warnings.extend(llm_warnings)
+
+
+async def _save_stage(job: IngestJob):
+    """DB保存（ジョブ内の全レシピを1トランザクションでコミット）"""
+    await run_db(_save_drafts, job)
+
+
+def _save_drafts(job: IngestJob):
+    with span("db"), transaction():
+        for draft in job.pending_drafts:
+            save_recipe(
+                recipe_id=draft.recipe_id,
+                image_path=draft.image_path,
+                ocr_raw_text=draft.raw_text,
+                ocr_blocks=draft.ocr_blocks,
+                structured_json=draft.structured,
+                confidence=draft.confidence,
+                warnings=draft.warnings,
+                source_url=job.source_url,
+                llm_model=OLLAMA_MODEL if draft.structured else None,
+                image_keys=[page.image_path for page in draft.pages],
+            )
+
+            page = draft.pages[0]
+            if len(draft.pages) == 1 and page.content_hash:
+                save_image_hash(page.content_hash, page.perceptual_hash, draft.recipe_id, page.size)
+
+
+class IngestPipeline:
+    """
+    前処理 → OCR → LLM → 保存 の段階パイプライン
+
+    ステージごとに同時実行数を分けることで、リクエストN+1のOCRと
+    リクエストNのLLM呼び出しが重なり、スループットは最も遅い段で決まる。
+    """
+
+    def __init__(self):
+        self.stages = [
+            Stage("preprocess", _preprocess_stage, PREPROCESS_CONCURRENCY, PIPELINE_QUEUE_SIZE),
+            # ワーカープロセスを使う場合は全ワーカーに仕事が行き渡るようにする
+            Stage("ocr", _ocr_stage, max(OCR_CONCURRENCY, OCR_WORKERS), PIPELINE_QUEUE_SIZE),
+            Stage("llm", _llm_stage, LLM_CONCURRENCY, PIPELINE_QUEUE_SIZE),
+            # SQLiteへの書き込みは1本に絞る
+            Stage("save", _save_stage, 1, PIPELINE_QUEUE_SIZE),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    async def stop(self):
+        for stage in self.stages:
+            await stage.stop()
+
+    async def submit(self, job: IngestJob) -> IngestJob:
+        """ジョブを投入し、全ステージの完了を待つ"""
+        job.future = asyncio.get_running_loop().create_future()
+        job.queued_at = time.perf_counter()
+        if job.trace is None:
+            job.trace = current_trace()
+        PIPELINE_JOBS_IN_FLIGHT.inc()
+        try:
+            await self.stages[0].queue.put(job)
+            return await job.future
+        finally:
+            PIPELINE_JOBS_IN_FLIGHT.dec()
+
+    def throughput(self) -> Optional[float]:
+        """
+        観測した処理時間から見積もった1秒あたりの完了件数（最も遅いステージで決まる）
+
+        まだ1件も処理していなければNone。
+        """
+        rates = [
+            stage.concurrency / stage.service_time
+            for stage in self.stages
+            if stage.service_time
+        ]
+        return min(rates) if rates else None
+
+    def queue_depths(self) -> dict[str, int]:
+        """ステージごとの待ち件数"""
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def memory_stats(self) -> dict[str, dict[str, float]]:
+        """プロセス全体とステージごとのメモリ使用量（MB）"""
+        stats = {"process": process_memory()}
+        stats.update({stage.name: stage.memory.stats() for stage in self.stages})
+        return stats
+
+
+# グローバルパイプライン（起動時に開始）
+_pipeline: Optional[IngestPipeline] = None
+
+
+def start_pipeline() -> IngestPipeline:
+    """パイプラインのワーカーを起動（起動時に呼び出し）"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = IngestPipeline()
+        _pipeline.start()
+    return _pipeline
+
+
+async def stop_pipeline():
+    """パイプラインのワーカーを停止（シャットダウン時に呼び出し）"""
+    global _pipeline
+    if _pipeline is not None:
+        await _pipeline.stop()
+        _pipeline = None
+
+
+def get_pipeline() -> IngestPipeline:
+    """パイプラインを取得"""
+    if _pipeline is None:
+        start_pipeline()
+    return _pipeline
@@ -0,0 +1,108 @@
+"""
+OCRモデルのバックグラウンドロード
+
+PaddleOCRのimportとモデルのロードには数十秒かかることがあるため、起動（lifespan）では待たず、
+サーバーがリクエストを受け付け始めてから裏でロードとウォームアップ推論を行う。
+その間 /v1/health/live は即座に応答し、/v1/health/ready と取り込みAPIは 503 を返す。
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.services.ocr_service import init_ocr, warmup_ocr
+from app.services.ocr_pool import is_pool_enabled, is_pool_ready, start_pool, start_monitor
+from app.services.executors import run_ocr_task
+from app.services.metrics import OCR_MODEL_READY, OCR_MODEL_LOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# starting → loading → ready（失敗した場合は failed）
+_state = "starting"
+_error: Optional[str] = None
+_load_seconds: Optional[float] = None
+_task: Optional[asyncio.Task] = None
+_ready_event: Optional[asyncio.Event] = None
+
+
+def _load_in_process():
+    init_ocr()
+    warmup_ocr()
+
+
+async def _load():
+    global _state, _error, _load_seconds
+    _state = "loading"
+    start = time.perf_counter()
+    try:
+        if is_pool_enabled():
+            # ワーカーは起動時（_worker_init）にロードとウォームアップを行う
+            await start_pool()
+            await start_monitor()
+        else:
+            # 推論と同じOCR用スレッドでロードする
+            await run_ocr_task(_load_in_process)
+    except Exception as e:
+        _state, _error = "failed", str(e)
+        logger.error(f"Failed to load OCR model: {e}", exc_info=True, extra={"request_id": "startup"})
+        _ready_event.set()
+        return
+
+    _load_seconds = time.perf_counter() - start
+    _state = "ready"
+    OCR_MODEL_READY.set(1)
+    OCR_MODEL_LOAD_SECONDS.set(_load_seconds)
+    _ready_event.set()
+    logger.info(f"OCR model is ready ({_load_seconds:.1f}s)", extra={"request_id": "startup"})
+
+
+def start_model_loading():
+    """OCRモデルのロードを開始（起動時に呼び出し。完了を待たない）"""
+    global _task, _ready_event
+    if _task is not None:
+        return
+    _ready_event = asyncio.Event()
+    _task = asyncio.create_task(_load(), name="ocr-model-loader")
+
+
+async def stop_model_loading():
+    """ロード中なら中断する（シャットダウン時に呼び出し。スレッドで実行中のロードは終わるまで続く）"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    OCR_MODEL_READY.set(0)
+
+
+def is_ready() -> bool:
+    """OCRモデルのロードとウォームアップが済んだか（ワーカープロセス使用時は、作り直し中でないか）"""
+    return _state == "ready" and (not is_pool_enabled() or is_pool_ready())
+
+
+def has_failed() -> bool:
+    """ロードに失敗したか（再起動しない限り回復しない）"""
+    return _state == "failed"
+
+
+def model_status() -> dict:
+    """状態（starting/loading/ready/failed）・エラー・ロードにかかった秒数"""
+    return {
+        "state": _state,
+        "error": _error,
+        "load_seconds": round(_load_seconds, 2) if _load_seconds is not None else None,
+    }
+
+
+async def wait_ready():
+    """
+    OCRモデルの準備ができるまで待つ（パイプラインのOCRステージが呼ぶ）
+
+    起動直後に再開したジョブなどが、ロード中のモデルを二重にロードしないようにする。
+    ロードに失敗していれば RuntimeError。
+    """
+    if _state == "ready" or _ready_event is None:
+        return
+    await _ready_event.wait()
+    if _state != "ready":
+        raise RuntimeError(f"OCR model is not available: {_error}")
@@ -0,0 +1,176 @@
+import importlib.util
+import logging
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import IMAGE_DIR, STORAGE_BACKEND, S3_BUCKET, S3_ENDPOINT_URL, S3_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(content_hash: str, suffix: str) -> str:
+    """
+    ハッシュからキーを作る（例: "ab/cd/abcd....webp"）
+
+    先頭2文字ずつで2階層に分け、1ディレクトリのファイル数を数百万件でも数十件程度に抑える。
+    """
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{suffix}"
+
+
+class ImageStorage(ABC):
+    """
+    画像の保存先
+
+    キーは "/" 区切りの相対パス。DBにはキーだけを保存するため、
+    保存先のディレクトリやバケットを移してもレコードを書き換える必要はない。
+    """
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """キーの内容を返す（なければFileNotFoundError）"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """キーを削除（なくてもエラーにしない）"""
+
+    @abstractmethod
+    def list(self) -> Iterator[tuple[str, float]]:
+        """全キーを (キー, 更新時刻のUNIX秒) で返す"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """ローカルファイルとして読めるならそのパス（FileResponseでそのまま返せる）"""
+        return None
+
+
+class LocalStorage(ImageStorage):
+    """ローカルディレクトリ（IMAGE_DIR）に保存する"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = Path(key)
+        if path.is_absolute() or ".." in path.parts:
+            raise ValueError(f"Invalid storage key: {key}")
+        return self.root / path
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        # 一時ファイルに書いてから置き換える（読み手に書きかけのファイルを見せない）
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list(self) -> Iterator[tuple[str, float]]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                try:
+                    modified = path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                yield path.relative_to(self.root).as_posix(), modified
+
+    def local_path(self, key: str) -> Optional[str]:
+        return str(self._path(key))
+
+
+class S3Storage(ImageStorage):
+    """
+    S3互換のオブジェクトストレージに保存する（boto3が必要）
+
+    S3_ENDPOINT_URL を指定すればMinIO等のローカルのS3互換サーバーも使える。
+    認証情報はboto3の標準（AWS_ACCESS_KEY_ID等の環境変数）に従う。
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self._client_error = ClientError
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        self._client.put_object(
+            Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type
+        )
+
+    def get(self, key: str) -> bytes:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise FileNotFoundError(key) from e
+            raise
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def list(self) -> Iterator[tuple[str, float]]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["LastModified"].timestamp()
+
+
+# グローバルストレージ（起動時に初期化）
+_storage: Optional[ImageStorage] = None
+
+
+def init_storage() -> ImageStorage:
+    """STORAGE_BACKEND に従って保存先を作る（起動時に呼び出し）"""
+    global _storage
+    if _storage is not None:
+        return _storage
+
+    if STORAGE_BACKEND == "s3":
+        if importlib.util.find_spec("boto3") is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        if not S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        _storage = S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL)
+        logger.info(f"Image storage: s3://{S3_BUCKET}/{S3_PREFIX}")
+    else:
+        if STORAGE_BACKEND != "local":
+            logger.warning(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}, using local")
+        _storage = LocalStorage(IMAGE_DIR)
+    return _storage
+
+
+def get_storage() -> ImageStorage:
+    """保存先を取得"""
+    if _storage is None:
+        return init_storage()
+    return _storage
@@ -0,0 +1,329 @@
+"""
+リクエストごとのスパン計測
+
+取り込みの各段階（アップロードの受信・デコード・OCRの検出/認識・LLM・DB保存など）の
+所要時間を記録し、Server-Timing ヘッダと1行1JSONのログで返す。
+OTLP_ENDPOINT を指定すれば OTLP/HTTP（JSON）でコレクターへも送る。
+
+トレースは contextvars で引き継ぐため、スレッドプール（executors）で実行した処理の
+スパンも同じリクエストに記録される。パイプラインのステージ間は IngestJob.trace で渡す。
+"""
+import asyncio
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import httpx
+
+from app.config import (
+    TRACING_ENABLED,
+    TRACE_LOG,
+    OTLP_ENDPOINT,
+    OTLP_SERVICE_NAME,
+    OTLP_EXPORT_INTERVAL,
+    OTLP_MAX_PENDING,
+)
+from app.services.metrics import TRACE_EXPORTS
+
+logger = logging.getLogger(__name__)
+
+# 1リクエスト1行のJSON（main.pyでメッセージだけを出すハンドラを付ける）
+trace_logger = logging.getLogger("app.trace")
+
+# W3C Trace Context（クライアントから traceparent が来れば同じトレースIDを使う）
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    name: str
+    start: float  # perf_counter（プロセスをまたいでも同じ時計: CLOCK_MONOTONIC）
+    end: float
+    span_id: str
+    parent_id: Optional[str] = None  # Noneならリクエスト全体（ルート）の直下
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """1リクエスト（または1非同期ジョブ）分のスパン"""
+
+    def __init__(self, request_id: str, traceparent: Optional[str] = None):
+        self.request_id = request_id
+        self.trace_id = secrets.token_hex(16)
+        self.parent_span_id: Optional[str] = None
+        match = _TRACEPARENT.match(traceparent or "")
+        if match and match.group(1) != "0" * 32:
+            self.trace_id, self.parent_span_id = match.groups()
+        self.span_id = secrets.token_hex(8)
+        self.start = time.perf_counter()
+        self.start_ns = time.time_ns()
+        self.end: Optional[float] = None
+        self.attributes: dict[str, Any] = {}
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing ヘッダの値（同名のスパンは合計する。例: "decode;dur=41.2, ocr-det;dur=380.5, total;dur=2210.0"）
+
+        一括取り込みでは画像ごとのスパンが同名で並ぶため、名前ごとの合計にして長さを抑える。
+        """
+        with self._lock:
+            spans = list(self.spans)
+        totals: dict[str, float] = {}
+        for span in spans:
+            totals[span.name] = totals.get(span.name, 0.0) + (span.end - span.start)
+        end = self.end if self.end is not None else time.perf_counter()
+        totals["total"] = end - self.start
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+    def to_log(self) -> dict:
+        """構造化ログの1行分（時刻はリクエスト開始からのミリ秒）"""
+        with self._lock:
+            spans = list(self.spans)
+        names = {span.span_id: span.name for span in spans}
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            **self.attributes,
+            "duration_ms": round((end - self.start) * 1000, 1),
+            "spans": [
+                {
+                    "name": span.name,
+                    "parent": names.get(span.parent_id),
+                    "start_ms": round((span.start - self.start) * 1000, 1),
+                    "duration_ms": round((span.end - span.start) * 1000, 1),
+                    **span.attributes,
+                }
+                for span in sorted(spans, key=lambda span: span.start)
+            ],
+        }
+
+
+_trace_var: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+# 現在開いているスパン（この下に記録したスパンの親になる）
+_parent_var: ContextVar[Optional[str]] = ContextVar("trace_parent", default=None)
+
+
+def start_trace(request_id: str, traceparent: Optional[str] = None) -> Optional[Trace]:
+    """トレースを開始して現在のコンテキストに設定する（TRACING_ENABLED=false ならNone）"""
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(request_id, traceparent)
+    use_trace(trace)
+    return trace
+
+
+def use_trace(trace: Optional[Trace]):
+    """既存のトレースを現在のコンテキストに設定する（パイプラインのワーカーがジョブごとに呼ぶ）"""
+    _trace_var.set(trace)
+    _parent_var.set(None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace_var.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[dict[str, Any]]:
+    """
+    with ブロックの所要時間をスパンとして記録する
+
+    yield した dict に入れた値はスパンの属性になる（例: attrs["cache"] = "hit"）。
+    トレースがなければ何も記録しない。
+    """
+    trace = _trace_var.get()
+    attributes: dict[str, Any] = {}
+    if trace is None:
+        yield attributes
+        return
+
+    span_id = secrets.token_hex(8)
+    parent_id = _parent_var.get()
+    token = _parent_var.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        end = time.perf_counter()
+        _parent_var.reset(token)
+        trace.add(Span(name, start, end, span_id, parent_id, attributes))
+
+
+def record_span(name: str, start: float, end: Optional[float] = None, **attributes: Any):
+    """開始時刻（perf_counter）が分かっている区間をスパンとして記録する"""
+    trace = _trace_var.get()
+    if trace is not None:
+        end = time.perf_counter() if end is None else end
+        trace.add(Span(name, start, end, secrets.token_hex(8), _parent_var.get(), attributes))
+
+
+def adopt_spans(spans: list[Span]):
+    """別プロセス（OCRワーカー）で記録したスパンを、現在のスパンの下に取り込む"""
+    trace = _trace_var.get()
+    if trace is None:
+        return
+    parent_id = _parent_var.get()
+    for child in spans:
+        if child.parent_id is None:
+            child.parent_id = parent_id
+        trace.add(child)
+
+
+@contextmanager
+def collect_spans() -> Iterator[list[Span]]:
+    """
+    with ブロック内のスパンを集めて返す（OCRワーカープロセス側で使う）
+
+    ワーカーにはリクエストのトレースがないため、一時的なトレースに記録して
+    結果と一緒にAPIプロセスへ返し、adopt_spans で取り込む。
+    """
+    spans: list[Span] = []
+    if not TRACING_ENABLED:
+        yield spans
+        return
+
+    trace = Trace("-")
+    token = _trace_var.set(trace)
+    try:
+        yield spans
+    finally:
+        _trace_var.reset(token)
+        spans.extend(trace.spans)
+
+
+def finish_trace(trace: Trace, end: Optional[float] = None, **attributes: Any):
+    """
+    トレースを終了し、スパンがあれば構造化ログとOTLPの送信待ちに回す
+
+    ヘルスチェック等スパンを記録しないリクエストはログに出さない。
+    """
+    trace.end = time.perf_counter() if end is None else end
+    trace.attributes.update(attributes)
+    if not trace.spans:
+        return
+    if TRACE_LOG:
+        trace_logger.info(json.dumps(trace.to_log(), ensure_ascii=False))
+    if _export_task is not None:
+        if len(_pending) < OTLP_MAX_PENDING:
+            _pending.append(trace)
+        else:
+            TRACE_EXPORTS.inc(result="dropped")
+
+
+# ---- OTLP/HTTP（JSON）での送信 ----
+
+_pending: list[Trace] = []
+_export_task: Optional[asyncio.Task] = None
+_export_client: Optional[httpx.AsyncClient] = None
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _to_otlp(traces: list[Trace]) -> dict:
+    """OTLPのExportTraceServiceRequest（JSONエンコーディング。IDは16進文字列）"""
+
+    def unix_nano(trace: Trace, perf: float) -> str:
+        return str(trace.start_ns + int((perf - trace.start) * 1e9))
+
+    spans = []
+    for trace in traces:
+        status = trace.attributes.get("status")
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": trace.span_id,
+            "parentSpanId": trace.parent_span_id or "",
+            "name": f"{trace.attributes.get('method', '')} {trace.attributes.get('route', '')}".strip() or "job",
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": unix_nano(trace, trace.end),
+            "attributes": [_attribute("request_id", trace.request_id)]
+            + [_attribute(key, value) for key, value in trace.attributes.items()],
+            # 5xxはエラー（STATUS_CODE_ERROR）
+            "status": {"code": 2} if isinstance(status, int) and status >= 500 else {},
+        })
+        for child in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": child.span_id,
+                "parentSpanId": child.parent_id or trace.span_id,
+                "name": child.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": unix_nano(trace, child.start),
+                "endTimeUnixNano": unix_nano(trace, child.end),
+                "attributes": [_attribute(key, value) for key, value in child.attributes.items()],
+            })
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", OTLP_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+async def _export():
+    """送信待ちのトレースをまとめて送る（失敗した分は捨てる。計測のために取り込みを待たせない）"""
+    if not _pending:
+        return
+    traces = _pending[:]
+    _pending.clear()
+    try:
+        response = await _export_client.post(OTLP_ENDPOINT, json=_to_otlp(traces))
+        response.raise_for_status()
+        TRACE_EXPORTS.inc(len(traces), result="exported")
+    except httpx.HTTPError as e:
+        TRACE_EXPORTS.inc(len(traces), result="failed")
+        logger.warning(f"OTLP export failed ({len(traces)} trace(s)): {e}")
+
+
+async def _export_loop():
+    while True:
+        await asyncio.sleep(OTLP_EXPORT_INTERVAL)
+        await _export()
+
+
+def start_exporter():
+    """OTLPの定期送信を開始（起動時に呼び出し。OTLP_ENDPOINT が空なら何もしない）"""
+    global _export_task, _export_client
+    if not TRACING_ENABLED or not OTLP_ENDPOINT or _export_task is not None:
+        return
+    _export_client = httpx.AsyncClient(timeout=httpx.Timeout(5.0))
+    _export_task = asyncio.create_task(_export_loop(), name="otlp-exporter")
+    logger.info(f"Exporting traces to {OTLP_ENDPOINT}", extra={"request_id": "startup"})
+
+
+async def stop_exporter():
+    """定期送信を止め、残りを送る（シャットダウン時に呼び出し）"""
+    global _export_task, _export_client
+    if _export_task is None:
+        return
+    _export_task.cancel()
+    await asyncio.gather(_export_task, return_exceptions=True)
+    _export_task = None
+    await _export()
+    await _export_client.aclose()
+    _export_client = None
+
@@ -0,0 +1,116 @@
+"""
+SQLiteアクセス層のマイクロベンチマーク
+
+接続を毎回開き直す従来方式と、スレッドごとに接続を使い回す現行方式
+（WAL + プラグマ調整）で、レシピの保存・取得の1秒あたり件数を比較する。
+
+    python -m benchmarks.bench_db --count 2000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+def _sample_recipe(i: int) -> dict:
+    return {
+        "recipe_id": f"01BENCH{i:019d}",
+        "image_path": f"images/{i}.jpg",
+        "ocr_raw_text": "鶏むね肉のレモンバター\n材料（2人分）\n鶏むね肉 1枚\nバター 10g\n" * 5,
+        "ocr_blocks": [{"text": "鶏むね肉", "bbox": [[0, 0], [10, 0], [10, 10], [0, 10]], "score": 0.9}] * 30,
+        "structured_json": {"title": "鶏むね肉のレモンバター", "ingredients": [], "steps": []},
+        "confidence": 0.9,
+        "warnings": [],
+    }
+
+
+# ---- 従来方式（呼び出しごとに接続を開いて閉じる） ----
+
+def _legacy_save(db_path: str, r: dict):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT INTO recipes (
+            id, created_at, source_url, image_path, ocr_raw_text,
+            ocr_blocks_json, structured_json, confidence, warnings_json,
+            llm_model, version
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        r["recipe_id"], datetime.utcnow().isoformat(), None, r["image_path"], r["ocr_raw_text"],
+        json.dumps(r["ocr_blocks"], ensure_ascii=False),
+        json.dumps(r["structured_json"], ensure_ascii=False),
+        r["confidence"], json.dumps(r["warnings"]), None, 1,
+    ))
+    conn.commit()
+    conn.close()
+
+
+def _legacy_get(db_path: str, recipe_id: str, decode):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+    conn.close()
+    # JSON列の復元は現行方式（get_recipe）と同じ処理にそろえ、接続の扱いの差だけを比べる
+    return decode(row) if row else None
+
+
+def _rate(count: int, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="保存・取得する件数")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_db_"))
+
+    # app.config はimport時に DB_PATH を読むため、先に環境変数を設定する
+    legacy_db = str(workdir / "legacy.sqlite3")
+    os.environ["DB_PATH"] = str(workdir / "pooled.sqlite3")
+    from app.models import database
+
+    # 従来方式用のDB（ジャーナルモードも従来のDELETEのまま）
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("""
+        CREATE TABLE recipes (
+            id TEXT PRIMARY KEY, created_at TEXT NOT NULL, source_url TEXT,
+            image_path TEXT NOT NULL, ocr_raw_text TEXT NOT NULL, ocr_blocks_json TEXT,
+            structured_json TEXT, confidence REAL, warnings_json TEXT, llm_model TEXT,
+            version INTEGER DEFAULT 1
+        )
+    """)
+    conn.close()
+    database.init_db()
+
+    recipes = [_sample_recipe(i) for i in range(args.count)]
+    ids = [r["recipe_id"] for r in recipes]
+
+    def pooled_batch():
+        with database.transaction():
+            for r in recipes:
+                database.save_recipe(**{**r, "recipe_id": r["recipe_id"] + "B"})
+
+    results = {
+        "legacy write": _rate(args.count, lambda: [_legacy_save(legacy_db, r) for r in recipes]),
+        "legacy read": _rate(args.count, lambda: [_legacy_get(legacy_db, i, database._row_to_recipe) for i in ids]),
+        "pooled write": _rate(args.count, lambda: [database.save_recipe(**r) for r in recipes]),
+        "pooled write (batched commit)": _rate(args.count, pooled_batch),
+        "pooled read": _rate(args.count, lambda: [database.get_recipe(i) for i in ids]),
+    }
+
+    print(f"SQLite {sqlite3.sqlite_version}, {args.count} recipes, {sys.platform}")
+    for name, rate in results.items():
+        print(f"  {name:32s} {rate:10.0f} ops/s")
+
+    database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
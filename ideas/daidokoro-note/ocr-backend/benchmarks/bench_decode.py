@@ -0,0 +1,131 @@
+"""
+画像デコード経路のピークRSSベンチマーク
+
+アップロードを bytes に読み出して BytesIO から開き、RGB変換 → EXIF回転 → リサイズし、
+OCR時に PIL画像を保持したまま np.array でコピーする従来経路と、一時ファイルから
+直接デコードして転置を縮小後に1回だけかけ、OCR用の配列だけを残す現行経路を比べる。
+経路ごとに別プロセスで実行し、デコード開始前のRSSからの増分として
+peak（処理中の最大RSS）と held（OCR待ちの間に保持され続けるメモリ）を表示する。
+
+    python -m benchmarks.bench_decode --width 4032 --height 3024
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.image_processor import fixed_scale, process_image, to_pixels
+from app.services.memory import current_rss, peak_rss
+
+
+def _make_photo(path: str, width: int, height: int):
+    """EXIFで90度回転（Orientation=6）を指定した、文字入りのノイズの多いJPEG"""
+    # 表示上は縦長（height x width）の写真として描き、保存時に横倒しにする
+    rng = np.random.default_rng(0)
+    pixels = rng.normal(225, 12, (width, height, 3)).clip(0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    # 縦画の並びで文字の行を模す（文字の高さの推定が効くように）
+    line_height = max(12, width // 80)
+    for y in range(line_height, width - line_height, line_height * 2):
+        for x in range(height // 10, height * 9 // 10, line_height // 3):
+            draw.rectangle((x, y, x + line_height // 8, y + line_height), fill=(40, 40, 40))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.transpose(Image.Transpose.ROTATE_90).save(path, "JPEG", quality=92, exif=exif)
+
+
+# ---- 従来経路 ----
+
+def _legacy_decode(path: str) -> tuple:
+    with open(path, "rb") as f:
+        contents = f.read()
+    image = Image.open(io.BytesIO(contents))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image = image.rotate(-90, expand=True)
+    scale = fixed_scale(*image.size)
+    image = image.resize(
+        (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+        Image.LANCZOS,
+        reducing_gap=3.0 if scale < 1 else None,
+    )
+    # OCRステージまでPIL画像を保持し、OCR時に配列へコピーしていた
+    return image, np.array(image)
+
+
+# ---- 現行経路 ----
+
+def _current_decode(path: str) -> tuple:
+    with open(path, "rb") as f:
+        return (to_pixels(process_image(f)),)
+
+
+def _child(mode: str, path: str):
+    """1経路を計測して結果をJSONで出力（別プロセスで実行される）"""
+    import logging
+
+    logging.disable(logging.CRITICAL)
+
+    decode = _legacy_decode if mode == "legacy" else _current_decode
+    before = current_rss()
+    started = time.perf_counter()
+    held = decode(path)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "peak_mb": (peak_rss() - before) / (1024 * 1024),
+        "held_mb": (current_rss() - before) / (1024 * 1024),
+        "ms": elapsed * 1000,
+        "shape": list(held[-1].shape),
+    }))
+
+
+def _run(mode: str, path: str, policy: str) -> dict:
+    env = {**os.environ, "RESIZE_POLICY": policy}
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_decode", "--child", mode, path],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032, help="画像の幅")
+    parser.add_argument("--height", type=int, default=3024, help="画像の高さ")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "photo.jpg")
+        _make_photo(path, args.width, args.height)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        print(f"{args.width}x{args.height} JPEG ({size_mb:.1f}MB, EXIF Orientation=6)")
+        print("  path                    peak       held     time    output")
+        for label, mode, policy in [
+            ("legacy (fixed)", "legacy", "fixed"),
+            ("current (fixed)", "current", "fixed"),
+            ("current (adaptive)", "current", "adaptive"),
+        ]:
+            result = _run(mode, path, policy)
+            shape = "x".join(str(n) for n in result["shape"])
+            print(
+                f"  {label:<20} {result['peak_mb']:7.1f} MB {result['held_mb']:7.1f} MB "
+                f"{result['ms']:7.1f} ms   {shape}"
+            )
+
+
+if __name__ == "__main__":
+    main()
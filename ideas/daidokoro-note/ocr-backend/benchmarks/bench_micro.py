@@ -0,0 +1,119 @@
+"""
+取り込みの各処理のマイクロベンチマーク
+
+- process_image: 合成コーパス（benchmarks.corpus）の画像の種類ごとに、デコード + 向きの補正 + リサイズ
+- reconstruct_reading_order: ブロック数を変えた1段組みのページと2段組みのページ
+- parse_llm_response: そのままのJSON・コードブロック・前後に文章のある応答・壊れた応答
+
+変更前後で同じコマンドを実行し、中央値とp95を比べる。
+
+    python -m benchmarks.bench_micro --repeat 20
+"""
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import PIL
+
+from benchmarks import corpus
+from benchmarks.bench_reading_order import synthetic_page, two_column_page
+from benchmarks.stub_ollama import RESPONSES, TRAILER
+from app.services.image_processor import process_image
+from app.services.llm_service import parse_llm_response
+from app.services.ocr_service import reconstruct_reading_order
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _measure(fn: Callable[[], object], repeat: int, number: int = 1) -> list[float]:
+    """1回あたりの所要時間（秒）を repeat 個返す（短い処理は number 回の平均）"""
+    fn()  # 初回のimportやキャッシュの影響を除く
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def _report(name: str, times: list[float], note: str = ""):
+    unit, scale = ("ms", 1e3) if statistics.median(times) >= 1e-3 else ("us", 1e6)
+    print(
+        f"  {name:36s} p50 {statistics.median(times) * scale:9.2f}{unit}"
+        f"  p95 {percentile(times, 95) * scale:9.2f}{unit}  {note}"
+    )
+
+
+def bench_process_image(images: list[tuple[corpus.CorpusImage, bytes]], repeat: int):
+    print("process_image")
+    by_kind: dict[str, list[tuple[corpus.CorpusImage, bytes]]] = {}
+    for entry, data in images:
+        by_kind.setdefault(entry.kind, []).append((entry, data))
+
+    for kind, items in by_kind.items():
+        times = []
+        for entry, data in items:
+            times += _measure(lambda: process_image(io.BytesIO(data)), max(1, repeat // len(items)))
+        megapixels = sum(entry.width * entry.height for entry, _ in items) / len(items) / 1e6
+        _report(kind, times, f"{len(items)} images, {megapixels:.1f} MP avg")
+
+
+def bench_reading_order(repeat: int):
+    print("reconstruct_reading_order")
+    for n_boxes in (50, 300, 2000):
+        lines = synthetic_page(n_boxes)
+        texts = [line[1][0] for line in lines]
+        boxes = np.asarray([line[0] for line in lines], dtype=np.float64)
+        _report(f"{n_boxes} boxes, 1 column", _measure(lambda: reconstruct_reading_order(texts, boxes), repeat))
+
+    texts, boxes = two_column_page(300)
+    _report("300 boxes, 2 columns", _measure(lambda: reconstruct_reading_order(texts, boxes), repeat))
+
+
+def bench_parse_llm_response(repeat: int):
+    print("parse_llm_response")
+    body = json.dumps(RESPONSES[0], ensure_ascii=False)
+    cases = [
+        ("plain JSON", body),
+        ("code block", f"```json\n{body}\n```"),
+        ("JSON + trailing text", body + TRAILER),
+        ("text + JSON + text", "構造化しました。\n" + body + TRAILER),
+        ("broken (unclosed)", body[:-10]),
+    ]
+    for name, response in cases:
+        _report(name, _measure(lambda: parse_llm_response(response), repeat, number=200))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="処理ごとの計測回数")
+    parser.add_argument("--corpus", type=Path, default=corpus.DEFAULT_DIR, help="合成画像の置き場所")
+    parser.add_argument("--count", type=int, default=10, help="process_image に使う画像の枚数")
+    parser.add_argument("--only", choices=["image", "reading_order", "parse"], help="1種類だけを計測する")
+    args = parser.parse_args()
+
+    # process_image のリサイズログを出さない
+    logging.disable(logging.INFO)
+    print(f"Python {platform.python_version()}, Pillow {PIL.__version__}, NumPy {np.__version__}, {platform.machine()}")
+
+    if args.only in (None, "image"):
+        bench_process_image(corpus.load(args.corpus, args.count), args.repeat)
+    if args.only in (None, "reading_order"):
+        bench_reading_order(args.repeat)
+    if args.only in (None, "parse"):
+        bench_parse_llm_response(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
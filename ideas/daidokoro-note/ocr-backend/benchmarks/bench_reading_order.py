@@ -0,0 +1,133 @@
+"""
+読み順復元のマイクロベンチマーク
+
+ブロックごとにdictを作ってPythonでソート・行分割する従来実装と、
+bboxを (N, 4, 2) 配列で扱うNumPy実装を、合成した密なページで比較する。
+段組みのないページでは両者の出力テキストが一致することも確認する。
+あわせて2段組みページでのレイアウト解析の時間も計測する。
+
+    python -m benchmarks.bench_reading_order --boxes 5000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.layout import analyze_layout
+from app.services.ocr_service import build_result
+
+
+# ---- 従来実装（ブロックごとのdict + Pythonループ） ----
+
+def _legacy_build_result(lines: list) -> tuple[str, list[dict], float]:
+    blocks = []
+    for line in lines:
+        bbox = line[0]
+        blocks.append({
+            "text": line[1][0],
+            "bbox": bbox,
+            "score": line[1][1],
+            "center_x": sum(p[0] for p in bbox) / 4,
+            "center_y": sum(p[1] for p in bbox) / 4,
+            "height": (bbox[3][1] - bbox[0][1] + bbox[2][1] - bbox[1][1]) / 2,
+        })
+
+    avg_height = sum(b["height"] for b in blocks) / len(blocks)
+    threshold = avg_height * 0.5
+    sorted_blocks = sorted(blocks, key=lambda b: b["center_y"])
+
+    text_lines = []
+    current_line = [sorted_blocks[0]]
+    for block in sorted_blocks[1:]:
+        if abs(block["center_y"] - current_line[-1]["center_y"]) < threshold:
+            current_line.append(block)
+        else:
+            text_lines.append(current_line)
+            current_line = [block]
+    text_lines.append(current_line)
+
+    raw_text = "\n".join(
+        "".join(b["text"] for b in sorted(line, key=lambda b: b["center_x"]))
+        for line in text_lines
+    )
+    confidence = sum(b["score"] for b in blocks) / len(blocks)
+    output_blocks = [{"text": b["text"], "bbox": b["bbox"], "score": b["score"]} for b in blocks]
+    return raw_text, output_blocks, confidence
+
+
+def synthetic_page(n_boxes: int, seed: int = 0) -> list:
+    """
+    PaddleOCRの結果行形式で、密に詰まったページを合成する
+
+    行のY位置に揺らぎを入れ、わずかに傾いたbboxや同じX座標のブロックも混ぜる。
+    """
+    rng = random.Random(seed)
+    lines = []
+    per_row = 12
+    for i in range(n_boxes):
+        row, col = divmod(i, per_row)
+        x = col * 90 + rng.uniform(-3, 3)
+        y = row * 36 + rng.uniform(-6, 6)
+        w, h = rng.uniform(40, 85), rng.uniform(18, 30)
+        skew = rng.uniform(-2, 2)
+        if rng.random() < 0.02:
+            x = float(round(x))  # X座標が完全に一致するブロック
+        bbox = [[x, y], [x + w, y + skew], [x + w, y + h + skew], [x, y + h]]
+        lines.append([bbox, (f"t{i}", rng.uniform(0.5, 1.0))])
+    rng.shuffle(lines)
+    return lines
+
+
+def two_column_page(n_boxes: int, seed: int = 0) -> tuple[list[str], np.ndarray]:
+    """見出し + 行の高さがずれた2段組みのページ（テキスト, bbox配列）"""
+    rng = random.Random(seed)
+    texts, boxes = ["見出し"], [[[100, 0], [700, 0], [700, 40], [100, 40]]]
+    for i in range(n_boxes - 1):
+        col, row = i % 2, i // 2
+        x, y = 20 + col * 400, 80 + row * 40 + col * 15 + rng.uniform(-2, 2)
+        w = rng.uniform(300, 340)
+        texts.append(f"{'左右'[col]}{row}")
+        boxes.append([[x, y], [x + w, y], [x + w, y + 24], [x, y + 24]])
+    return texts, np.asarray(boxes, dtype=np.float64)
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, default=5000, help="1ページあたりのブロック数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（最速値を表示）")
+    args = parser.parse_args()
+
+    # 出力が従来実装と一致することを複数ページで確認
+    for seed in range(20):
+        page = synthetic_page(random.Random(seed).randint(1, 400), seed)
+        assert build_result(page) == _legacy_build_result(page), f"output mismatch (seed={seed})"
+
+    page = synthetic_page(args.boxes)
+    assert build_result(page) == _legacy_build_result(page), "output mismatch"
+
+    texts, boxes = two_column_page(args.boxes)
+    layout = analyze_layout(texts, boxes)
+    assert layout.regions == 3, f"columns not detected (regions={layout.regions})"
+
+    legacy = _best_of(args.repeat, lambda: _legacy_build_result(page))
+    vectorized = _best_of(args.repeat, lambda: build_result(page))
+    columns = _best_of(args.repeat, lambda: analyze_layout(texts, boxes))
+
+    print(f"NumPy {np.__version__}, {args.boxes} boxes, best of {args.repeat}")
+    print(f"  legacy (dict + loop)     {legacy * 1000:8.2f} ms")
+    print(f"  vectorized (N,4,2)       {vectorized * 1000:8.2f} ms   x{legacy / vectorized:.1f}")
+    print(f"  layout, 2 columns        {columns * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+全文検索のベンチマーク
+
+合成したレシピを保存したDBで、FTS5（trigram + bm25）による検索と、
+structured_json を LIKE で走査する素朴な方式の応答時間を比較する。
+
+    python -m benchmarks.bench_search --count 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 出現頻度の高い順（調味料が多く、食材は一部がよく使われ残りはまれ、という偏りを再現する）
+_INGREDIENTS = [
+    "醤油", "砂糖", "塩", "酒", "みりん", "ごま油", "にんにく", "生姜", "玉ねぎ", "サラダ油",
+    "にんじん", "卵", "味噌", "豚バラ肉", "鶏もも肉", "長ねぎ", "じゃがいも", "キャベツ", "片栗粉", "酢",
+    "バター", "鶏むね肉", "豚こま切れ肉", "大根", "しめじ", "豆腐", "合いびき肉", "ピーマン", "もやし", "なす",
+    "白菜", "鶏がらスープの素", "小麦粉", "マヨネーズ", "ケチャップ", "牛乳", "トマト", "ほうれん草", "小松菜", "えのき",
+    "鮭", "きゅうり", "牛こま切れ肉", "ベーコン", "チーズ", "油揚げ", "ブロッコリー", "かぼちゃ", "ごぼう", "れんこん",
+    "オイスターソース", "豆板醤", "さば", "えび", "あさり", "ツナ缶", "こんにゃく", "厚揚げ", "ちくわ", "ソーセージ",
+    "生クリーム", "カレー粉", "パン粉", "ウスターソース", "アボカド", "里芋", "長芋", "オクラ", "セロリ", "ズッキーニ",
+    "明太子", "ししとう", "はんぺん", "桜えび", "コチュジャン", "ナンプラー", "パクチー", "春菊", "柚子胡椒", "甜麺醤",
+]
+_WEIGHTS = [1 / (rank + 1) ** 0.8 for rank in range(len(_INGREDIENTS))]
+_METHODS = ["煮", "炒め", "焼き", "蒸し", "和え", "揚げ", "スープ", "サラダ", "丼", "グラタン"]
+_STEPS = [
+    "{0}を一口大に切る",
+    "フライパンに{1}を熱し、{0}を炒める",
+    "{0}と{2}を鍋に入れ、弱火で10分煮る",
+    "{1}で味を調え、器に盛る",
+    "耐熱容器に{0}を入れ、ラップをして電子レンジで3分加熱する",
+]
+
+# (名前, 検索語)
+_QUERIES = [
+    ("3文字以上（調味料）", "みりん"),
+    ("3文字以上（よく使う食材）", "豚バラ肉"),
+    ("3文字以上（まれな食材）", "コチュジャン"),
+    ("3文字以上の2語", "鶏もも肉 じゃがいも"),
+    ("3文字以上 + 2文字", "豚バラ 大根"),
+    ("2文字だけ（よく使う）", "大根"),
+    ("2文字だけ（まれ）", "春菊"),
+    ("3文字以上（該当なし）", "ビーツ"),
+    ("2文字だけ（該当なし）", "春雨"),
+]
+
+
+def _sample_recipe(i: int, rng: random.Random) -> dict:
+    ingredients: list[str] = []
+    while len(ingredients) < 8:
+        name = rng.choices(_INGREDIENTS, _WEIGHTS)[0]
+        if name not in ingredients:
+            ingredients.append(name)
+    # タイトルには調味料ではなく主な食材を使う
+    main = [name for name in ingredients if _INGREDIENTS.index(name) >= 8] or ingredients
+    title = f"{main[0]}と{main[-1]}の{rng.choice(_METHODS)}"
+    steps = [
+        {"order": n + 1, "text": template.format(*rng.sample(ingredients, 3))}
+        for n, template in enumerate(rng.sample(_STEPS, 4))
+    ]
+    return {
+        "recipe_id": f"01BENCH{i:019d}",
+        "image_path": f"bench/{i}.webp",
+        "ocr_raw_text": title,
+        "ocr_blocks": [],
+        "structured_json": {
+            "title": title,
+            "ingredients": [{"name": name, "amount": "適量"} for name in ingredients],
+            "steps": steps,
+            "tags": [],
+            "raw_text_used": title,
+        },
+        "confidence": 0.9,
+        "warnings": [],
+    }
+
+
+def _legacy_search(conn: sqlite3.Connection, query: str, limit: int) -> list:
+    """structured_json を語ごとに LIKE で絞り、新しい順に返す"""
+    terms = query.split()
+    where = " AND ".join("structured_json LIKE ?" for _ in terms)
+    return conn.execute(
+        f"SELECT id FROM recipes WHERE {where} ORDER BY id DESC LIMIT ?",
+        [f"%{t}%" for t in terms] + [limit],
+    ).fetchall()
+
+
+def _timings(fn, repeat: int) -> tuple[float, float, int]:
+    """(中央値ms, p95 ms, 件数)"""
+    times = []
+    hits = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = len(fn())
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1], hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="保存するレシピ数")
+    parser.add_argument("--repeat", type=int, default=50, help="検索語ごとの試行回数")
+    parser.add_argument("--limit", type=int, default=20, help="1回の検索で返す件数")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_search_"))
+
+    # app.config はimport時に DB_PATH を読むため、先に環境変数を設定する
+    os.environ["DB_PATH"] = str(workdir / "search.sqlite3")
+    from app.models import database
+
+    database.init_db()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with database.transaction():
+        for i in range(args.count):
+            database.save_recipe(**_sample_recipe(i, rng))
+    print(f"SQLite {sqlite3.sqlite_version}, {args.count} recipes, {sys.platform} "
+          f"(saved in {time.perf_counter() - start:.1f}s)")
+
+    conn = database.get_connection()
+    conn.execute("ANALYZE")
+    print(f"  {'':28s} {'FTS5 p50':>9s} {'p95':>7s} {'LIKE p50':>9s} {'p95':>7s}  hits")
+    for name, query in _QUERIES:
+        fts = _timings(lambda: database.search_recipes(query, args.limit)[0], args.repeat)
+        legacy = _timings(lambda: _legacy_search(conn, query, args.limit), args.repeat)
+        print(f"  {name:28s} {fts[0]:7.2f}ms {fts[1]:5.2f}ms {legacy[0]:7.2f}ms {legacy[1]:5.2f}ms  {fts[2]}")
+
+    database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
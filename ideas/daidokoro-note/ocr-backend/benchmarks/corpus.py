@@ -0,0 +1,207 @@
+"""
+ベンチマーク用の合成レシピ画像
+
+スマホのスクリーンショット・カメラ写真・Web画像・A4スキャンを模した画像を、
+1段組み・2段組み・カード型のレイアウトと、EXIFの向き（1/3/6/8）を組み合わせて作る。
+乱数の種を固定しているため、同じ引数なら毎回同じバイト列になる（ベンチマーク結果を比べられる）。
+文字はPillowの標準フォントで描くため、CJKフォントやネットワークがなくても作れる。
+
+    python -m benchmarks.corpus --count 24 --out data/bench_corpus
+"""
+import argparse
+import io
+import json
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_DIR = Path(__file__).resolve().parent.parent / "data" / "bench_corpus"
+
+# (種類, 表示上の幅, 高さ, 形式, 写真らしいノイズを入れるか)
+_KINDS = [
+    ("screenshot", 1170, 2532, "PNG", False),
+    ("photo", 4032, 3024, "JPEG", True),
+    ("photo_small", 1280, 960, "JPEG", True),
+    ("web", 1080, 1350, "WEBP", False),
+    ("scan", 2480, 3508, "JPEG", True),
+]
+_LAYOUTS = ["single", "two_column", "card"]
+_ORIENTATIONS = [1, 1, 3, 6, 8]  # 向きの補正がない画像を多めにする
+
+# 表示上正しい向きの画像を、EXIFのOrientationに対応する向きで保存するための変換
+# （image_processor.apply_orientation の逆変換）
+_STORE_TRANSPOSE = {
+    3: Image.Transpose.ROTATE_180,
+    6: Image.Transpose.ROTATE_90,
+    8: Image.Transpose.ROTATE_270,
+}
+
+_INGREDIENTS = [
+    "butabara 200g", "tamanegi 1/2", "ninjin 1/3", "shoyu 2 tbsp", "mirin 2 tbsp", "sake 1 tbsp",
+    "satou 1 tsp", "goma abura 1 tsp", "tori momo 300g", "jagaimo 2", "kyabetsu 1/4", "tamago 2",
+    "ninniku 1 clove", "shouga 10g", "daikon 10cm", "tofu 1 block", "miso 1.5 tbsp", "katakuriko 1 tsp",
+]
+_STEPS = [
+    "Cut the vegetables into bite-sized pieces.",
+    "Heat oil in a pan over medium heat.",
+    "Add the pork and stir-fry until browned.",
+    "Mix the seasonings in a small bowl.",
+    "Pour the sauce and simmer for 10 minutes.",
+    "Thicken with starch dissolved in water.",
+    "Serve on a plate and sprinkle green onion.",
+]
+_TITLES = ["Nikujaga", "Butadon", "Karaage", "Mabo Tofu", "Oyakodon", "Buta Kimchi", "Daikon Nimono"]
+
+
+@dataclass
+class CorpusImage:
+    file: str
+    kind: str
+    layout: str
+    orientation: int
+    format: str
+    width: int  # 保存されている画素の幅（向きの補正前）
+    height: int
+    bytes: int
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # FreeTypeのないPillow
+        return ImageFont.load_default()
+
+
+def _background(width: int, height: int, photo: bool, rng: np.random.Generator) -> Image.Image:
+    if not photo:
+        return Image.new("RGB", (width, height), (250, 250, 250))
+    # 紙を撮った写真らしく、明るさのむらとセンサーノイズを入れる
+    shade = np.linspace(235, 205, height, dtype=np.float32)[:, None, None]
+    noise = rng.normal(0, 10, (height, width, 3)).astype(np.float32)
+    return Image.fromarray((shade + noise).clip(0, 255).astype(np.uint8))
+
+
+def _draw_recipe(image: Image.Image, layout: str, rng: random.Random):
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    # 文字の高さは画像の大きさに対してばらつかせる（リサイズ方式の判定が効くように）
+    size = max(14, int(min(width, height) * rng.uniform(0.018, 0.035)))
+    body, title = _font(size), _font(int(size * 1.6))
+    ink = (30, 30, 30)
+    margin = width // 12
+    y = height // 14
+
+    if layout == "card":
+        # スクリーンショットのような色付きの帯と、余白の多いカード
+        draw.rectangle((0, 0, width, height // 10), fill=(230, 120, 60))
+        margin = width // 6
+        y = height // 6
+        draw.rectangle((margin // 2, y - size, width - margin // 2, height - height // 8), outline=(200, 200, 200), width=3)
+
+    draw.text((margin, y), rng.choice(_TITLES), font=title, fill=ink)
+    y += int(size * 3)
+
+    ingredients = rng.sample(_INGREDIENTS, rng.randint(5, 10))
+    steps = rng.sample(_STEPS, rng.randint(3, 6))
+    line = int(size * 1.6)
+
+    if layout == "two_column":
+        column = (width - margin * 2) // 2
+        top = y
+        draw.text((margin, y), "Ingredients", font=body, fill=ink)
+        for item in ingredients:
+            y += line
+            draw.text((margin, y), item, font=body, fill=ink)
+        y = top
+        draw.text((margin + column, y), "Steps", font=body, fill=ink)
+        for n, step in enumerate(steps, 1):
+            y += line
+            draw.text((margin + column, y), f"{n}. {step[:28]}", font=body, fill=ink)
+        return
+
+    draw.text((margin, y), "Ingredients", font=body, fill=ink)
+    for item in ingredients:
+        y += line
+        draw.text((margin, y), item, font=body, fill=ink)
+    y += line * 2
+    draw.text((margin, y), "Steps", font=body, fill=ink)
+    for n, step in enumerate(steps, 1):
+        y += line
+        draw.text((margin, y), f"{n}. {step}", font=body, fill=ink)
+
+
+def make_image(kind: str, layout: str, orientation: int, seed: int) -> tuple[bytes, str, tuple[int, int]]:
+    """画像1枚を作り、(バイト列, 形式, 保存された画素の大きさ) を返す"""
+    _, width, height, image_format, photo = next(k for k in _KINDS if k[0] == kind)
+    rng = random.Random(seed)
+    image = _background(width, height, photo, np.random.default_rng(seed))
+    _draw_recipe(image, layout, rng)
+
+    exif = Image.Exif()
+    if orientation in _STORE_TRANSPOSE:
+        image = image.transpose(_STORE_TRANSPOSE[orientation])
+        exif[0x0112] = orientation
+
+    buffer = io.BytesIO()
+    options = {"exif": exif} if orientation != 1 else {}
+    if image_format == "JPEG":
+        options["quality"] = 90
+    elif image_format == "WEBP":
+        options["quality"] = 85
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue(), image_format, image.size
+
+
+def generate(out_dir: Path, count: int, seed: int = 0) -> list[CorpusImage]:
+    """count 枚の画像と manifest.json を書き出す"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        # 種類は順番に回し、どの枚数でも全種類が入るようにする
+        kind = _KINDS[i % len(_KINDS)][0]
+        layout = rng.choice(_LAYOUTS)
+        orientation = rng.choice(_ORIENTATIONS)
+        data, image_format, (width, height) = make_image(kind, layout, orientation, seed * 100_003 + i)
+        name = f"{i:03d}_{kind}_{layout}_o{orientation}.{image_format.lower().replace('jpeg', 'jpg')}"
+        (out_dir / name).write_bytes(data)
+        entries.append(CorpusImage(name, kind, layout, orientation, image_format, width, height, len(data)))
+
+    manifest = {"count": count, "seed": seed, "images": [asdict(entry) for entry in entries]}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return entries
+
+
+def load(out_dir: Path = DEFAULT_DIR, count: int = 24, seed: int = 0) -> list[tuple[CorpusImage, bytes]]:
+    """
+    コーパスの先頭 count 枚を読み込む（足りなければ、または種が違えば作り直す）
+
+    i枚目の画像は枚数によらず同じになるため、多めに作ったコーパスの先頭を使い回せる。
+    """
+    manifest_path = out_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    if manifest.get("count", 0) < count or manifest.get("seed") != seed:
+        entries = generate(out_dir, count, seed)
+    else:
+        entries = [CorpusImage(**entry) for entry in manifest["images"][:count]]
+    return [(entry, (out_dir / entry.file).read_bytes()) for entry in entries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=DEFAULT_DIR, help="出力ディレクトリ")
+    parser.add_argument("--count", type=int, default=24, help="画像の枚数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    entries = generate(args.out, args.count, args.seed)
+    for entry in entries:
+        print(f"  {entry.file:40s} {entry.width}x{entry.height} {entry.bytes / 1024:8.0f} KB")
+    print(f"{len(entries)} images -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+取り込みAPIの負荷試験
+
+同時実行数ごとに、合成コーパス（benchmarks.corpus）の画像を POST /v1/recipes/ingest へ
+送り続け（前の応答が返ったら次を送る閉ループ）、スループットと応答時間の p50/p95/p99、
+Server-Timing から集計したステージごとの平均時間を表示する。
+
+--spawn を付けると、スタブのOllama（benchmarks.stub_ollama）と一時DBを使うAPIサーバーを
+起動してから計測する。ネットワークにつながらないCPUだけのLinuxでも動く
+（PaddleOCRのモデルは事前に ~/.paddleocr へ取得しておく）。
+
+    python -m benchmarks.loadgen --spawn --concurrency 1,2,4,8 --requests 40
+    python -m benchmarks.loadgen --url http://localhost:8000 --token dev-token
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+
+from benchmarks import corpus
+
+# 表示するServer-Timingの項目（ステージとその待ち時間）
+_STAGES = [
+    "upload", "wait-preprocess", "preprocess", "wait-ocr", "ocr",
+    "wait-llm", "llm", "wait-save", "save",
+]
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    elapsed: float
+    latencies: list[float] = field(default_factory=list)  # 成功したリクエストの秒数
+    errors: dict[str, int] = field(default_factory=dict)  # ステータス（または例外名）→ 件数
+    timings: dict[str, list[float]] = field(default_factory=dict)  # Server-Timingの項目 → ミリ秒
+
+    def summary(self) -> dict:
+        ok = len(self.latencies)
+        return {
+            "concurrency": self.concurrency,
+            "ok": ok,
+            "errors": self.errors,
+            "throughput_rps": round(ok / self.elapsed, 3) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1) if ok else None,
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1) if ok else None,
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1) if ok else None,
+            "stages_mean_ms": {
+                name: round(statistics.fmean(values), 1)
+                for name, values in self.timings.items() if name in _STAGES
+            },
+        }
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """"decode;dur=7.9, ocr;dur=99.5" → {"decode": 7.9, "ocr": 99.5}"""
+    result = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                result[name] = float(value)
+    return result
+
+
+async def _run_level(
+    client: httpx.AsyncClient,
+    images: list[tuple[corpus.CorpusImage, bytes]],
+    concurrency: int,
+    requests: int,
+    force: bool,
+) -> LevelResult:
+    next_index = 0
+    result = LevelResult(concurrency, 0.0)
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            entry, data = images[next_index % len(images)]
+            next_index += 1
+            files = {"image": (entry.file, data, _MEDIA_TYPES[entry.format])}
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/v1/recipes/ingest", files=files, data={"force": str(force).lower()}
+                )
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+                result.errors[key] = result.errors.get(key, 0) + 1
+                continue
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                key = str(response.status_code)
+                result.errors[key] = result.errors.get(key, 0) + 1
+                continue
+            result.latencies.append(elapsed)
+            for name, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                result.timings.setdefault(name, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def run(args, base_url: str) -> list[LevelResult]:
+    images = corpus.load(args.corpus, args.count)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    headers = {"Authorization": f"Bearer {args.token}"}
+
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=limits) as client:
+        if args.warmup:
+            await _run_level(client, images, 1, args.warmup, args.force)
+        for concurrency in args.concurrency:
+            result = await _run_level(client, images, concurrency, args.requests, args.force)
+            results.append(result)
+            _print_level(result)
+    return results
+
+
+def _print_header():
+    print(f"  {'conc':>4s} {'ok':>5s} {'err':>4s} {'req/s':>7s} {'p50':>9s} {'p95':>9s} {'p99':>9s}  stage mean (ms)")
+
+
+def _print_level(result: LevelResult):
+    s = result.summary()
+    errors = sum(s["errors"].values())
+    stages = " ".join(f"{name}={value:.0f}" for name, value in s["stages_mean_ms"].items())
+    if s["ok"]:
+        print(
+            f"  {s['concurrency']:4d} {s['ok']:5d} {errors:4d} {s['throughput_rps']:7.2f}"
+            f" {s['p50_ms']:7.0f}ms {s['p95_ms']:7.0f}ms {s['p99_ms']:7.0f}ms  {stages}",
+            flush=True,
+        )
+    else:
+        print(f"  {s['concurrency']:4d} {0:5d} {errors:4d}  all failed: {s['errors']}", flush=True)
+
+
+# ---- サーバーの起動（--spawn） ----
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {process.returncode})")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server did not become ready within {timeout:.0f}s")
+
+
+@contextmanager
+def spawn_servers(args) -> Iterator[str]:
+    """スタブのOllamaと一時DBのAPIサーバーを起動し、APIのURLを返す"""
+    workdir = Path(tempfile.mkdtemp(prefix="loadgen_"))
+    ollama_port, api_port = _free_port(), _free_port()
+    processes: list[subprocess.Popen] = []
+    try:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.stub_ollama", "--port", str(ollama_port),
+            "--ttft-ms", str(args.ttft_ms), "--tokens-per-sec", str(args.tokens_per_sec),
+        ]))
+
+        env = {
+            **os.environ,
+            "DB_PATH": str(workdir / "db.sqlite3"),
+            "IMAGE_DIR": str(workdir / "images"),
+            "UPLOAD_DIR": str(workdir / "uploads"),
+            "API_TOKEN": args.token,
+            "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+            # 同じ画像を繰り返し送るため、LLM応答キャッシュは切る（重複検出は force で避ける）
+            "LLM_CACHE_ENABLED": "false",
+            "IMAGE_GC_INTERVAL_HOURS": "0",
+            "TRACE_LOG": "false",
+        }
+        env.setdefault("OCR_USE_GPU", "false")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port), "--log-level", "warning"],
+            env=env,
+        )
+        processes.append(server)
+
+        base_url = f"http://127.0.0.1:{api_port}"
+        print(f"Starting API server on {base_url} (workdir {workdir})", flush=True)
+        _wait_ready(f"{base_url}/v1/health/ready", server, args.startup_timeout)
+        yield base_url
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="APIのURL（--spawn の場合は無視）")
+    parser.add_argument("--token", default=os.getenv("API_TOKEN", "dev-token"))
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 2, 4, 8],
+                        help="同時実行数（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=40, help="同時実行数ごとのリクエスト数")
+    parser.add_argument("--warmup", type=int, default=2, help="計測前に1並列で送るリクエスト数")
+    parser.add_argument("--corpus", type=Path, default=corpus.DEFAULT_DIR, help="合成画像の置き場所")
+    parser.add_argument("--count", type=int, default=24, help="使う画像の枚数")
+    parser.add_argument("--no-force", dest="force", action="store_false",
+                        help="force=true を送らない（同じ画像は重複検出で即座に返る）")
+    parser.add_argument("--timeout", type=float, default=300, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存する（変更前後の比較用）")
+    spawn = parser.add_argument_group("--spawn")
+    spawn.add_argument("--spawn", action="store_true", help="スタブのOllamaとAPIサーバーを起動して計測する")
+    spawn.add_argument("--ttft-ms", type=float, default=300, help="スタブのOllamaの最初のトークンまでの時間")
+    spawn.add_argument("--tokens-per-sec", type=float, default=60, help="スタブのOllamaの生成速度")
+    spawn.add_argument("--startup-timeout", type=float, default=300, help="APIサーバーの起動を待つ秒数")
+    args = parser.parse_args()
+
+    print(f"Python {platform.python_version()}, {os.cpu_count()} CPUs, {platform.machine()}, "
+          f"{args.count} images, {args.requests} requests per level")
+
+    def measure(base_url: str) -> list[LevelResult]:
+        _print_header()
+        return asyncio.run(run(args, base_url))
+
+    if args.spawn:
+        with spawn_servers(args) as base_url:
+            results = measure(base_url)
+    else:
+        results = measure(args.url)
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "args": {key: str(value) for key, value in vars(args).items() if key != "token"},
+            "levels": [result.summary() for result in results],
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+ベンチマーク用のOllama互換スタブサーバー
+
+/api/generate に用意済みのレシピJSONを返す（ストリーミング・非ストリーミングの両方）。
+最初のトークンまでの時間と1秒あたりのトークン数を指定でき、GPUやモデルがなくても
+LLMステージの待ち時間を再現できる。応答はプロンプトのハッシュで選ぶため、同じ入力には同じ応答を返す。
+
+    python -m benchmarks.stub_ollama --port 11435 --ttft-ms 300 --tokens-per-sec 60
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+# 1トークンとみなす文字数（日本語はおおむね1〜2文字で1トークン）
+CHARS_PER_TOKEN = 2
+
+RESPONSES = [
+    {
+        "title": "肉じゃが",
+        "servings": "2人分",
+        "ingredients": [
+            {"name": "豚バラ肉", "amount": "200g", "note": None},
+            {"name": "じゃがいも", "amount": "2個", "note": None},
+            {"name": "玉ねぎ", "amount": "1/2個", "note": None},
+            {"name": "にんじん", "amount": "1/3本", "note": None},
+            {"name": "醤油", "amount": "大さじ2", "note": None},
+            {"name": "みりん", "amount": "大さじ2", "note": None},
+        ],
+        "steps": [
+            {"order": 1, "text": "野菜を一口大に切る"},
+            {"order": 2, "text": "鍋に油を熱し、豚肉を炒める"},
+            {"order": 3, "text": "野菜を加えて炒め、調味料と水を入れて15分煮る"},
+        ],
+        "time": "30分",
+        "notes": ["煮汁が少なくなったら火を止めて味を含ませる"],
+        "tags": ["和食", "煮物"],
+        "source": {"url": None, "platform": None},
+    },
+    {
+        "title": "鶏の唐揚げ",
+        "servings": "3人分",
+        "ingredients": [
+            {"name": "鶏もも肉", "amount": "300g", "note": None},
+            {"name": "醤油", "amount": "大さじ1", "note": None},
+            {"name": "酒", "amount": "大さじ1", "note": None},
+            {"name": "にんにく", "amount": "1片", "note": "すりおろす"},
+            {"name": "片栗粉", "amount": "適量", "note": None},
+        ],
+        "steps": [
+            {"order": 1, "text": "鶏肉を一口大に切り、調味料に15分漬ける"},
+            {"order": 2, "text": "片栗粉をまぶし、170度の油で4分揚げる"},
+        ],
+        "time": "25分",
+        "notes": [],
+        "tags": ["揚げ物", "鶏肉"],
+        "source": {"url": None, "platform": None},
+    },
+    {
+        "title": "麻婆豆腐",
+        "servings": "2人分",
+        "ingredients": [
+            {"name": "豆腐", "amount": "1丁", "note": None},
+            {"name": "合いびき肉", "amount": "100g", "note": None},
+            {"name": "豆板醤", "amount": "小さじ1", "note": None},
+            {"name": "長ねぎ", "amount": "1/2本", "note": "みじん切り"},
+        ],
+        "steps": [
+            {"order": 1, "text": "豆腐をさいの目に切る"},
+            {"order": 2, "text": "ひき肉と豆板醤を炒め、水と豆腐を加えて煮る"},
+            {"order": 3, "text": "水溶き片栗粉でとろみをつける"},
+        ],
+        "time": "15分",
+        "notes": ["辛さは豆板醤で調整する"],
+        "tags": ["中華", "豆腐"],
+        "source": {"url": None, "platform": None},
+    },
+]
+
+# JSONの後に続ける余計な文章（ストリーミングの打ち切りが効くかを見るため）
+TRAILER = "\n\n以上がレシピの構造化結果です。ほかに知りたいことがあればお知らせください。"
+
+
+class StubConfig:
+    def __init__(self, ttft: float, tokens_per_sec: float, jitter: float, seed: int, responses: list[dict]):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.jitter = jitter
+        self.responses = responses
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def scale(self) -> float:
+        """遅延にかける揺らぎ（1 ± jitter の一様分布）"""
+        with self._lock:
+            self.requests += 1
+            return 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+
+    def response_for(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        recipe = self.responses[digest[0] % len(self.responses)]
+        return json.dumps(recipe, ensure_ascii=False) + TRAILER
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "stub"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = request.get("prompt", "")
+        text = self.config.response_for(prompt)
+        tokens = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+        counts = {"prompt_eval_count": len(prompt) // CHARS_PER_TOKEN, "eval_count": len(tokens)}
+
+        scale = self.config.scale()
+        per_token = scale / self.config.tokens_per_sec if self.config.tokens_per_sec > 0 else 0.0
+        time.sleep(self.config.ttft * scale)
+
+        if not request.get("stream", True):
+            time.sleep(per_token * len(tokens))
+            self._send_json({"model": request.get("model"), "response": text, "done": True, **counts})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                self._write_chunk({"model": request.get("model"), "response": token, "done": False})
+                time.sleep(per_token)
+            self._write_chunk({"model": request.get("model"), "response": "", "done": True, **counts})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # JSONが閉じた時点でクライアントが打ち切った
+            self.close_connection = True
+
+    def _write_chunk(self, body: dict):
+        line = json.dumps(body, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+def serve(
+    port: int,
+    ttft: float = 0.3,
+    tokens_per_sec: float = 60.0,
+    jitter: float = 0.1,
+    seed: int = 0,
+    responses: Optional[list[dict]] = None,
+) -> ThreadingHTTPServer:
+    """スタブサーバーを作る（serve_forever() で待ち受ける）"""
+    handler = type("Handler", (_Handler,), {
+        "config": StubConfig(ttft, tokens_per_sec, jitter, seed, responses or RESPONSES),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="最初のトークンまでの時間（ミリ秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=60, help="生成速度（0で待たない）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="遅延の揺らぎ（0.1で±10%%）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--responses", type=Path, help="応答に使うレシピJSONの配列（省略時は組み込みの3件）")
+    args = parser.parse_args()
+
+    responses = json.loads(args.responses.read_text()) if args.responses else None
+    server = serve(args.port, args.ttft_ms / 1000, args.tokens_per_sec, args.jitter, args.seed, responses)
+    print(f"Stub Ollama on http://127.0.0.1:{args.port}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()